@@ -14,8 +14,28 @@ Dependencies:
     - openai: The OpenAI API client used to interact with the models.
 """
 
+import threading
+
 import openai
 
+# Shared client: it keeps its HTTP connections open between calls
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client() -> openai.Client:
+    """
+    Returns the OpenAI client shared by every call, created on first use.
+
+    Returns:
+        openai.Client: The shared client.
+    """
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = openai.Client()
+        return _client
+
 
 def call_llm(
         prompt: str,
@@ -37,7 +57,7 @@ def call_llm(
         str: The content generated by the model.
     """
     messages = [{"role": "user", "content": prompt}]
-    client = openai.Client()
+    client = get_client()
 
     # Make the request to the model
     completion = client.chat.completions.create(
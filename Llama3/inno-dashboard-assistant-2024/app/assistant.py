@@ -12,6 +12,10 @@ components based in a chatbot powered with Qdrant for vector database management
 and llama-3 models to generate dynamic responses based on user input.
 """
 
+import json
+import uuid
+from typing import Any, Dict, Iterator, List
+
 import requests
 import streamlit as st
 
@@ -33,6 +37,39 @@ def on_card_button_click(prompt: str) -> None:
     st.session_state.show_cards = False
 
 
+def stream_response(payload: Dict[str, Any], errors: List[str]) -> Iterator[str]:
+    """
+    Sends a query to the streaming endpoint and yields the answer as it arrives.
+
+    Args:
+        payload (Dict[str, Any]): Body of the query.
+        errors (List[str]): List where the errors reported by the backend are added.
+
+    Yields:
+        str: The pieces of the answer.
+    """
+    with requests.post(
+        "http://localhost:5001/query_stream", json=payload, stream=True
+    ) as response:
+        if response.status_code != 200:
+            errors.append(f"HTTP {response.status_code}")
+            return
+
+        # Server-sent events: "event:" and "data:" lines, separated by blank lines
+        event = None
+        for line in response.iter_lines(decode_unicode=True):
+            if not line:
+                event = None
+            elif line.startswith("event:"):
+                event = line[len("event:"):].strip()
+            elif line.startswith("data:"):
+                data = json.loads(line[len("data:"):])
+                if event == "error":
+                    errors.append(data["error"])
+                elif event is None:
+                    yield data["token"]
+
+
 # Define the greeting and description text
 saludo_asistente = (
     "👋 Hola, soy el asistente de Power BI. ¿En qué puedo ayudarte?"
@@ -58,6 +95,10 @@ st.markdown(
     unsafe_allow_html=True,
 )
 
+# Identify the chat session, so the backend keeps its own conversation history
+if "session_id" not in st.session_state:
+    st.session_state.session_id = uuid.uuid4().hex
+
 st.sidebar.header("Filtro")
 response = requests.get("http://localhost:5001/get_reports")
 if response.status_code == 200:
@@ -125,6 +166,7 @@ if "contexto_asistente" not in st.session_state:
             "informe_seleccionado": informe_seleccionado,
             "informes_disponibles": informes,
             "configuration": selected_config, 
+            "session_id": st.session_state.session_id,
         },
     )
 
@@ -154,30 +196,31 @@ if prompt or card_prompt:
     with st.chat_message("user"):
         st.markdown(prompt)
 
-    # Send the query to the assistant
+    # Send the query to the assistant and show the answer as it is generated
     with st.chat_message("assistant"):
-        response = requests.post(
-            "http://localhost:5001/query",
-            json={
-                "query": prompt,
-                "informe_seleccionado": informe_seleccionado,
-                "informes_disponibles": informes,
-                "configuration": selected_config, 
-
-            },
+        errors: List[str] = []
+        placeholder = st.empty()
+        response_text = placeholder.write_stream(
+            stream_response(
+                {
+                    "query": prompt,
+                    "informe_seleccionado": informe_seleccionado,
+                    "informes_disponibles": informes,
+                    "configuration": selected_config,
+                    "session_id": st.session_state.session_id,
+                },
+                errors,
+            )
         )
 
-        if response.status_code == 200:
-            result = response.json()
-            response_text = result["response"]
-
+        if not errors:
             # Eliminar las comillas al final hasta un máximo de 3 veces
             for _ in range(3):
                 if not response_text.endswith((".", ":", "?", "!")):
                     response_text = response_text[:-1]
 
             # Mostrar y agregar el texto procesado
-            st.markdown(response_text)
+            placeholder.markdown(response_text)
             st.session_state.messages.append(
                 {"role": "assistant", "content": response_text}
             )
@@ -11,12 +11,13 @@ and generating dynamic responses via llama-3 models. It provides the API endpoin
 for querying reports, fetching insights, and supporting the chatbot functionality.
 """
 
+import json
 import logging
 import os
-import time
-from typing import Dict, List, Optional
+from typing import Any, Dict, Iterator, List, Optional
 
-from flask import Flask, jsonify, request
+from dotenv import load_dotenv
+from flask import Flask, Response, jsonify, request
 from qdrant_client import QdrantClient
 
 from src.services.agent.core import Agent
@@ -30,19 +31,38 @@ from src.services.data.utils.database_utils_text import (
     DatabaseCreator_report_sum,
     DatabaseCreator_text_pages,
 )
+from src.services.data.utils.file_watcher import FolderWatcher
+from src.services.data.utils.ingestion_jobs import (
+    IngestionJob,
+    ingestion_job_runner,
+)
+from src.services.data.utils.point_ids import report_point_id
+from src.services.llm.embedding_cache import get_cache_stats
+from src.services.llm.reranker_pool import reranker_pool
 from src.services.report_generation.report_gen import inform_generator
+from src.services.retrievers.retriever_registry import retriever_registry
 from src.services.retrievers.selfq_retrievers import get_reports
 from src.utils.logging_config import setup_logging
 
+load_dotenv()
+
 # Set up logging
 setup_logging()
 logger = logging.getLogger(name=__name__)
 
+# Default update mode of /update_data: "incremental" or "blue_green"
+INGESTION_MODE = os.getenv("INGESTION_MODE", "incremental")
+# Whether new report files are ingested automatically
+WATCH_DATA_FOLDERS = os.getenv("WATCH_DATA_FOLDERS", "False") == "True"
+
 app = Flask(__name__)
 qdrant_client = QdrantClient("localhost", port=6333)
 
 agent = Agent(qdrant_client=qdrant_client)
 
+# Load the rerankers once, before the first request pays for it
+reranker_pool.warm_up()
+
 # Define absolute paths to required directories
 base_dir = "./src/services/data/etl_data"
 json_reports_dir = os.path.join(base_dir, "json_reports")
@@ -57,6 +77,53 @@ db_creator_text_pages = DatabaseCreator_text_pages(
 db_creator_report_sum = DatabaseCreator_report_sum(texts_folder=sum_reports_dir)
 db_creator_metadata = DatabaseCreator_metadata(texts_folder=json_reports_dir)
 
+# Update function of each group of collections, per update mode
+UPDATERS = {
+    "incremental": {
+        "tabular": db_creator_tabular.process_and_upload_data,
+        "report_summary": db_creator_report_sum.process_and_upload_data,
+        "text_pages": db_creator_text_pages.process_and_upload_data,
+        "metadata": lambda: (
+            db_creator_metadata.process_upload_dates(),
+            db_creator_metadata.process_element_names(),
+            db_creator_metadata.process_report_names(),
+        ),
+    },
+    "blue_green": {
+        "tabular": db_creator_tabular.rebuild,
+        "report_summary": db_creator_report_sum.rebuild,
+        "text_pages": db_creator_text_pages.rebuild,
+        "metadata": db_creator_metadata.rebuild,
+    },
+}
+
+
+def invalidate_retrievers(job: IngestionJob) -> None:
+    """
+    Drops the cached retrievers after an update job.
+
+    Even a failed or cancelled job may have changed some collections.
+
+    Args:
+        job (IngestionJob): The finished job.
+    """
+    retriever_registry.invalidate()
+
+
+# Ingest new report files as soon as the ETL writes them, if enabled
+if WATCH_DATA_FOLDERS:
+    data_watcher = FolderWatcher(
+        routes={
+            json_reports_dir: ["tabular", "metadata"],
+            page_reports_dir: ["text_pages"],
+            sum_reports_dir: ["report_summary"],
+        },
+        tasks=UPDATERS["incremental"],
+        runner=ingestion_job_runner,
+        on_finish=invalidate_retrievers,
+    )
+    data_watcher.start()
+
 
 @app.route("/query", methods=["POST"])
 def query() -> Optional[Dict[str, str]]:
@@ -73,6 +140,7 @@ def query() -> Optional[Dict[str, str]]:
             "informe_seleccionado": <str>,
             "informes_disponibles": <list>
             "configuration": <str>, 
+            "session_id": <str> (optional, chat session whose history is used)
         }
 
     Returns:
@@ -84,9 +152,13 @@ def query() -> Optional[Dict[str, str]]:
         informe_seleccionado: str = request.json.get("informe_seleccionado")
         report_ids: List[str] = request.json.get("informes_disponibles")
         report_ids = ", ".join(report_ids)
+        session_id: Optional[str] = request.json.get("session_id")
 
         result = agent.run(
-            query=query_text, informe_seleccionado=informe_seleccionado, config=config
+            query=query_text,
+            informe_seleccionado=informe_seleccionado,
+            config=config,
+            session_id=session_id,
         )
 
         if isinstance(result, str):
@@ -111,6 +183,70 @@ def query() -> Optional[Dict[str, str]]:
         )
 
 
+def server_sent_event(data: Dict[str, Any], event: Optional[str] = None) -> str:
+    """
+    Formats a server-sent event.
+
+    Args:
+        data (Dict[str, Any]): Payload of the event, sent as JSON.
+        event (Optional[str]): Name of the event; None for a plain message.
+
+    Returns:
+        str: The event, ready to be written to the response.
+    """
+    message = f"event: {event}\n" if event else ""
+    return message + f"data: {json.dumps(data)}\n\n"
+
+
+@app.route("/query_stream", methods=["POST"])
+def query_stream() -> Response:
+    """
+    Endpoint to handle user queries, streaming the response as it is generated.
+
+    Takes the same request body as `/query` and answers with server-sent events
+    (text/event-stream):
+    - a message `{"token": <str>}` for each piece of the final answer;
+    - an "end" event `{"response": <str>}` with the whole answer;
+    - an "error" event `{"error": <str>}` if the agent fails.
+
+    Returns:
+        Response: The stream of events.
+    """
+    query_text: str = request.json.get("query")
+    config: str = request.json.get("configuration")
+    informe_seleccionado: str = request.json.get("informe_seleccionado")
+    session_id: Optional[str] = request.json.get("session_id")
+
+    def events() -> Iterator[str]:
+        response_text = ""
+        try:
+            for token in agent.stream(
+                query=query_text,
+                informe_seleccionado=informe_seleccionado,
+                config=config,
+                session_id=session_id,
+            ):
+                response_text += token
+                yield server_sent_event({"token": token})
+            yield server_sent_event({"response": response_text}, event="end")
+        except Exception as e:
+            logger.error(f"Error in /query_stream: {str(e)}", exc_info=True)
+            yield server_sent_event(
+                {
+                    "error": (
+                        "An error occurred on the server. Please check the logs for more details."
+                    )
+                },
+                event="error",
+            )
+
+    return Response(
+        events(),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 @app.route("/get_reports", methods=["GET"])
 def get_reports_route() -> Optional[Dict[str, List[str]]]:
     """
@@ -140,7 +276,7 @@ def get_dates_by_id() -> Optional[Dict[str, str]]:
     Endpoint to fetch dates associated with a specific report ID.
 
     Request Parameters:
-        id (str): The report ID for which dates are being requested.
+        id (str): The report ID (report name) for which dates are being requested.
                   This is a required query parameter.
 
     Returns:
@@ -151,10 +287,10 @@ def get_dates_by_id() -> Optional[Dict[str, str]]:
         if not report_id:
             return jsonify({"error": "No ID provided"}), 400
 
-        report_id = int(report_id)
-
         points = qdrant_client.retrieve(
-            collection_name="upload_dates", ids=[report_id], with_payload=True
+            collection_name="upload_dates",
+            ids=[report_point_id("upload_dates", report_id)],
+            with_payload=True,
         )
 
         if points and len(points) > 0:
@@ -167,6 +303,17 @@ def get_dates_by_id() -> Optional[Dict[str, str]]:
         return jsonify({"error": str(e)}), 500
 
 
+@app.route("/embedding_cache_stats", methods=["GET"])
+def embedding_cache_stats() -> Optional[Dict[str, Dict[str, int]]]:
+    """
+    Endpoint to fetch the hit/miss counters of the query embedding cache.
+
+    Returns:
+        json: A JSON object with the counters of each cached embedding model.
+    """
+    return jsonify(get_cache_stats()), 200
+
+
 @app.route("/generate_report", methods=["POST"])
 def generate_report() -> Optional[Dict[str, str]]:
     """
@@ -214,55 +361,80 @@ def update_data() -> Optional[Dict[str, str]]:
 
     This endpoint allows the client to trigger updates for different collections in the system.
     The available update types are 'all', 'tabular', 'report_summary', 'text_pages', and 'metadata'...
+
+    The optional "mode" selects how the collections are updated:
+    - 'incremental': only new, modified or deleted files are applied to the live collections.
+    - 'blue_green': each collection is rebuilt from scratch in a new version, which
+      replaces the live one behind its alias once it is complete and validated.
+    It defaults to the INGESTION_MODE environment variable ('incremental' if unset).
+
+    The update runs as a background job: the response (202) holds the job ID,
+    whose status and progress are returned by `/update_data/<job_id>`. With
+    'all', the collections are updated in parallel.
     """
     update_type: str = request.json.get("update_type")
-    time.sleep(
-        15
-    )  # to ensure collections are initialized, otherwise error will be shown
-    try:
-        if update_type == "all":
-            db_creator_tabular.process_and_upload_data()
-            db_creator_text_pages.process_and_upload_data()
-            db_creator_report_sum.process_and_upload_data()
-            db_creator_metadata.process_upload_dates()
-            db_creator_metadata.process_element_names()
-            db_creator_metadata.process_report_names()
-            return (
-                jsonify({"message": "Data updated for all collections."}),
-                200,
-            )
+    mode: str = request.json.get("mode", INGESTION_MODE)
+    if mode not in UPDATERS:
+        return jsonify({"message": "Invalid update mode."}), 400
+    updaters = UPDATERS[mode]
+    if update_type == "all":
+        tasks = updaters
+    elif update_type in updaters:
+        tasks = {update_type: updaters[update_type]}
+    else:
+        return jsonify({"message": "Invalid update type."}), 400
 
-        elif update_type in [
-            "tabular",
-            "report_summary",
-            "text_pages",
-            "metadata",
-        ]:
-            updater = {
-                "tabular": db_creator_tabular.process_and_upload_data,
-                "report_summary": db_creator_report_sum.process_and_upload_data,
-                "text_pages": db_creator_text_pages.process_and_upload_data,
-                "metadata": lambda: (
-                    db_creator_metadata.process_upload_dates(),
-                    db_creator_metadata.process_element_names(),
-                    db_creator_metadata.process_report_names(),
-                ),
-            }
-            updater[update_type]()
-            return (
-                jsonify(
-                    {
-                        "message": f"Data updated for the {update_type} collection."
-                    }
-                ),
-                200,
-            )
-        else:
-            return jsonify({"message": "Invalid update type."}), 400
+    try:
+        job = ingestion_job_runner.submit(
+            update_type=update_type,
+            mode=mode,
+            tasks=tasks,
+            parallel=True,
+            on_finish=invalidate_retrievers,
+        )
+        return (
+            jsonify(
+                {
+                    "message": f"Update of {update_type} collections queued.",
+                    "job_id": job.job_id,
+                    "status_url": f"/update_data/{job.job_id}",
+                }
+            ),
+            202,
+        )
     except Exception as e:
         logger.error(f"Error in /update_data: {str(e)}", exc_info=True)
         return jsonify({"error": str(e)}), 500
 
 
+@app.route("/update_data/<job_id>", methods=["GET"])
+def update_data_status(job_id: str) -> Optional[Dict[str, Any]]:
+    """
+    Endpoint to get the status and progress of an update job.
+
+    Returns the job status ('queued', 'running', 'succeeded', 'failed' or
+    'cancelled'), the status of each collection update and the number of files
+    parsed, points embedded and points uploaded so far.
+    """
+    job = ingestion_job_runner.get(job_id)
+    if job is None:
+        return jsonify({"message": "Unknown job ID."}), 404
+    return jsonify(job.to_dict()), 200
+
+
+@app.route("/update_data/<job_id>/cancel", methods=["POST"])
+def cancel_update_data(job_id: str) -> Optional[Dict[str, Any]]:
+    """
+    Endpoint to cancel a queued or running update job.
+
+    The job stops at the next batch boundary; the collections keep the points
+    uploaded so far, and the next update processes the same files again.
+    """
+    job = ingestion_job_runner.cancel(job_id)
+    if job is None:
+        return jsonify({"message": "Unknown job ID."}), 404
+    return jsonify(job.to_dict()), 202
+
+
 if __name__ == "__main__":
     app.run(host="127.0.0.1", port=5001)
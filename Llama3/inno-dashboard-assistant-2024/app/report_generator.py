@@ -24,20 +24,6 @@ import streamlit as st
 from markdown_pdf import MarkdownPdf, Section
 
 
-@st.cache_data
-def string_to_int_ascii(s: str) -> int:
-    """
-    Converts a string to the sum of its ASCII values.
-
-    Args:
-        s (str): Input string.
-
-    Returns:
-        int: Sum of ASCII values of the characters in the string.
-    """
-    return sum(ord(char) for char in s)
-
-
 def get_img(file: str):
     """
     Encodes an image file to a base64 string.
@@ -188,9 +174,9 @@ with col1:
     st.session_state["informe_seleccionado"] = informe_seleccionado
 
     if informe_seleccionado != "Todos los informes":
-        report_id_int = string_to_int_ascii(s=informe_seleccionado)
         response = requests.get(
-            f"http://localhost:5001/get_dates_by_id?id={report_id_int}"
+            "http://localhost:5001/get_dates_by_id",
+            params={"id": informe_seleccionado},
         )
 
         if response.status_code == 200:
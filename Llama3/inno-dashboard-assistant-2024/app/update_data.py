@@ -4,34 +4,72 @@
 """
 Data_upload page deploying script.
 
-"This script configurates Data_upload Streamlit page 
+"This script configurates Data_upload Streamlit page
 intended for temporary use."
 """
 
 import json
+import time
 
 import requests
 import streamlit as st
 
+BACKEND_URL = "http://localhost:5001"
+POLL_INTERVAL = 1.0  # Seconds between two status requests
+FINISHED_STATUSES = ("succeeded", "failed", "cancelled")
+
 # Update data
 st.sidebar.header("Update Data")
 update_type = st.sidebar.selectbox(
     "Select update type:",
     ["all", "tabular", "report_summary", "text_pages", "metadata"],
 )
+# A blue/green update rebuilds the collections without affecting live queries
+update_mode = st.sidebar.radio(
+    "Update mode:",
+    ["incremental", "blue_green"],
+)
 
 if st.sidebar.button("Update Data"):
     """
     Sends a request to update data based on the selected update type.
-    The response is displayed on the sidebar.
+    The update runs in the background; its job ID is kept in the session.
     """
-    # Show the spinner while waiting for the response
-    with st.spinner("Updating data... Please wait."):
-        response = requests.post(
-            "http://localhost:5001/update_data",
-            json={"update_type": update_type},
-        )
-        result = response.json()
+    response = requests.post(
+        f"{BACKEND_URL}/update_data",
+        json={"update_type": update_type, "mode": update_mode},
+    )
+    result = response.json()
+    if response.status_code == 202:
+        st.session_state["update_job_id"] = result["job_id"]
+    else:
+        st.sidebar.error(json.dumps(result, indent=2))
+
+job_id = st.session_state.get("update_job_id")
+if job_id:
+    # Clicking the button reruns the page, which stops the polling loop below
+    if st.sidebar.button("Cancel update"):
+        requests.post(f"{BACKEND_URL}/update_data/{job_id}/cancel")
+
+    status_placeholder = st.sidebar.empty()
+    while True:
+        job = requests.get(f"{BACKEND_URL}/update_data/{job_id}").json()
+        with status_placeholder.container():
+            st.write(f"Update {job.get('update_type')} ({job.get('mode')}): {job.get('status')}")
+            for stage, counts in job.get("progress", {}).items():
+                done, total = counts["done"], counts["total"]
+                # The number of points to upload is not known in advance
+                st.progress(
+                    min(done / total, 1.0) if total else 0.0,
+                    text=f"{stage.capitalize()}: {done}/{total}" if total else f"{stage.capitalize()}: {done}",
+                )
+        if job.get("status", "failed") in FINISHED_STATUSES:
+            break
+        time.sleep(POLL_INTERVAL)
 
     # Display the result of the update operation
-    st.sidebar.success(json.dumps(result, indent=2))
+    del st.session_state["update_job_id"]
+    if job.get("status") == "succeeded":
+        st.sidebar.success(json.dumps(job.get("tasks"), indent=2))
+    else:
+        st.sidebar.error(json.dumps(job, indent=2))
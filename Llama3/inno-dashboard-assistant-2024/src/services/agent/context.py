@@ -0,0 +1,88 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+# Authors: SDG DS unit
+"""
+Per-request parameters of the agent.
+
+The ReAct agent (prompt, tools, agent runnable and executor) is built once and
+shared by every request. The parameters chosen by the user for a request (the
+selected report and the retrieval configuration) are not stored on the agent
+or baked into its tools: `agent_context` makes them available to the tools for
+the duration of one agent call, through a context variable. Concurrent requests
+on the shared agent therefore cannot see each other's parameters.
+
+Functions:
+    - agent_context: Sets the parameters of an agent call.
+    - current_agent_context: Returns the parameters of the running agent call.
+"""
+
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator, Optional
+
+# Values used when the agent is called outside of `agent_context`
+DEFAULT_REPORT = "Todos los informes"
+DEFAULT_CONFIG = "Optimized"
+
+
+class AgentContext:
+    """
+    Parameters of a single agent call.
+
+    Attributes:
+        informe_seleccionado (str): Report selected by the user.
+        config (str): Retrieval configuration selected by the user.
+    """
+
+    def __init__(
+            self,
+            informe_seleccionado: Optional[str] = None,
+            config: Optional[str] = None,
+    ) -> None:
+        """
+        Initializes the parameters.
+
+        Args:
+            informe_seleccionado (Optional[str]): Report selected by the user.
+                Defaults to all reports.
+            config (Optional[str]): Retrieval configuration. Defaults to "Optimized".
+        """
+        self.informe_seleccionado = informe_seleccionado or DEFAULT_REPORT
+        self.config = config or DEFAULT_CONFIG
+
+
+_current_context: ContextVar[Optional[AgentContext]] = ContextVar(
+    "agent_context", default=None
+)
+
+
+@contextmanager
+def agent_context(
+        informe_seleccionado: Optional[str] = None, config: Optional[str] = None
+) -> Iterator[AgentContext]:
+    """
+    Sets the parameters of an agent call for the duration of the call.
+
+    Args:
+        informe_seleccionado (Optional[str]): Report selected by the user.
+        config (Optional[str]): Retrieval configuration selected by the user.
+
+    Yields:
+        AgentContext: The active parameters.
+    """
+    context = AgentContext(informe_seleccionado=informe_seleccionado, config=config)
+    token = _current_context.set(context)
+    try:
+        yield context
+    finally:
+        _current_context.reset(token)
+
+
+def current_agent_context() -> AgentContext:
+    """
+    Returns the parameters of the running agent call.
+
+    Returns:
+        AgentContext: The active parameters, or the defaults outside of a call.
+    """
+    return _current_context.get() or AgentContext()
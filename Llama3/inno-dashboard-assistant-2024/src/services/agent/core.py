@@ -7,25 +7,61 @@ Agent module for processing queries with memory and external tools.
 This module defines the `Agent` class, which represents an agent that can process 
 queries using a combination of tools, memory, and a chat model. The agent is designed 
 to interact with a Qdrant database client and make use of predefined tools to generate 
-responses to queries. The agent uses a memory buffer to track conversation history 
-and can be customized with different tools and prompts for varied use cases.
+responses to queries. The agent keeps the conversation history of each chat session
+in a session memory store (see `memory_store`) and can be customized with different
+tools and prompts for varied use cases.
+
+The ReAct agent and its executor are built once, in `Agent.__init__`, and shared by
+every request; the selected report and configuration of a request are passed to the
+tools through the agent context (see `context`).
+
+`Agent.stream` runs the same ReAct loop and yields the tokens of the final answer
+as they are generated (see `streaming`).
 """
 
-from typing import Any
+from typing import Any, Iterator, List, Optional
 
-from langchain_groq import ChatGroq
 from langchain.agents import AgentExecutor, create_react_agent
-from langchain.memory import ConversationBufferWindowMemory
 from langchain.prompts import PromptTemplate
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.tools import BaseTool
+from src.services.agent.context import agent_context
+from src.services.agent.memory_store import SessionMemoryStore, create_memory_store
+from src.services.agent.streaming import stream_agent_answer
 from src.services.agent.tools import (
     get_tools,
 )  # Imports the function to get tools
+from src.services.llm.clients import get_chat_model
 from src.services.llm.prompts import get_character_prompt
-from dotenv import load_dotenv
-import os
 
-load_dotenv()
-api_key = os.getenv("GROQ_API_KEY")
+
+def create_agent_executor(
+        chat_model: BaseChatModel, tools: List[BaseTool]
+) -> AgentExecutor:
+    """
+    Builds the ReAct agent and its executor.
+
+    The executor has no memory of its own: the chat history of the session is
+    given as the "chat_history" input of each call.
+
+    Args:
+        chat_model (BaseChatModel): The chat model of the agent.
+        tools (List[BaseTool]): Tools available for the agent.
+
+    Returns:
+        AgentExecutor: The executor, ready to be invoked for any request.
+    """
+    prompt = PromptTemplate.from_template(template=get_character_prompt())
+    agent = create_react_agent(llm=chat_model, tools=tools, prompt=prompt)
+    return AgentExecutor(
+        agent=agent,
+        tools=tools,
+        verbose=True,
+        early_stopping_method="generate",
+        handle_parsing_errors=True,
+        max_iterations=3,
+    )
 
 
 class Agent:
@@ -33,78 +69,113 @@ class Agent:
     A class that represents an agent using tools and memory to process queries.
 
     The Agent class is responsible for executing queries by using a chat model, memory,
-    and external tools. It interacts with a Qdrant database client, uses a memory buffer
-    to store conversation history, and can process queries with the help of predefined tools.
+    and external tools. It interacts with a Qdrant database client, keeps the conversation
+    history of each session in a memory store, and can process queries with the help of
+    predefined tools.
 
     Attributes:
         qdrant_client (QdrantClient): The client used to interact with the Qdrant database.
-        memory (ConversationBufferWindowMemory): Memory buffer to store the conversation history.
+        memory_store (SessionMemoryStore): Conversation history of each chat session.
         chat_model (ChatLlama3): The chat model used for processing the queries.
         tools (List[Tool]): Tools available for the agent to use during query processing.
+        agent_executor (AgentExecutor): Executor of the ReAct agent, shared by every request.
     """
 
-    def __init__(self, qdrant_client: Any) -> None:
+    def __init__(
+            self, qdrant_client: Any, memory_store: Optional[SessionMemoryStore] = None
+    ) -> None:
         """
         Initializes the Agent with the given Qdrant client.
 
         Args:
             qdrant_client (Any): The client used to interact with the Qdrant database.
+            memory_store (Optional[SessionMemoryStore]): Conversation history of each
+                session. Defaults to a store with the configured backend.
         """
         self.qdrant_client = qdrant_client
-        self.memory = ConversationBufferWindowMemory(
-            memory_key="chat_history",
-            k=6,
-            return_messages=False,
-            output_key="output",
-        )
+        self.memory_store = memory_store or create_memory_store()
 
-        # Define the chat model
-        self.chat_model = ChatGroq(model_name="llama-3.3-70b-specdec", groq_api_key=api_key, temperature=0)
+        # Define the chat model, shared with the other LLM callers
+        self.chat_model = get_chat_model(temperature=0)
 
+        # Build the prompt, the tools and the executor once; the parameters of
+        # each request are read by the tools from the agent context
+        self.tools = get_tools(qdrant_client=self.qdrant_client)
+        self.agent_executor = create_agent_executor(
+            chat_model=self.chat_model, tools=self.tools
+        )
 
-    def run(self, query: str, informe_seleccionado: str, config: str) -> str:
+    def run(
+            self,
+            query: str,
+            informe_seleccionado: str,
+            config: str,
+            session_id: Optional[str] = None,
+            callbacks: Optional[List[BaseCallbackHandler]] = None,
+    ) -> str:
         """
         Runs the agent with the provided query to get a response.
 
         Args:
             query (str): The query to be processed by the agent.
             informe_seleccionado (str): Selected repport from filter selection.
+            config (str): Retrieval configuration selected by the user.
+            session_id (Optional[str]): Chat session of the query; None for the
+                default session.
+            callbacks (Optional[List[BaseCallbackHandler]]): Callbacks of the
+                agent run (e.g. to stream the generated tokens).
 
         Returns:
             str: The final output generated by the agent.
         """
-        self.informe_seleccionado = informe_seleccionado
-        # Create the updated prompt template
-        self.prompt = PromptTemplate.from_template(
-            template=get_character_prompt()
-        )
-        self.config = config
-        # Get the tools through the get_tools function
-        self.tools = get_tools(
-            qdrant_client=self.qdrant_client,
-            config=self.config,
-            informe_seleccionado=self.informe_seleccionado,
-            
-        )
-        # Create the agent with the prompt and the updated tools
-        self.agent = create_react_agent(
-            llm=self.chat_model, tools=self.tools, prompt=self.prompt
-        )
-
-        # Execute the agent directly with the query
         input_query = f"{query}"
-        agent_executor = AgentExecutor(
-            agent=self.agent,
-            tools=self.tools,
-            memory=self.memory,
-            verbose=True,
-            early_stopping_method="generate",
-            handle_parsing_errors=True,
-            max_iterations=3,
-        )
 
         # Execute the agent to get the final result
-        result = agent_executor.invoke(input={"input": input_query})["output"]
+        with agent_context(informe_seleccionado=informe_seleccionado, config=config):
+            result = self.agent_executor.invoke(
+                input={
+                    "input": input_query,
+                    "chat_history": self.memory_store.chat_history(session_id),
+                },
+                config={"callbacks": callbacks},
+            )["output"]
+
+        self.memory_store.add_exchange(
+            session_id=session_id, user_input=input_query, output=result
+        )
 
         # Return the final output of the agent
         return result
+
+    def stream(
+            self,
+            query: str,
+            informe_seleccionado: str,
+            config: str,
+            session_id: Optional[str] = None,
+    ) -> Iterator[str]:
+        """
+        Runs the agent with the provided query and streams its final answer.
+
+        The executor streams the chat model of each ReAct step, and only the
+        tokens that follow the "Final Answer:" prefix are yielded.
+
+        Args:
+            query (str): The query to be processed by the agent.
+            informe_seleccionado (str): Selected repport from filter selection.
+            config (str): Retrieval configuration selected by the user.
+            session_id (Optional[str]): Chat session of the query; None for the
+                default session.
+
+        Yields:
+            str: The pieces of the final answer, as they are generated.
+        """
+        yield from stream_agent_answer(
+            lambda callbacks: self.run(
+                query=query,
+                informe_seleccionado=informe_seleccionado,
+                config=config,
+                session_id=session_id,
+                callbacks=callbacks,
+            )
+        )
@@ -0,0 +1,713 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+# Authors: SDG DS unit
+"""
+Per-session conversation memory of the agent.
+
+The backend serves a single `Agent`, and every user used to share the same
+`ConversationBufferWindowMemory`: conversations were mixed, and requests had
+to be serialized to keep the history consistent. `SessionMemoryStore` keeps
+the conversation of each chat session apart, keyed by the session ID sent by
+the chat page, so that several users can be answered in parallel.
+
+Each session holds its last exchanges (user input and agent output), formatted
+as the chat history of the ReAct prompt. The store is bounded:
+- only the last `MEMORY_WINDOW` exchanges of a session are kept;
+- sessions idle for more than `MEMORY_TTL` seconds expire;
+- beyond `MEMORY_MAX_SESSIONS` sessions, the least recently active are evicted
+  (last read or written in memory, last written in SQLite).
+
+With `MEMORY_MODE=summary`, the chat history has a hard token budget instead
+of a fixed number of exchanges (see `SummarizingMemoryStore`): the recent
+exchanges are kept verbatim, and the older ones are folded by the LLM into a
+running summary of the session, in a background thread, so the prompt size
+stays flat over long sessions without delaying the answers.
+
+Two backends are available:
+- "memory": in-process LRU, for a single backend process;
+- "sqlite": local SQLite key-value store, shared by several worker processes
+  on the same host and kept across restarts.
+
+Configuration (environment variables):
+    - MEMORY_BACKEND: "memory" or "sqlite" (default: memory).
+    - MEMORY_MODE: "window" (last exchanges) or "summary" (token budget with a
+      running summary) (default: window).
+    - MEMORY_WINDOW: Exchanges kept per session in "window" mode (default: 6).
+    - MEMORY_TOKEN_BUDGET: Maximum tokens of the chat history in "summary" mode
+      (default: 1000).
+    - MEMORY_RECENT_TOKENS: Tokens of recent exchanges kept verbatim in "summary"
+      mode before the older ones are summarized (default: 600).
+    - MEMORY_TTL: Seconds after which an idle session expires (default: 3600).
+    - MEMORY_MAX_SESSIONS: Maximum sessions kept (default: 1000).
+    - MEMORY_SQLITE_PATH: SQLite file of the "sqlite" backend
+      (default: src/services/agent/session_memory/sessions.sqlite).
+"""
+
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Set, Tuple
+
+from dotenv import load_dotenv
+
+from src.services.llm.call_llm import call_llm
+from src.services.llm.prompts import get_memory_summary_prompt
+from src.utils.logging_config import setup_logging
+from src.utils.tokens import count_tokens, truncate_tokens
+
+load_dotenv()
+
+# Set up logging
+setup_logging()
+logger = logging.getLogger(name=__name__)
+
+MEMORY_BACKEND = os.getenv("MEMORY_BACKEND", "memory")
+MEMORY_MODE = os.getenv("MEMORY_MODE", "window")
+MEMORY_WINDOW = int(os.getenv("MEMORY_WINDOW", "6"))
+MEMORY_TOKEN_BUDGET = int(os.getenv("MEMORY_TOKEN_BUDGET", "1000"))
+MEMORY_RECENT_TOKENS = int(os.getenv("MEMORY_RECENT_TOKENS", "600"))
+MEMORY_TTL = float(os.getenv("MEMORY_TTL", "3600"))
+MEMORY_MAX_SESSIONS = int(os.getenv("MEMORY_MAX_SESSIONS", "1000"))
+MEMORY_SQLITE_PATH = os.getenv(
+    "MEMORY_SQLITE_PATH", "src/services/agent/session_memory/sessions.sqlite"
+)
+
+# Session of the requests that do not send a session ID
+DEFAULT_SESSION_ID = "default"
+
+# State of a session: {"exchanges": [[input, output], ...], "summary": str}
+SessionState = Dict[str, Any]
+# Returns the new state of a session from its current one (None if unknown or
+# expired), or None to leave it unchanged
+StateUpdate = Callable[[Optional[SessionState]], Optional[SessionState]]
+
+# Heading of the running summary in the chat history
+SUMMARY_PREFIX = "Summary of the earlier conversation:"
+
+
+def format_exchange(user_input: str, output: str) -> str:
+    """
+    Formats an exchange as in the chat history of the agent prompt.
+
+    Args:
+        user_input (str): Input of the user.
+        output (str): Final output of the agent.
+
+    Returns:
+        str: A "Human:" line and an "AI:" line.
+    """
+    return f"Human: {user_input}\nAI: {output}"
+
+
+class InProcessMemoryBackend:
+    """
+    In-process LRU of session states, with idle expiry.
+
+    Attributes:
+        max_sessions (int): Maximum sessions kept.
+        ttl (float): Seconds after which an idle session expires.
+    """
+
+    def __init__(
+            self, max_sessions: int = MEMORY_MAX_SESSIONS, ttl: float = MEMORY_TTL
+    ) -> None:
+        """
+        Initializes an empty backend.
+
+        Args:
+            max_sessions (int): Maximum sessions kept.
+            ttl (float): Seconds after which an idle session expires.
+        """
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self._sessions: "OrderedDict[str, Tuple[float, SessionState]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def load(self, session_id: str) -> Optional[SessionState]:
+        """
+        Returns the state of a session.
+
+        Args:
+            session_id (str): ID of the session.
+
+        Returns:
+            Optional[SessionState]: The state, or None if unknown or expired.
+        """
+        with self._lock:
+            return self._get(session_id)
+
+    def save(self, session_id: str, state: SessionState) -> None:
+        """
+        Stores the state of a session, evicting the least recently used ones.
+
+        Args:
+            session_id (str): ID of the session.
+            state (SessionState): The state to store.
+        """
+        with self._lock:
+            self._put(session_id, state)
+
+    def update(self, session_id: str, update: StateUpdate) -> Optional[SessionState]:
+        """
+        Reads, updates and stores the state of a session atomically.
+
+        Args:
+            session_id (str): ID of the session.
+            update (StateUpdate): Returns the new state from the current one,
+                or None to leave it unchanged.
+
+        Returns:
+            Optional[SessionState]: The stored state, or None if unchanged.
+        """
+        with self._lock:
+            state = update(self._get(session_id))
+            if state is not None:
+                self._put(session_id, state)
+            return state
+
+    def _get(self, session_id: str) -> Optional[SessionState]:
+        """
+        Returns the state of a session; the caller holds the lock.
+
+        Args:
+            session_id (str): ID of the session.
+
+        Returns:
+            Optional[SessionState]: The state, or None if unknown or expired.
+        """
+        entry = self._sessions.get(session_id)
+        if entry is None:
+            return None
+        updated_at, state = entry
+        if time.time() - updated_at > self.ttl:
+            del self._sessions[session_id]
+            return None
+        self._sessions.move_to_end(session_id)
+        return state
+
+    def _put(self, session_id: str, state: SessionState) -> None:
+        """
+        Stores the state of a session; the caller holds the lock.
+
+        Args:
+            session_id (str): ID of the session.
+            state (SessionState): The state to store.
+        """
+        now = time.time()
+        self._sessions[session_id] = (now, state)
+        self._sessions.move_to_end(session_id)
+        # Expired sessions are at the front, as are the least recently used
+        while self._sessions:
+            oldest_id, (updated_at, _) = next(iter(self._sessions.items()))
+            if len(self._sessions) <= self.max_sessions and now - updated_at <= self.ttl:
+                break
+            del self._sessions[oldest_id]
+
+    def delete(self, session_id: str) -> None:
+        """
+        Removes a session.
+
+        Args:
+            session_id (str): ID of the session.
+        """
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    def __len__(self) -> int:
+        """
+        Returns the number of sessions kept.
+        """
+        return len(self._sessions)
+
+
+class SQLiteMemoryBackend:
+    """
+    Session states stored in a local SQLite file, shared between processes.
+
+    Every write runs in a `BEGIN IMMEDIATE` transaction, which takes the write
+    lock of the file: the read-modify-write of `update` is atomic across the
+    worker processes, not only across the threads of one process.
+
+    Attributes:
+        path (str): SQLite file of the store.
+        max_sessions (int): Maximum sessions kept.
+        ttl (float): Seconds after which an idle session expires.
+    """
+
+    def __init__(
+            self,
+            path: str = MEMORY_SQLITE_PATH,
+            max_sessions: int = MEMORY_MAX_SESSIONS,
+            ttl: float = MEMORY_TTL,
+    ) -> None:
+        """
+        Opens the store, creating it if needed.
+
+        Args:
+            path (str): SQLite file of the store.
+            max_sessions (int): Maximum sessions kept.
+            ttl (float): Seconds after which an idle session expires.
+        """
+        self.path = path
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        # The other worker processes write to the same file; transactions are
+        # opened explicitly (autocommit mode) so they can be IMMEDIATE
+        self._db = sqlite3.connect(
+            path, check_same_thread=False, timeout=30, isolation_level=None
+        )
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS sessions ("
+            "session_id TEXT PRIMARY KEY, state TEXT NOT NULL, updated_at REAL NOT NULL)"
+        )
+        self._db.execute(
+            "CREATE INDEX IF NOT EXISTS sessions_updated_at ON sessions (updated_at)"
+        )
+        logger.info(f"Session memory stored in '{path}'.")
+
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        """
+        Runs a write transaction, holding the write lock of the file.
+
+        Yields:
+            sqlite3.Connection: The connection, inside the transaction.
+        """
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                yield self._db
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+            self._db.execute("COMMIT")
+
+    def load(self, session_id: str) -> Optional[SessionState]:
+        """
+        Returns the state of a session.
+
+        Args:
+            session_id (str): ID of the session.
+
+        Returns:
+            Optional[SessionState]: The state, or None if unknown or expired.
+        """
+        with self._lock:
+            return self._get(self._db, session_id)
+
+    def save(self, session_id: str, state: SessionState) -> None:
+        """
+        Stores the state of a session, evicting expired and least recently written ones.
+
+        Args:
+            session_id (str): ID of the session.
+            state (SessionState): The state to store.
+        """
+        with self._transaction() as db:
+            self._put(db, session_id, state)
+
+    def update(self, session_id: str, update: StateUpdate) -> Optional[SessionState]:
+        """
+        Reads, updates and stores the state of a session in one transaction.
+
+        Args:
+            session_id (str): ID of the session.
+            update (StateUpdate): Returns the new state from the current one,
+                or None to leave it unchanged.
+
+        Returns:
+            Optional[SessionState]: The stored state, or None if unchanged.
+        """
+        with self._transaction() as db:
+            state = update(self._get(db, session_id))
+            if state is not None:
+                self._put(db, session_id, state)
+            return state
+
+    def _get(self, db: sqlite3.Connection, session_id: str) -> Optional[SessionState]:
+        """
+        Returns the state of a session.
+
+        Args:
+            db (sqlite3.Connection): The connection.
+            session_id (str): ID of the session.
+
+        Returns:
+            Optional[SessionState]: The state, or None if unknown or expired.
+        """
+        row = db.execute(
+            "SELECT state FROM sessions WHERE session_id = ? AND updated_at >= ?",
+            (session_id, time.time() - self.ttl),
+        ).fetchone()
+        if row is None:
+            return None
+        return json.loads(row[0])
+
+    def _put(self, db: sqlite3.Connection, session_id: str, state: SessionState) -> None:
+        """
+        Stores the state of a session, within the caller's transaction.
+
+        Args:
+            db (sqlite3.Connection): The connection.
+            session_id (str): ID of the session.
+            state (SessionState): The state to store.
+        """
+        now = time.time()
+        db.execute(
+            "INSERT OR REPLACE INTO sessions (session_id, state, updated_at) "
+            "VALUES (?, ?, ?)",
+            (session_id, json.dumps(state), now),
+        )
+        db.execute("DELETE FROM sessions WHERE updated_at < ?", (now - self.ttl,))
+        db.execute(
+            "DELETE FROM sessions WHERE session_id IN ("
+            "SELECT session_id FROM sessions ORDER BY updated_at DESC "
+            "LIMIT -1 OFFSET ?)",
+            (self.max_sessions,),
+        )
+
+    def delete(self, session_id: str) -> None:
+        """
+        Removes a session.
+
+        Args:
+            session_id (str): ID of the session.
+        """
+        with self._transaction() as db:
+            db.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+
+    def __len__(self) -> int:
+        """
+        Returns the number of sessions kept.
+        """
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+
+
+class SessionMemoryStore:
+    """
+    Conversation memory of every chat session.
+
+    Attributes:
+        backend (Any): Backend storing the session states.
+        window (int): Exchanges kept per session.
+    """
+
+    def __init__(self, backend: Any, window: int = MEMORY_WINDOW) -> None:
+        """
+        Initializes the store.
+
+        Args:
+            backend (Any): Backend storing the session states
+                (`InProcessMemoryBackend` or `SQLiteMemoryBackend`).
+            window (int): Exchanges kept per session.
+        """
+        self.backend = backend
+        self.window = window
+
+    def exchanges(self, session_id: Optional[str]) -> List[Tuple[str, str]]:
+        """
+        Returns the last exchanges of a session.
+
+        Args:
+            session_id (Optional[str]): ID of the session.
+
+        Returns:
+            List[Tuple[str, str]]: (input, output) of each exchange, oldest first.
+        """
+        state = self.backend.load(session_id or DEFAULT_SESSION_ID) or {}
+        return [tuple(exchange) for exchange in state.get("exchanges", [])]
+
+    def chat_history(self, session_id: Optional[str]) -> str:
+        """
+        Returns the conversation of a session, formatted for the agent prompt.
+
+        Args:
+            session_id (Optional[str]): ID of the session.
+
+        Returns:
+            str: One "Human:" and one "AI:" line per exchange.
+        """
+        return "\n".join(
+            format_exchange(user_input, output)
+            for user_input, output in self.exchanges(session_id)
+        )
+
+    def add_exchange(
+            self, session_id: Optional[str], user_input: str, output: str
+    ) -> None:
+        """
+        Appends an exchange to a session, keeping the last `window` ones.
+
+        Args:
+            session_id (Optional[str]): ID of the session.
+            user_input (str): Input of the user.
+            output (str): Final output of the agent.
+        """
+
+        def append(state: Optional[SessionState]) -> SessionState:
+            exchanges = list((state or {}).get("exchanges", []))
+            exchanges.append([user_input, output])
+            return {"exchanges": exchanges[-self.window:]}
+
+        self.backend.update(session_id or DEFAULT_SESSION_ID, append)
+
+    def clear(self, session_id: Optional[str]) -> None:
+        """
+        Forgets the conversation of a session.
+
+        Args:
+            session_id (Optional[str]): ID of the session.
+        """
+        self.backend.delete(session_id or DEFAULT_SESSION_ID)
+
+
+class SummarizingMemoryStore(SessionMemoryStore):
+    """
+    Conversation memory with a token budget and a running summary per session.
+
+    The chat history of a session is its summary followed by its most recent
+    exchanges, and never exceeds `token_budget` tokens: the summary takes at
+    most `token_budget - recent_tokens` tokens, and the newest exchanges fill
+    the rest. Once the exchanges not yet summarized exceed `recent_tokens`,
+    the oldest ones are folded into the summary by the LLM in a background
+    thread; meanwhile, the history only shows the exchanges that fit.
+
+    Attributes:
+        backend (Any): Backend storing the session states.
+        token_budget (int): Maximum tokens of the chat history.
+        recent_tokens (int): Tokens of recent exchanges kept verbatim.
+        summarize (Callable[[str, List[Tuple[str, str]]], str]): Returns the
+            summary updated with the given exchanges.
+    """
+
+    def __init__(
+            self,
+            backend: Any,
+            token_budget: int = MEMORY_TOKEN_BUDGET,
+            recent_tokens: int = MEMORY_RECENT_TOKENS,
+            summarize: Optional[Callable[[str, List[Tuple[str, str]]], str]] = None,
+    ) -> None:
+        """
+        Initializes the store.
+
+        Args:
+            backend (Any): Backend storing the session states.
+            token_budget (int): Maximum tokens of the chat history.
+            recent_tokens (int): Tokens of recent exchanges kept verbatim,
+                at most `token_budget`.
+            summarize (Optional[Callable[[str, List[Tuple[str, str]]], str]]):
+                Returns the summary updated with the given exchanges. Defaults
+                to `summarize_exchanges`.
+        """
+        super().__init__(backend=backend)
+        self.token_budget = token_budget
+        self.recent_tokens = min(recent_tokens, token_budget)
+        self.summarize = summarize or (
+            lambda summary, exchanges: summarize_exchanges(
+                summary, exchanges, max_tokens=self.summary_tokens
+            )
+        )
+        self._summarizing: Set[str] = set()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="memory-summary"
+        )
+
+    @property
+    def summary_tokens(self) -> int:
+        """
+        Returns the tokens of the chat history reserved for the summary.
+        """
+        return self.token_budget - self.recent_tokens
+
+    def chat_history(self, session_id: Optional[str]) -> str:
+        """
+        Returns the summary and recent exchanges of a session, within the budget.
+
+        Args:
+            session_id (Optional[str]): ID of the session.
+
+        Returns:
+            str: The summary, then one "Human:" and one "AI:" line per exchange.
+        """
+        state = self.backend.load(session_id or DEFAULT_SESSION_ID) or {}
+        parts = []
+        remaining = self.token_budget
+
+        summary = truncate_tokens(
+            state.get("summary", ""),
+            self.summary_tokens - count_tokens(SUMMARY_PREFIX),
+        )
+        if summary:
+            parts.append(f"{SUMMARY_PREFIX} {summary}")
+            remaining -= count_tokens(parts[0])
+
+        # Newest exchanges first, while they fit; the newest one is cut if needed
+        recent = []
+        for user_input, output in reversed(state.get("exchanges", [])):
+            exchange = format_exchange(user_input, output)
+            tokens = count_tokens(exchange)
+            if tokens > remaining:
+                if not recent and remaining > 0:
+                    recent.append(truncate_tokens(exchange, remaining))
+                break
+            recent.append(exchange)
+            remaining -= tokens
+
+        return "\n".join(parts + list(reversed(recent)))
+
+    def add_exchange(
+            self, session_id: Optional[str], user_input: str, output: str
+    ) -> None:
+        """
+        Appends an exchange to a session and schedules the summary update if due.
+
+        Args:
+            session_id (Optional[str]): ID of the session.
+            user_input (str): Input of the user.
+            output (str): Final output of the agent.
+        """
+        session_id = session_id or DEFAULT_SESSION_ID
+
+        def append(state: Optional[SessionState]) -> SessionState:
+            state = state or {}
+            exchanges = list(state.get("exchanges", []))
+            exchanges.append([user_input, output])
+            return {"summary": state.get("summary", ""), "exchanges": exchanges}
+
+        self.backend.update(session_id, append)
+        self._schedule_fold(session_id)
+
+    def _schedule_fold(self, session_id: str) -> None:
+        """
+        Submits the summary update of a session if its exchanges exceed `recent_tokens`.
+
+        Only one update per session runs at a time; the next one is scheduled
+        when it succeeds, or with the next exchange added if it failed.
+
+        Args:
+            session_id (str): ID of the session.
+        """
+        with self._lock:
+            if session_id in self._summarizing:
+                return
+            state = self.backend.load(session_id)
+            if state is None:
+                return
+            summary = state.get("summary", "")
+            exchanges = [list(exchange) for exchange in state.get("exchanges", [])]
+
+            # Oldest exchanges beyond the verbatim budget; the newest one stays
+            folded = []
+            recent_tokens = sum(count_tokens(format_exchange(*e)) for e in exchanges)
+            for exchange in exchanges[:-1]:
+                if recent_tokens <= self.recent_tokens:
+                    break
+                folded.append(exchange)
+                recent_tokens -= count_tokens(format_exchange(*exchange))
+            if not folded:
+                return
+            self._summarizing.add(session_id)
+
+        self._executor.submit(self._fold, session_id, summary, folded)
+
+    def _fold(
+            self, session_id: str, summary: str, folded: List[List[str]]
+    ) -> None:
+        """
+        Folds the oldest exchanges of a session into its summary.
+
+        If the LLM call fails, the session is left unchanged: its exchanges
+        are kept, and the update is retried with the next exchange added.
+
+        Args:
+            session_id (str): ID of the session.
+            summary (str): Summary of the session when the update was scheduled.
+            folded (List[List[str]]): Exchanges to fold, oldest first.
+        """
+        try:
+            new_summary = self.summarize(
+                summary, [tuple(exchange) for exchange in folded]
+            )
+
+            def replace(state: Optional[SessionState]) -> Optional[SessionState]:
+                # The session may have expired, been cleared or been folded by
+                # another worker in the meantime
+                if state is None:
+                    return None
+                exchanges = [list(exchange) for exchange in state.get("exchanges", [])]
+                if exchanges[:len(folded)] != folded:
+                    return None
+                return {"summary": new_summary, "exchanges": exchanges[len(folded):]}
+
+            self.backend.update(session_id, replace)
+        except Exception as e:
+            logger.warning(f"Could not summarize the memory of session '{session_id}': {e}")
+            return
+        finally:
+            with self._lock:
+                self._summarizing.discard(session_id)
+        # Exchanges added in the meantime may already be due
+        self._schedule_fold(session_id)
+
+
+def summarize_exchanges(
+        summary: str, exchanges: List[Tuple[str, str]], max_tokens: int
+) -> str:
+    """
+    Updates the running summary of a session with older exchanges, using the LLM.
+
+    Args:
+        summary (str): Current summary (empty for the first one).
+        exchanges (List[Tuple[str, str]]): Exchanges to fold, oldest first.
+        max_tokens (int): Maximum tokens of the summary.
+
+    Returns:
+        str: The updated summary.
+    """
+    prompt = get_memory_summary_prompt(
+        summary=summary, exchanges=exchanges, max_words=max_tokens
+    )
+    # LLM tokens are shorter than words: leave room for the requested length
+    return call_llm(prompt=prompt, temperature=0, max_tokens=2 * max_tokens)
+
+
+def create_memory_store(
+        backend: str = MEMORY_BACKEND, mode: str = MEMORY_MODE
+) -> SessionMemoryStore:
+    """
+    Creates the session memory store with the configured backend and mode.
+
+    Args:
+        backend (str): "memory" or "sqlite".
+        mode (str): "window" or "summary".
+
+    Returns:
+        SessionMemoryStore: The store.
+
+    Raises:
+        ValueError: If the backend or the mode is unknown.
+    """
+    if backend == "memory":
+        session_backend = InProcessMemoryBackend()
+    elif backend == "sqlite":
+        session_backend = SQLiteMemoryBackend()
+    else:
+        raise ValueError(f"Unknown memory backend '{backend}'.")
+
+    if mode == "window":
+        return SessionMemoryStore(backend=session_backend)
+    if mode == "summary":
+        return SummarizingMemoryStore(backend=session_backend)
+    raise ValueError(f"Unknown memory mode '{mode}'.")
@@ -0,0 +1,156 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+# Authors: SDG DS unit
+"""
+Streaming of the final answer of the ReAct agent.
+
+`/query` only answers once `AgentExecutor.invoke` has gone through the whole
+ReAct loop (thoughts, tool calls and final answer). `FinalAnswerStreamHandler`
+is a LangChain callback that watches the tokens generated by the chat model
+and, once the "Final Answer:" prefix of the ReAct prompt has been generated,
+forwards the following tokens to a queue. The tokens of the intermediate
+steps (thoughts, actions) are never forwarded.
+
+`stream_agent_answer` runs the agent in a worker thread and yields the answer
+tokens from that queue as they arrive, so the first words reach the user about
+one LLM first-token latency after the last tool call, instead of after the
+whole pipeline.
+
+Functions:
+    - stream_agent_answer: Runs an agent call and yields its answer tokens.
+"""
+
+import contextvars
+import queue
+import threading
+from typing import Any, Callable, Dict, Iterator, List
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+# Prefix of the final answer in the ReAct prompt (see `get_character_prompt`)
+FINAL_ANSWER_PREFIX = "Final Answer:"
+
+# Marker put on the token queue once the agent call has finished
+_DONE = object()
+
+
+class FinalAnswerStreamHandler(BaseCallbackHandler):
+    """
+    Callback that forwards the tokens generated after the final answer prefix.
+
+    Attributes:
+        tokens (queue.Queue): Queue receiving the answer tokens.
+        prefix (str): Text that precedes the final answer.
+        streamed (bool): Whether any answer token has been forwarded.
+    """
+
+    def __init__(
+            self, tokens: queue.Queue, prefix: str = FINAL_ANSWER_PREFIX
+    ) -> None:
+        """
+        Initializes the handler.
+
+        Args:
+            tokens (queue.Queue): Queue receiving the answer tokens.
+            prefix (str): Text that precedes the final answer.
+        """
+        self.tokens = tokens
+        self.prefix = prefix
+        self.streamed = False
+        self._buffer = ""
+        self._answering = False
+
+    def on_llm_start(self, *args: Any, **kwargs: Any) -> None:
+        """
+        Resets the state at the start of each LLM call of the ReAct loop.
+        """
+        self._buffer = ""
+        self._answering = False
+
+    on_chat_model_start = on_llm_start
+
+    def on_llm_new_token(self, token: str, **kwargs: Any) -> None:
+        """
+        Forwards the token if the final answer has started.
+
+        Args:
+            token (str): The new token generated by the chat model.
+        """
+        if self._answering:
+            self._put(token)
+            return
+
+        self._buffer += token
+        position = self._buffer.find(self.prefix)
+        if position >= 0:
+            self._answering = True
+            # Text generated in the same token right after the prefix
+            self._put(self._buffer[position + len(self.prefix):].lstrip())
+            self._buffer = ""
+
+    def _put(self, text: str) -> None:
+        """
+        Puts a non-empty piece of the answer on the queue.
+
+        Args:
+            text (str): Piece of the answer.
+        """
+        if not text:
+            return
+        if not self.streamed:
+            # Drop the whitespace between the prefix and the answer
+            text = text.lstrip()
+            if not text:
+                return
+        self.streamed = True
+        self.tokens.put(text)
+
+
+def stream_agent_answer(
+        run: Callable[[List[BaseCallbackHandler]], str],
+) -> Iterator[str]:
+    """
+    Runs an agent call in a worker thread and yields its answer tokens.
+
+    If no token could be streamed (e.g. the agent stopped without a final
+    answer, or the answer was produced by the parsing error handler), the
+    whole output is yielded once the agent has finished.
+
+    Args:
+        run (Callable[[List[BaseCallbackHandler]], str]): Runs the agent with
+            the given callbacks and returns its final output.
+
+    Yields:
+        str: The pieces of the final answer, in order.
+
+    Raises:
+        Exception: Any error raised by the agent call.
+    """
+    tokens: queue.Queue = queue.Queue()
+    handler = FinalAnswerStreamHandler(tokens=tokens)
+    outcome: Dict[str, Any] = {}
+
+    def worker() -> None:
+        try:
+            outcome["output"] = run([handler])
+        except Exception as e:
+            outcome["error"] = e
+        finally:
+            tokens.put(_DONE)
+
+    # The worker runs in a copy of the caller's context (e.g. its request state)
+    context = contextvars.copy_context()
+    threading.Thread(
+        target=context.run, args=(worker,), name="agent-stream", daemon=True
+    ).start()
+
+    while True:
+        token = tokens.get()
+        if token is _DONE:
+            break
+        yield token
+
+    if "error" in outcome:
+        raise outcome["error"]
+    if not handler.streamed:
+        yield outcome.get("output", "")
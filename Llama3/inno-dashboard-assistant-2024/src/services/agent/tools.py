@@ -9,22 +9,23 @@ These tools interact with a Qdrant database client and can be used for retrievin
 contextual information and data origins. The tools include the 'Context' tool to 
 provide relevant information from the database and the 'Origin' tool to retrieve 
 metadata such as the report's origin, location, or other relevant details.
+
+The tools are created once with the agent. The report and configuration selected
+by the user are read from the active agent context (see `context`) on each call.
 """
 
 import json
 import logging
-from typing import Any, Callable, Dict, List, Tuple
+from typing import Any, Callable, Dict, List, Optional, Tuple
 
 from langchain_groq import ChatGroq
 from langchain.agents import Tool
+from src.services.agent.context import current_agent_context
 from src.services.llm.call_llm import call_llm
 from src.services.llm.prompts import get_context_prompt
-from src.services.retrievers.selfq_retrievers import (
-    get_reports,
-    setup_retrievers,
-)
-from src.services.retrievers.vector_store_retrievers import (
-    setup_retrievers as setup_fast_retriever)
+from src.services.retrievers.request_context import retrieval_scope
+from src.services.retrievers.retriever_registry import retriever_registry
+from src.services.retrievers.selfq_retrievers import get_reports
 from src.utils.logging_config import setup_logging
 
 # Set up logging
@@ -32,9 +33,7 @@ setup_logging()
 logger = logging.getLogger(name=__name__)
 
 
-def get_tools(
-        qdrant_client: Any,config: str, informe_seleccionado: str = None, 
-) -> List[Tool]:
+def get_tools(qdrant_client: Any) -> List[Tool]:
     """
     Returns a list of tools that can be used by an agent.
 
@@ -47,9 +46,7 @@ def get_tools(
     tools = [
         Tool(
             name="Context",
-            func=context(
-                qdrant_client, informe_seleccionado, config
-            ),  # Calling the context function
+            func=context(qdrant_client),  # Calling the context function
             description="Anytime further information is needed, or you don't have specific information"
                         " from previus conversations, this tool provides the available information to"
                         " answer the user's query.",
@@ -70,6 +67,8 @@ def origin(qdrant_client: Any) -> Callable[[str], List[str]]:
     """
     Returns the origin tool for retrieving the source or location of data.
 
+    The report selected in the active agent context is applied as a hard metadata filter.
+
     Args:
         qdrant_client (Any): The client to interact with the Qdrant database.
 
@@ -79,17 +78,19 @@ def origin(qdrant_client: Any) -> Callable[[str], List[str]]:
     """
 
     def origin_tool(query: str) -> List[str]:
+        informe_seleccionado = current_agent_context().informe_seleccionado
         # Number of elements to retrieve
         n_values = {"Elements": 3}
         collections = [{"name": "Elements", "n": 3}]
         model = "ms-marco-MiniLM-L-12-v2"
-        origin_retriever = setup_retrievers(
+        origin_retriever = retriever_registry.get(
             qdrant_client=qdrant_client,
             collections=collections,
             n_values=n_values,
             model=model,
         )
-        final_result = origin_retriever.invoke(input=query)
+        with retrieval_scope(report_id=selected_report_id(informe_seleccionado)):
+            final_result = origin_retriever.invoke(input=query)
 
         # Append information about the origin of the requested element
         final_result.append(
@@ -105,29 +106,30 @@ def origin(qdrant_client: Any) -> Callable[[str], List[str]]:
 
     return origin_tool
 
-def context(
-        qdrant_client: Any, informe_seleccionado: str = None, config: str = 'Optimized'
-) -> Callable[[str], List[str]]:
+def context(qdrant_client: Any) -> Callable[[str], List[str]]:
     """
     Returns the context tool for retrieving relevant information based on a query.
 
+    The active agent context provides the selected report, used to implement Selfquerying
+    metada filtering, and the configuration that chooses the type of retriever
+    ('Max Speed', 'Efficient', 'Optimized', 'High Precision', 'Max Accuracy').
+
     Args:
         qdrant_client (Any): The client to interact with the Qdrant database.
-        informe_seleccionado (str = None): Name of the selected report used to implement Selfquerying metada filtering.
-        config (str): Configuration to choose the type of retriever ('optimized', 'efficient', 'high_performance', 'accurate').
 
     Returns:
         Callable[[str], List[str]]: A function that processes a query to retrieve context-based information.
     """
     
-    def context_tool(
-            query: str, informe_seleccionado=informe_seleccionado, config=config
-    ) -> List[str]:
+    def context_tool(query: str) -> List[str]:
+        request_context = current_agent_context()
+        informe_seleccionado = request_context.informe_seleccionado
+        config = request_context.config
         result = None
         names = None
         docs = query
-        if informe_seleccionado != "Todos los informes":
-            docs += f" filter results for the report {informe_seleccionado}"
+        # The selected report is applied as a hard filter by every retriever
+        report_id = selected_report_id(informe_seleccionado)
 
         # Check if we need to call LLM for context extraction (applies for optimized, high_performance, accurate)
         if config in ['Optimized', 'High Precision', 'Max Accuracy']:  # LLM context is required for these configs
@@ -156,33 +158,38 @@ def context(
                     # If the collection is related to report names, fetch the report data
                     names = get_reports(qdrant_client=qdrant_client)
             # Otherwise, retrieve data from the specified collections
-            ensemble_retriever = setup_retrievers(
+            ensemble_retriever = retriever_registry.get(
                 qdrant_client=qdrant_client,
                 collections=collections,
                 n_values=n_values,
                 model=model,
                 max_length=max_length,
+                parallel=True,
             )
-            result = ensemble_retriever.invoke(input=docs)
+            # The query is embedded once and shared by every collection
+            with retrieval_scope(report_id=report_id):
+                result = ensemble_retriever.invoke(input=docs)
 
         # Select retriever based on the configuration
         elif config == 'Max Speed':
             model = "ms-marco-TinyBERT-L-2-v2"
             n_values = {"Elements": 3}
             collections = [{"name": "Elements", "n": 3}]
-            retriever = setup_fast_retriever(
+            retriever = retriever_registry.get(
                 qdrant_client=qdrant_client,
                 collections=collections,
                 n_values=n_values,
                 model=model,
                 max_length=128,
+                self_query=False,
             )
-            result = retriever.invoke(input=docs)
+            with retrieval_scope(report_id=report_id):
+                result = retriever.invoke(input=docs)
         elif config == 'Efficient':
             model = "ms-marco-MiniLM-L-12-v2"
             n_values = {"Elements": 5}
             collections = [{"name": "Elements", "n": 5}]
-            retriever = setup_retrievers(
+            retriever = retriever_registry.get(
                 qdrant_client=qdrant_client,
                 collections=collections,
                 n_values=n_values,
@@ -190,7 +197,8 @@ def context(
                 max_length=256,
 
             )
-            result = retriever.invoke(input=docs)
+            with retrieval_scope(report_id=report_id):
+                result = retriever.invoke(input=docs)
 
 
         final_result = []
@@ -211,6 +219,21 @@ def context(
     return context_tool
 
 
+def selected_report_id(informe_seleccionado: str = None) -> Optional[str]:
+    """
+    Returns the report ID to filter by, given the report selected in the sidebar.
+
+    Args:
+        informe_seleccionado (str = None): Name of the selected report.
+
+    Returns:
+        Optional[str]: The report ID, or None when all reports are selected.
+    """
+    if not informe_seleccionado or informe_seleccionado == "Todos los informes":
+        return None
+    return informe_seleccionado
+
+
 def parse_llm_response(
         response: str,
 ) -> Tuple[Dict[str, int], List[Dict[str, Any]]]:
@@ -0,0 +1,130 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+# Authors: SDG DS unit
+"""
+Batched embedding of documents for the ingestion paths.
+
+The `DatabaseCreator` classes used to embed one text per model call, which
+leaves the model underused on CPU. `embed_texts` sends the texts in batches
+instead. Before batching, the texts are sorted by length, so that each batch
+holds texts of similar size and the tokenizer adds little padding. The
+embeddings are returned in the original order of the texts. `iter_embeddings`
+yields them batch by batch instead, so that they can be uploaded while the
+next batch is embedded.
+
+The batch size can be configured with the `EMBEDDING_BATCH_SIZE` environment
+variable (default: 32). Progress is reported in documents per second, and to
+the running ingestion job, if any, which can be cancelled between batches.
+"""
+
+import logging
+import os
+from typing import Iterator, List, Optional, Sequence, Tuple
+
+from dotenv import load_dotenv
+from langchain_core.embeddings import Embeddings
+from tqdm import tqdm
+
+from src.services.data.utils.ingestion_jobs import (
+    check_cancelled,
+    report_progress,
+    report_total,
+)
+from src.utils.logging_config import setup_logging
+
+load_dotenv()
+
+# Set up logging
+setup_logging()
+logger = logging.getLogger(name=__name__)
+
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "32"))
+
+
+def length_buckets(texts: Sequence[str], batch_size: int) -> List[List[int]]:
+    """
+    Groups the indices of the texts into batches of texts with similar length.
+
+    Args:
+        texts (Sequence[str]): Texts to group.
+        batch_size (int): Maximum number of texts per batch.
+
+    Returns:
+        List[List[int]]: Batches of indices into `texts`, longest texts first.
+    """
+    order = sorted(range(len(texts)), key=lambda i: len(texts[i]), reverse=True)
+    return [
+        order[start:start + batch_size]
+        for start in range(0, len(order), batch_size)
+    ]
+
+
+def iter_embeddings(
+        embedding_model: Embeddings,
+        texts: Sequence[str],
+        batch_size: Optional[int] = None,
+        desc: str = "Embedding documents",
+) -> Iterator[Tuple[int, List[float]]]:
+    """
+    Embeds the texts in length-bucketed batches, yielding each embedding as
+    soon as its batch is done.
+
+    Consumers can process (e.g. upload) the embeddings of a batch while the
+    next one is computed, without holding every embedding in memory.
+
+    Args:
+        embedding_model (Embeddings): Model used to embed the texts.
+        texts (Sequence[str]): Texts to embed.
+        batch_size (Optional[int]): Number of texts per model call. Defaults
+            to `EMBEDDING_BATCH_SIZE`.
+        desc (str): Label of the progress bar.
+
+    Yields:
+        Tuple[int, List[float]]: Index of the text in `texts` and its embedding,
+        in batch order (not in the order of `texts`).
+
+    Raises:
+        IngestionCancelled: If the running ingestion job is cancelled.
+    """
+    batch_size = max(1, batch_size or EMBEDDING_BATCH_SIZE)
+    report_total("embedded", len(texts))
+
+    with tqdm(total=len(texts), desc=desc, unit="doc") as progress:
+        for batch in length_buckets(texts=texts, batch_size=batch_size):
+            check_cancelled()
+            vectors = embedding_model.embed_documents([texts[i] for i in batch])
+            progress.update(len(batch))
+            report_progress("embedded", len(batch))
+            yield from zip(batch, vectors)
+
+    logger.info(f"Embedded {len(texts)} documents (batch size {batch_size}).")
+
+
+def embed_texts(
+        embedding_model: Embeddings,
+        texts: Sequence[str],
+        batch_size: Optional[int] = None,
+        desc: str = "Embedding documents",
+) -> List[List[float]]:
+    """
+    Embeds the texts in length-bucketed batches.
+
+    Args:
+        embedding_model (Embeddings): Model used to embed the texts.
+        texts (Sequence[str]): Texts to embed.
+        batch_size (Optional[int]): Number of texts per model call. Defaults
+            to `EMBEDDING_BATCH_SIZE`.
+        desc (str): Label of the progress bar.
+
+    Returns:
+        List[List[float]]: One embedding per text, in the order of `texts`.
+    """
+    embeddings: List[Optional[List[float]]] = [None] * len(texts)
+    for i, vector in iter_embeddings(
+            embedding_model=embedding_model,
+            texts=texts,
+            batch_size=batch_size,
+            desc=desc,
+    ):
+        embeddings[i] = vector
+    return embeddings
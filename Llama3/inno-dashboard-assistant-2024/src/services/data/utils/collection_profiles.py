@@ -0,0 +1,304 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+# Authors: SDG DS unit
+"""
+Declarative configuration of the Qdrant collections.
+
+Each collection used by the assistant is described by a `CollectionProfile`:
+vector size and distance, HNSW graph parameters, optional scalar int8
+quantization and the payload indexes for every metadata field the retrievers
+filter on. `ensure_collection` creates a collection from its profile, or brings
+an existing one in line with it (missing payload indexes, HNSW and quantization
+settings), and `get_search_params` returns the search parameters matching the
+profile (e.g. rescoring of quantized vectors with the original ones).
+
+Functions:
+- `resolve_alias`: Returns the collection an alias points to.
+- `ensure_collection`: Creates or updates a collection according to its profile.
+- `get_search_params`: Returns the search parameters of a collection.
+"""
+
+import logging
+from typing import Dict, Optional
+
+from qdrant_client import QdrantClient
+from qdrant_client.http import models
+
+from src.utils.logging_config import setup_logging
+
+# Set up logging
+setup_logging()
+logger = logging.getLogger(name=__name__)
+
+EMBEDDING_SIZE = 1024
+
+# Payload fields shared by the collections with insertion dates
+DATE_INDEXES = {
+    "metadata.insertion_year": models.PayloadSchemaType.KEYWORD,
+    "metadata.insertion_month": models.PayloadSchemaType.KEYWORD,
+    "metadata.insertion_day": models.PayloadSchemaType.KEYWORD,
+}
+
+
+class CollectionProfile:
+    """
+    Declarative description of a Qdrant collection.
+
+    Attributes:
+        name (str): Name of the collection.
+        vector_size (int): Size of the vectors.
+        distance (models.Distance): Distance metric.
+        payload_indexes (Dict[str, models.PayloadSchemaType]): Indexed payload fields.
+        hnsw_m (int): Number of edges per node of the HNSW graph.
+        hnsw_ef_construct (int): Number of neighbours considered while building the graph.
+        quantization (bool): Whether vectors are also stored as scalar int8.
+        oversampling (float): Candidates fetched per result before rescoring.
+        indexing_threshold (Optional[int]): Segment size (KB) above which vectors are indexed.
+    """
+
+    def __init__(
+            self,
+            name: str,
+            vector_size: int = EMBEDDING_SIZE,
+            distance: models.Distance = models.Distance.COSINE,
+            payload_indexes: Optional[Dict[str, models.PayloadSchemaType]] = None,
+            hnsw_m: int = 16,
+            hnsw_ef_construct: int = 100,
+            quantization: bool = False,
+            oversampling: float = 2.0,
+            indexing_threshold: Optional[int] = 10,
+    ) -> None:
+        """
+        Initializes the profile.
+
+        Args:
+            name (str): Name of the collection.
+            vector_size (int): Size of the vectors.
+            distance (models.Distance): Distance metric.
+            payload_indexes (Optional[Dict[str, models.PayloadSchemaType]]): Indexed payload fields.
+            hnsw_m (int): Number of edges per node of the HNSW graph.
+            hnsw_ef_construct (int): Number of neighbours considered while building the graph.
+            quantization (bool): Whether vectors are also stored as scalar int8.
+            oversampling (float): Candidates fetched per result before rescoring.
+            indexing_threshold (Optional[int]): Segment size (KB) above which vectors are indexed.
+        """
+        self.name = name
+        self.vector_size = vector_size
+        self.distance = distance
+        self.payload_indexes = payload_indexes or {}
+        self.hnsw_m = hnsw_m
+        self.hnsw_ef_construct = hnsw_ef_construct
+        self.quantization = quantization
+        self.oversampling = oversampling
+        self.indexing_threshold = indexing_threshold
+
+    def vectors_config(self) -> models.VectorParams:
+        """
+        Returns the vector parameters of the collection.
+        """
+        return models.VectorParams(size=self.vector_size, distance=self.distance)
+
+    def hnsw_config(self) -> models.HnswConfigDiff:
+        """
+        Returns the HNSW parameters of the collection.
+        """
+        return models.HnswConfigDiff(m=self.hnsw_m, ef_construct=self.hnsw_ef_construct)
+
+    def optimizers_config(self) -> Optional[models.OptimizersConfigDiff]:
+        """
+        Returns the optimizer parameters of the collection, if any.
+        """
+        if self.indexing_threshold is None:
+            return None
+        return models.OptimizersConfigDiff(indexing_threshold=self.indexing_threshold)
+
+    def quantization_config(self) -> Optional[models.ScalarQuantization]:
+        """
+        Returns the scalar int8 quantization of the collection, if enabled.
+        """
+        if not self.quantization:
+            return None
+        return models.ScalarQuantization(
+            scalar=models.ScalarQuantizationConfig(
+                type=models.ScalarType.INT8, quantile=0.99, always_ram=True
+            )
+        )
+
+    def search_params(self) -> Optional[models.SearchParams]:
+        """
+        Returns the search parameters matching the profile, if any.
+
+        Quantized collections are searched on the int8 vectors and the best
+        candidates are rescored with the original vectors.
+        """
+        if not self.quantization:
+            return None
+        return models.SearchParams(
+            quantization=models.QuantizationSearchParams(
+                rescore=True, oversampling=self.oversampling
+            )
+        )
+
+
+COLLECTION_PROFILES: Dict[str, CollectionProfile] = {
+    profile.name: profile
+    for profile in (
+        CollectionProfile(
+            name="table_elements",
+            payload_indexes={
+                "metadata.Id": models.PayloadSchemaType.KEYWORD,
+                "metadata.type": models.PayloadSchemaType.KEYWORD,
+                "metadata.page": models.PayloadSchemaType.INTEGER,
+                **DATE_INDEXES,
+            },
+            hnsw_m=16,
+            hnsw_ef_construct=128,
+            quantization=True,
+        ),
+        CollectionProfile(
+            name="text_pages",
+            payload_indexes={
+                "metadata.Report_Id": models.PayloadSchemaType.KEYWORD,
+                "metadata.page": models.PayloadSchemaType.INTEGER,
+                **DATE_INDEXES,
+            },
+            hnsw_m=16,
+            hnsw_ef_construct=128,
+            quantization=True,
+        ),
+        CollectionProfile(
+            name="report_sum",
+            payload_indexes={
+                "metadata.Report_Id": models.PayloadSchemaType.KEYWORD,
+                **DATE_INDEXES,
+            },
+        ),
+        CollectionProfile(
+            name="element_names",
+            payload_indexes={"metadata.report_id": models.PayloadSchemaType.KEYWORD},
+        ),
+        CollectionProfile(
+            name="upload_dates",
+            payload_indexes={"metadata.report_id": models.PayloadSchemaType.KEYWORD},
+        ),
+        # Single point holding the list of report names, without embedding
+        CollectionProfile(
+            name="report_names",
+            vector_size=1,
+            distance=models.Distance.EUCLID,
+            indexing_threshold=None,
+        ),
+    )
+}
+
+
+def _update_existing_collection(
+        qdrant_client: QdrantClient, profile: CollectionProfile, collection_name: str
+) -> None:
+    """
+    Applies the HNSW and quantization settings of a profile to an existing
+    collection, if they differ.
+
+    Args:
+        qdrant_client (QdrantClient): The Qdrant client.
+        profile (CollectionProfile): The collection profile.
+        collection_name (str): Name of the existing collection.
+    """
+    config = qdrant_client.get_collection(collection_name).config
+    hnsw = config.hnsw_config
+    hnsw_changed = (
+        hnsw.m != profile.hnsw_m or hnsw.ef_construct != profile.hnsw_ef_construct
+    )
+    quantization_changed = (config.quantization_config is not None) != profile.quantization
+
+    if hnsw_changed or quantization_changed:
+        logger.info(
+            f"[INFO] Updating HNSW/quantization settings of '{collection_name}'..."
+        )
+        qdrant_client.update_collection(
+            collection_name=collection_name,
+            hnsw_config=profile.hnsw_config() if hnsw_changed else None,
+            quantization_config=(
+                (profile.quantization_config() or models.Disabled.DISABLED)
+                if quantization_changed
+                else None
+            ),
+        )
+
+
+def resolve_alias(qdrant_client: QdrantClient, name: str) -> Optional[str]:
+    """
+    Returns the collection an alias points to.
+
+    Args:
+        qdrant_client (QdrantClient): The Qdrant client.
+        name (str): Name that may be an alias.
+
+    Returns:
+        Optional[str]: The aliased collection, or None if `name` is not an alias.
+    """
+    for alias in qdrant_client.get_aliases().aliases:
+        if alias.alias_name == name:
+            return alias.collection_name
+    return None
+
+
+def ensure_collection(
+        qdrant_client: QdrantClient,
+        profile: CollectionProfile,
+        collection_name: Optional[str] = None,
+) -> None:
+    """
+    Creates a collection from its profile, or updates it if it already exists,
+    and creates its payload indexes.
+
+    If the name is an alias (see `collection_versions`), the aliased collection
+    is updated.
+
+    Args:
+        qdrant_client (QdrantClient): The Qdrant client.
+        profile (CollectionProfile): The collection profile.
+        collection_name (Optional[str]): Name of the collection, if it differs
+            from the profile name.
+    """
+    collection_name = collection_name or profile.name
+    collection_name = resolve_alias(qdrant_client, collection_name) or collection_name
+
+    if qdrant_client.collection_exists(collection_name):
+        logger.info(
+            f"[INFO] The collection '{collection_name}' already exists. No need to recreate it."
+        )
+        _update_existing_collection(qdrant_client, profile, collection_name)
+    else:
+        logger.info(f"[INFO] Creating Qdrant data collection: {collection_name}...")
+        qdrant_client.create_collection(
+            collection_name=collection_name,
+            vectors_config=profile.vectors_config(),
+            hnsw_config=profile.hnsw_config(),
+            optimizers_config=profile.optimizers_config(),
+            quantization_config=profile.quantization_config(),
+        )
+        logger.info(f"[INFO] Collection '{collection_name}' created successfully.")
+
+    # Creating an index that already exists is a no-op in Qdrant
+    for field_name, field_schema in profile.payload_indexes.items():
+        qdrant_client.create_payload_index(
+            collection_name=collection_name,
+            field_name=field_name,
+            field_schema=field_schema,
+        )
+
+
+def get_search_params(collection_name: str) -> Optional[models.SearchParams]:
+    """
+    Returns the search parameters of a collection.
+
+    Args:
+        collection_name (str): Name of the collection.
+
+    Returns:
+        Optional[models.SearchParams]: The search parameters, or None if the
+        collection has no profile or needs no specific parameters.
+    """
+    profile = COLLECTION_PROFILES.get(collection_name)
+    return profile.search_params() if profile else None
@@ -0,0 +1,164 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+# Authors: SDG DS unit
+"""
+Blue/green rebuilds of the Qdrant collections behind aliases.
+
+In the default (incremental) mode, `/update_data` upserts into the live
+collections, so queries may see a half-updated collection. In blue/green mode,
+`rebuild_collection` builds a new versioned collection (e.g.
+"table_elements__v1733138400") from scratch, with its own ingestion manifest,
+checks that it holds exactly the points recorded by the manifest, and then
+atomically points the collection's alias ("table_elements") at it. Readers
+keep using the alias, so they never block and never see partial data. The
+previous version is deleted after the swap; if the build or the validation
+fails, the new version is dropped and the alias is left untouched.
+
+The first rebuild of a collection created before aliases were used has to
+replace the plain collection by an alias of the same name; that one swap is
+not atomic.
+
+Functions:
+- `versioned_name`: Returns the name of a new version of a collection.
+- `swap_alias`: Points an alias at a collection, atomically.
+- `rebuild_collection`: Builds, validates and swaps in a new version of a collection.
+"""
+
+import logging
+import os
+import time
+from typing import Callable
+
+from qdrant_client import QdrantClient
+from qdrant_client.http import models
+
+from src.services.data.utils.collection_profiles import (
+    COLLECTION_PROFILES,
+    ensure_collection,
+    resolve_alias,
+)
+from src.services.data.utils.ingestion_manifest import IngestionManifest
+from src.utils.logging_config import setup_logging
+
+# Set up logging
+setup_logging()
+logger = logging.getLogger(name=__name__)
+
+VERSION_SEPARATOR = "__v"
+
+
+class CollectionValidationError(RuntimeError):
+    """
+    Raised when a rebuilt collection does not hold the expected points.
+    """
+
+
+def versioned_name(collection_name: str) -> str:
+    """
+    Returns the name of a new version of a collection.
+
+    Args:
+        collection_name (str): Name of the collection (and of its alias).
+
+    Returns:
+        str: The versioned collection name.
+    """
+    return f"{collection_name}{VERSION_SEPARATOR}{time.time_ns() // 1_000_000}"
+
+
+def swap_alias(
+        qdrant_client: QdrantClient, alias_name: str, collection_name: str
+) -> None:
+    """
+    Points an alias at a collection and deletes the collection it pointed to.
+
+    Args:
+        qdrant_client (QdrantClient): The Qdrant client.
+        alias_name (str): Name of the alias read by the retrievers.
+        collection_name (str): Collection the alias must point to.
+    """
+    previous = resolve_alias(qdrant_client, alias_name)
+
+    if previous is None and qdrant_client.collection_exists(alias_name):
+        # Migration of a plain collection: the alias cannot coexist with it
+        logger.info(f"[INFO] Replacing the plain collection '{alias_name}' by an alias...")
+        qdrant_client.delete_collection(alias_name)
+
+    operations = []
+    if previous is not None:
+        operations.append(
+            models.DeleteAliasOperation(
+                delete_alias=models.DeleteAlias(alias_name=alias_name)
+            )
+        )
+    operations.append(
+        models.CreateAliasOperation(
+            create_alias=models.CreateAlias(
+                collection_name=collection_name, alias_name=alias_name
+            )
+        )
+    )
+    # Both operations are applied in a single atomic request
+    qdrant_client.update_collection_aliases(change_aliases_operations=operations)
+    logger.info(f"[INFO] Alias '{alias_name}' now points to '{collection_name}'.")
+
+    if previous is not None and previous != collection_name:
+        qdrant_client.delete_collection(previous)
+        logger.info(f"[INFO] Deleted the previous version '{previous}'.")
+
+
+def rebuild_collection(
+        qdrant_client: QdrantClient,
+        collection_name: str,
+        ingest: Callable[[IngestionManifest], None],
+) -> IngestionManifest:
+    """
+    Builds a new version of a collection, validates it and swaps it in.
+
+    Args:
+        qdrant_client (QdrantClient): The Qdrant client.
+        collection_name (str): Name of the collection (and of its alias).
+        ingest (Callable[[IngestionManifest], None]): Ingests every source
+            file into the collection named by the given (empty) manifest.
+
+    Returns:
+        IngestionManifest: The manifest of the collection now behind the alias.
+
+    Raises:
+        CollectionValidationError: If the new version does not hold the points
+            recorded by its manifest.
+    """
+    version = versioned_name(collection_name)
+    logger.info(f"[INFO] Building '{version}' for a blue/green update...")
+    ensure_collection(
+        qdrant_client=qdrant_client,
+        profile=COLLECTION_PROFILES[collection_name],
+        collection_name=version,
+    )
+    manifest = IngestionManifest(collection_name=version)
+
+    try:
+        ingest(manifest)
+        expected = len(set(manifest.point_ids(manifest.entries)))
+        actual = qdrant_client.count(collection_name=version, exact=True).count
+        if actual != expected:
+            raise CollectionValidationError(
+                f"'{version}' holds {actual} points, expected {expected}."
+            )
+    except Exception:
+        logger.error(f"[ERROR] Blue/green update of '{collection_name}' failed; dropping '{version}'.")
+        qdrant_client.delete_collection(version)
+        if os.path.exists(manifest.path):
+            os.remove(manifest.path)
+        raise
+
+    swap_alias(
+        qdrant_client=qdrant_client,
+        alias_name=collection_name,
+        collection_name=version,
+    )
+
+    # The manifest of the new version becomes the manifest of the collection
+    live_manifest = IngestionManifest(collection_name=collection_name)
+    os.replace(manifest.path, live_manifest.path)
+    return IngestionManifest(collection_name=collection_name)
@@ -4,41 +4,49 @@
 """
 This module defines the DatabaseCreator class to manage collections in the Qdrant database,
 used to store and process report data extracted from JSON files. The class includes
-methods to create collections, process report names, KPIs, charts, tables, and upload dates,
-and convert strings to integers based on ASCII values.
+methods to create collections and to process report names, KPIs, charts, tables, and upload dates.
+The metadata of each report is stored in a point whose ID is derived from the report ID.
 
 Functions:
-- `extract_json_from_file`: Extracts and returns JSON data from a given file.
 - `create_collections`: Creates the necessary collections in the Qdrant database.
-- `string_to_int_ascii`: Converts a string to an integer by summing the ASCII codes of its characters.
 - `process_report_names`: Processes report names and stores them in Qdrant.
 - `process_element_names`: Processes and stores unique elements (KPIs, charts, tables) in Qdrant.
 - `process_upload_dates`: Processes and stores upload dates in Qdrant.
+- `load_changed_reports`: Loads the files of the reports affected by new, modified or deleted files.
+- `delete_stale_points`: Deletes the points of reports that were not rewritten.
+- `record_reports`: Records the processed files in the manifest of a collection.
+- `rebuild`: Rebuilds collections in new versions swapped in behind their aliases.
 """
 
 import json
 import logging
 import os
-import re
 from collections import defaultdict
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
 
-from langchain_openai import OpenAIEmbeddings
 from qdrant_client import QdrantClient
 from qdrant_client.http import models
+from src.services.data.utils.batch_embedding import iter_embeddings
+from src.services.data.utils.collection_profiles import (
+    COLLECTION_PROFILES,
+    ensure_collection,
+)
+from src.services.data.utils.collection_versions import rebuild_collection
+from src.services.data.utils.embedding_store import get_document_embeddings
+from src.services.data.utils.ingestion_manifest import IngestionManifest
+from src.services.data.utils.point_ids import report_point_id
+from src.services.data.utils.point_uploader import PointUploader
+from src.services.data.utils.report_corpus import ReportPage, get_report_corpus
 from src.utils.logging_config import setup_logging
-from tqdm import tqdm
-from llama_index.embeddings.langchain import LangchainEmbedding
-from langchain_huggingface import HuggingFaceEmbeddings
-
-# Definir los embeddings de HuggingFace
-lc_embed_model = HuggingFaceEmbeddings(model_name="BAAI/bge-m3")
-embed_model = LangchainEmbedding(lc_embed_model)
 
 
 # Set up logging
 setup_logging()
 logger = logging.getLogger(name=__name__)
 
+# Group of each element type in the 'element_names' payload
+ELEMENT_GROUPS = {"KPI": "KPIs", "Chart": "Charts", "Table": "Tables"}
+
 
 class DatabaseCreator:
     """
@@ -47,8 +55,10 @@ class DatabaseCreator:
     Attributes:
         texts_folder (str): The folder containing JSON files with report data.
         qdrant_client (QdrantClient): Client to interact with the Qdrant database.
-        embedding_model (OpenAIEmbeddings): Model used to generate embeddings for report data.
+        embedding_model (Embeddings): Shared model used to generate embeddings for report data.
         embedding_size (int): The size of the embedding vectors.
+        manifests (Dict[str, IngestionManifest]): Source files already ingested, per collection.
+        corpus (ReportCorpus): Parsed report files of the texts folder.
     """
 
     def __init__(self, texts_folder: str):
@@ -61,7 +71,7 @@ class DatabaseCreator:
         self.texts_folder = texts_folder
         self.qdrant_client = QdrantClient(location="localhost", port=6333)
         logger.info("[INFO] Client created...")
-        self.embedding_model = embed_model
+        self.embedding_model = get_document_embeddings()
         self.embedding_size = (
             1024  # Change this according to the embedding size you use
         )
@@ -69,281 +79,371 @@ class DatabaseCreator:
         # Create necessary collections
         self.create_collections()
 
-    def extract_json_from_file(self, file_path: str):
-        """
-        Extracts JSON content from a given file.
+        # Parsed report files, shared with the table creator
+        self.corpus = get_report_corpus(self.texts_folder)
 
-        Args:
-            file_path (str): Path to the file from which JSON content is extracted.
+        # Track the ingested files of each collection to only process new or modified ones
+        self.manifests = {
+            collection_name: IngestionManifest(collection_name=collection_name)
+            for collection_name in ("report_names", "element_names", "upload_dates")
+        }
 
-        Returns:
-            dict or None: The extracted JSON data, or None if there is an error.
+    def create_collections(self):
         """
-        with open(file_path, "r", encoding="utf-8") as file:
-            content = file.read()
+        Creates the necessary collections in Qdrant from their profiles.
+        """
+        for collection_name in ("report_names", "element_names", "upload_dates"):
+            ensure_collection(
+                qdrant_client=self.qdrant_client,
+                profile=COLLECTION_PROFILES[collection_name],
+            )
 
-            # Search for the block delimited by 'json'
-            match = re.search(r"json(.*?)", content, re.DOTALL)
-            if match:
-                json_content = match.group(1).strip()
-            else:
-                json_content = content.strip().strip('"')
+    def load_changed_reports(
+            self,
+            manifest: IngestionManifest,
+            default_report_id: Callable[[str], str],
+    ) -> Tuple[List[str], List[str], Set[str], Dict[str, ReportPage]]:
+        """
+        Finds the reports affected by new, modified or deleted files and loads
+        every file of those reports.
 
-            json_content = json_content.replace("\\n", " ").strip()
-            json_content = json_content.replace("\\", "").strip()
+        A report is affected if one of its files changed, so its aggregated
+        point (elements or dates) has to be rebuilt from all of its files.
 
-            try:
-                return json.loads(json_content)
-            except json.JSONDecodeError as e:
-                logger.error(f"Error decoding JSON: {e}")
-                return None
+        Args:
+            manifest (IngestionManifest): Manifest of the collection to update.
+            default_report_id (Callable[[str], str]): Report ID used for a file
+                without "report_id", given the file name.
 
-    def create_collections(self):
-        """
-        Creates the necessary collections in Qdrant.
+        Returns:
+            Tuple[List[str], List[str], Set[str], Dict[str, ReportPage]]:
+            The new or modified files, the deleted files, the affected report
+            IDs, and the parsed page of every file of the affected reports.
         """
-        # Collection for report names, without embedding
-        try:
-            self.qdrant_client.get_collection("report_names")
-            logger.info(
-                f"[INFO] The collection 'report_names' already exists. It will not be recreated."
-            )
-        except Exception:
-            logger.info(
-                "[INFO] Creating Qdrant data collection: report_names..."
-            )
-            self.qdrant_client.create_collection(
-                collection_name="report_names",
-                vectors_config=models.VectorParams(
-                    size=1, distance=models.Distance.EUCLID
-                ),  # No embedding
-            )
-            logger.info(
-                "[INFO] 'report_names' collection created successfully."
-            )
-
-        # Collection for element names, with embedding
-        try:
-            self.qdrant_client.get_collection("element_names")
-            logger.info(
-                f"[INFO] The collection 'element_names' already exists. It will not be recreated."
-            )
-        except Exception:
-            logger.info(
-                "[INFO] Creating Qdrant data collection: element_names..."
-            )
-            self.qdrant_client.create_collection(
-                collection_name="element_names",
-                vectors_config=models.VectorParams(
-                    size=self.embedding_size, distance=models.Distance.COSINE
-                ),
-                optimizers_config=models.OptimizersConfigDiff(
-                    indexing_threshold=10
-                ),
-            )
-            logger.info(
-                "[INFO] 'element_names' collection created successfully."
+        manifest.reconcile(qdrant_client=self.qdrant_client)
+        changed_files, removed_files = manifest.scan(self.texts_folder)
+
+        contents = self.corpus.load(changed_files)
+        affected_report_ids = {
+            manifest.report_id(file) for file in changed_files + removed_files
+        } | {
+            page.report_id if page.report_id is not None else default_report_id(file)
+            for file, page in contents.items()
+        }
+        affected_report_ids.discard(None)
+
+        # Load the unchanged files of the affected reports
+        contents.update(
+            self.corpus.load(
+                file
+                for file, entry in manifest.entries.items()
+                if file not in removed_files
+                and file not in contents
+                and entry.get("report_id") in affected_report_ids
             )
+        )
 
-        # Collection for upload dates, with embedding
-        try:
-            self.qdrant_client.get_collection("upload_dates")
-            logger.info(
-                f"[INFO] The collection 'upload_dates' already exists. It will not be recreated."
-            )
-        except Exception:
-            logger.info(
-                "[INFO] Creating Qdrant data collection: upload_dates..."
-            )
-            self.qdrant_client.create_collection(
-                collection_name="upload_dates",
-                vectors_config=models.VectorParams(
-                    size=self.embedding_size, distance=models.Distance.COSINE
-                ),
-                optimizers_config=models.OptimizersConfigDiff(
-                    indexing_threshold=10
-                ),
-            )
-            logger.info(
-                "[INFO] 'upload_dates' collection created successfully."
-            )
+        return changed_files, removed_files, affected_report_ids, contents
 
-    def string_to_int_ascii(self, s: str) -> int:
+    def delete_stale_points(
+            self,
+            manifest: IngestionManifest,
+            affected_report_ids: Set[str],
+            point_ids: List[str],
+    ) -> None:
         """
-        Converts a string to an integer by summing the ASCII codes of its characters.
+        Deletes the points previously recorded for the affected reports that
+        were not rewritten, e.g. reports without files left.
 
-        Args:
-            s (str): The string to convert.
+        Must be called before the processed files are recorded in the manifest.
 
-        Returns:
-            int: The resulting integer.
+        Args:
+            manifest (IngestionManifest): Manifest of the collection.
+            affected_report_ids (Set[str]): Reports that were rebuilt.
+            point_ids (List[str]): IDs of the points that were just upserted.
         """
-        return sum(ord(char) for char in s)
+        stale_point_ids = set(
+            manifest.point_ids(
+                file
+                for file, entry in manifest.entries.items()
+                if entry.get("report_id") in affected_report_ids
+            )
+        ) - set(point_ids)
+        if not stale_point_ids:
+            return
+        self.qdrant_client.delete(
+            collection_name=manifest.collection_name,
+            points_selector=models.PointIdsList(points=list(stale_point_ids)),
+        )
+        logger.info(
+            f"[INFO] Deleted {len(stale_point_ids)} stale points from '{manifest.collection_name}'."
+        )
 
-    def process_report_names(self):
+    def process_report_names(self, manifest: Optional[IngestionManifest] = None):
         """
         Processes and stores the names of reports.
 
-        It extracts all report IDs from the JSON files and updates the 'report_names'
-        collection in Qdrant.
+        It reads the report IDs of the new and modified JSON files and rewrites
+        the 'report_names' collection in Qdrant with the report IDs of all the
+        ingested files.
+
+        Args:
+            manifest (Optional[IngestionManifest]): Manifest of the target
+                collection. Defaults to the manifest of the live collection.
         """
-        json_files = [
-            f for f in os.listdir(self.texts_folder) if f.endswith(".json")
-        ]
-        all_report_ids = set()  # Set to accumulate unique report IDs
-
-        # Iterate through all JSON files and accumulate report_ids
-        for file in tqdm(json_files, desc="Loading JSON files"):
-            file_path = os.path.join(self.texts_folder, file)
-            content = self.extract_json_from_file(file_path)
-
-            if content:
-                report_id = content.get("report_id", "Unknown")
-                all_report_ids.add(report_id)
-
-        # Get existing IDs from the 'report_names' collection
-        try:
-            existing_point = self.qdrant_client.scroll(
-                collection_name="report_names", limit=1
-            ).points[0]
-            existing_report_ids = set(
-                existing_point.payload.get("page_content", [])
+        manifest = manifest or self.manifests["report_names"]
+        manifest.reconcile(qdrant_client=self.qdrant_client)
+        changed_files, removed_files = manifest.scan(self.texts_folder)
+
+        # Read the report IDs of the new and modified files
+        pages = self.corpus.load(changed_files)
+        for file in changed_files:
+            page = pages.get(file)
+            report_id = (
+                (page.report_id if page.report_id is not None else "Unknown")
+                if page
+                else None
             )
-        except Exception:
-            existing_report_ids = set()
-
-        # Calculate the unique report_ids not in Qdrant
-        new_report_ids = all_report_ids - existing_report_ids
-
-        # If there are new IDs, update the point in Qdrant
-        if new_report_ids:
+            manifest.record(file_name=file, point_ids=[0], report_id=report_id)
+        manifest.forget(removed_files)
+
+        # Update the point in Qdrant if the set of files changed
+        if changed_files or removed_files:
+            all_report_ids = {
+                entry["report_id"]
+                for entry in manifest.entries.values()
+                if entry.get("report_id") is not None
+            }
             updated_point = models.PointStruct(
                 id=0,
                 vector=[0.0],  # Minimum vector
-                payload={
-                    "page_content": list(existing_report_ids | new_report_ids)
-                },
+                payload={"page_content": sorted(all_report_ids)},
             )
             self.qdrant_client.upsert(
-                collection_name="report_names", points=[updated_point]
+                collection_name=manifest.collection_name, points=[updated_point]
             )
             logger.info(
-                f"[INFO] Updated 'report_names' collection with {len(new_report_ids)} new report IDs."
+                f"[INFO] Updated 'report_names' collection with {len(all_report_ids)} report IDs."
             )
         else:
             logger.info("[INFO] No new report IDs to add.")
+        manifest.save()
 
-    def process_element_names(self):
+    def process_element_names(self, manifest: Optional[IngestionManifest] = None):
         """
         Processes and stores unique elements (KPIs, charts, tables) per ReportID in Qdrant.
 
         Extracts KPIs, charts, and tables from the report data and uploads them to the
-        'element_names' collection.
+        'element_names' collection. Only the reports with new, modified or deleted
+        files are rebuilt.
+
+        Args:
+            manifest (Optional[IngestionManifest]): Manifest of the target
+                collection. Defaults to the manifest of the live collection.
         """
-        json_files = [
-            f for f in os.listdir(self.texts_folder) if f.endswith(".json")
-        ]
+        manifest = manifest or self.manifests["element_names"]
+        changed_files, removed_files, affected_report_ids, contents = (
+            self.load_changed_reports(
+                manifest=manifest, default_report_id=lambda file: "Unknown"
+            )
+        )
         unique_elements = defaultdict(
             lambda: {"KPIs": set(), "Charts": set(), "Tables": set()}
         )
 
-        # Load JSONs and extract elements
-        for file in tqdm(json_files, desc="Processing JSON files"):
-            file_path = os.path.join(self.texts_folder, file)
-            content = self.extract_json_from_file(file_path)
+        # Extract elements of the affected reports
+        for page in contents.values():
+            report_id = page.report_id if page.report_id is not None else "Unknown"
 
-            if content:
-                report_id = content.get("report_id", "Unknown")
-                detected_elements = content.get("detected_elements", {})
-
-                # Store KPI, chart, and table titles without duplicates
-                unique_elements[report_id]["KPIs"].update(
-                    kpi.get("kpi_title", "Untitled (KPI)")
-                    for kpi in detected_elements.get("KPIs", [])
-                )
-                unique_elements[report_id]["Charts"].update(
-                    chart.get("visualization_title", "Untitled (Chart)")
-                    for chart in detected_elements.get("charts", [])
-                )
-                unique_elements[report_id]["Tables"].update(
-                    table.get("table_title", "Untitled (Table)")
-                    for table in detected_elements.get("tables", [])
+            # Store KPI, chart, and table titles without duplicates
+            for element in page.elements:
+                unique_elements[report_id][ELEMENT_GROUPS[element.type]].add(
+                    element.title
+                    if element.title is not None
+                    else f"Untitled ({element.type})"
                 )
 
-        # Create points and upload them to Qdrant
-        points = []
-        for report_id, elements in unique_elements.items():
-            hashed_id = self.string_to_int_ascii(s=report_id)
-            report_id_embedding = self.embedding_model.get_text_embedding(
-                json.dumps(report_id)
-            )
-
-            point = models.PointStruct(
-                id=hashed_id,
-                vector=report_id_embedding,
-                payload={
-                    "page_content": json.dumps(
-                        {  # Convert to JSON string
-                            "report_id": report_id,
-                            "KPIs": list(elements["KPIs"]),
-                            "Charts": list(elements["Charts"]),
-                            "Tables": list(elements["Tables"]),
-                        }
+        # Create points and stream them to Qdrant
+        report_ids = list(unique_elements)
+        with PointUploader(
+                qdrant_client=self.qdrant_client,
+                collection_name=manifest.collection_name,
+        ) as uploader:
+            for i, report_id_embedding in iter_embeddings(
+                    embedding_model=self.embedding_model,
+                    texts=[json.dumps(report_id) for report_id in report_ids],
+                    desc="Embedding element names",
+            ):
+                report_id = report_ids[i]
+                elements = unique_elements[report_id]
+                uploader.add(
+                    models.PointStruct(
+                        id=report_point_id("element_names", report_id),
+                        vector=report_id_embedding,
+                        payload={
+                            "page_content": json.dumps(
+                                {  # Convert to JSON string
+                                    "report_id": report_id,
+                                    "KPIs": list(elements["KPIs"]),
+                                    "Charts": list(elements["Charts"]),
+                                    "Tables": list(elements["Tables"]),
+                                }
+                            ),
+                            "metadata": {"report_id": report_id},
+                        },
                     )
-                },
-            )
-            points.append(point)
+                )
+        logger.info(
+            f"[INFO] Uploaded {uploader.uploaded} new element entries to 'element_names' collection."
+        )
 
-        if points:
-            self.qdrant_client.upsert(
-                collection_name="element_names", points=points
-            )
-            logger.info(
-                f"[INFO] Uploaded {len(points)} new element entries to 'element_names' collection."
-            )
+        # Remove the points of the reports that were not rewritten
+        self.delete_stale_points(
+            manifest=manifest,
+            affected_report_ids=affected_report_ids,
+            point_ids=[
+                report_point_id("element_names", report_id) for report_id in report_ids
+            ],
+        )
+        self.record_reports(
+            manifest=manifest,
+            collection_name="element_names",
+            changed_files=changed_files,
+            removed_files=removed_files,
+            contents=contents,
+            default_report_id=lambda file: "Unknown",
+        )
 
-    def process_upload_dates(self):
+    def process_upload_dates(self, manifest: Optional[IngestionManifest] = None):
         """
         Processes and stores upload dates grouped by ReportID in Qdrant.
 
         It extracts dates of insertion from the JSON files and updates
-        the 'upload_dates' collection in Qdrant.
+        the 'upload_dates' collection in Qdrant. Only the reports with new,
+        modified or deleted files are rebuilt.
+
+        Args:
+            manifest (Optional[IngestionManifest]): Manifest of the target
+                collection. Defaults to the manifest of the live collection.
         """
-        json_files = [
-            f for f in os.listdir(self.texts_folder) if f.endswith(".json")
-        ]
+        manifest = manifest or self.manifests["upload_dates"]
+        changed_files, removed_files, affected_report_ids, contents = (
+            self.load_changed_reports(
+                manifest=manifest,
+                default_report_id=lambda file: os.path.splitext(file)[0],
+            )
+        )
         upload_dates = defaultdict(set)
 
-        # Iterate through JSON files and accumulate insertion dates
-        for file in tqdm(json_files, desc="Loading JSON files"):
-            file_path = os.path.join(self.texts_folder, file)
-            content = self.extract_json_from_file(file_path)
-
-            if content:
-                report_id = content.get("report_id", os.path.splitext(file)[0])
-                insertion_date = content.get("date", "Unknown")
-                upload_dates[report_id].add(insertion_date)
-
-        # Convert dates to embeddings and store in Qdrant
-        points = []
-        for report_id, dates in upload_dates.items():
-            report_id_embedding = self.embedding_model.get_text_embedding(
-                json.dumps(report_id)
+        # Accumulate insertion dates of the affected reports
+        for file, page in contents.items():
+            report_id = (
+                page.report_id
+                if page.report_id is not None
+                else os.path.splitext(file)[0]
             )
-            point = models.PointStruct(
-                id=self.string_to_int_ascii(s=report_id),
-                vector=report_id_embedding,
-                payload={
-                    "page_content": json.dumps({"dates": list(dates)}),
-                    "metadata": {"report_id": report_id},
-                },
-            )
-            points.append(point)
+            upload_dates[report_id].add(page.date)
+
+        # Convert dates to embeddings and stream them to Qdrant
+        report_ids = list(upload_dates)
+        with PointUploader(
+                qdrant_client=self.qdrant_client,
+                collection_name=manifest.collection_name,
+        ) as uploader:
+            for i, report_id_embedding in iter_embeddings(
+                    embedding_model=self.embedding_model,
+                    texts=[json.dumps(report_id) for report_id in report_ids],
+                    desc="Embedding upload dates",
+            ):
+                report_id = report_ids[i]
+                uploader.add(
+                    models.PointStruct(
+                        id=report_point_id("upload_dates", report_id),
+                        vector=report_id_embedding,
+                        payload={
+                            "page_content": json.dumps(
+                                {"dates": list(upload_dates[report_id])}
+                            ),
+                            "metadata": {"report_id": report_id},
+                        },
+                    )
+                )
+        logger.info(
+            f"[INFO] Uploaded {uploader.uploaded} new upload date entries to 'upload_dates' collection."
+        )
 
-        # Upload the points
-        self.qdrant_client.upload_points(
-            collection_name="upload_dates", points=points
+        # Remove the points of the reports that were not rewritten
+        self.delete_stale_points(
+            manifest=manifest,
+            affected_report_ids=affected_report_ids,
+            point_ids=[
+                report_point_id("upload_dates", report_id) for report_id in report_ids
+            ],
         )
-        logger.info(
-            f"[INFO] Uploaded {len(points)} new upload date entries to 'upload_dates' collection."
+        self.record_reports(
+            manifest=manifest,
+            collection_name="upload_dates",
+            changed_files=changed_files,
+            removed_files=removed_files,
+            contents=contents,
+            default_report_id=lambda file: os.path.splitext(file)[0],
         )
+
+    def record_reports(
+            self,
+            manifest: IngestionManifest,
+            collection_name: str,
+            changed_files: List[str],
+            removed_files: List[str],
+            contents: Dict[str, ReportPage],
+            default_report_id: Callable[[str], str],
+    ) -> None:
+        """
+        Records the processed files in the manifest of a metadata collection.
+
+        Args:
+            manifest (IngestionManifest): Manifest of the collection.
+            collection_name (str): Name of the collection the point IDs are
+                derived from (the alias name, also for a new version).
+            changed_files (List[str]): New or modified files that were processed.
+            removed_files (List[str]): Deleted files.
+            contents (Dict[str, ReportPage]): Parsed page of the loaded files.
+            default_report_id (Callable[[str], str]): Report ID used for a file
+                without "report_id", given the file name.
+        """
+        for file in changed_files:
+            page = contents.get(file)
+            report_id = (
+                (page.report_id if page.report_id is not None else default_report_id(file))
+                if page
+                else None
+            )
+            point_ids = (
+                [report_point_id(collection_name, report_id)]
+                if report_id
+                else []
+            )
+            manifest.record(file_name=file, point_ids=point_ids, report_id=report_id)
+        manifest.forget(removed_files)
+        manifest.save()
+
+    def rebuild(self, collection_names: Optional[Iterable[str]] = None) -> None:
+        """
+        Rebuilds metadata collections from scratch in new versions and swaps
+        each one in behind its alias once it is complete (blue/green update).
+
+        Args:
+            collection_names (Optional[Iterable[str]]): Collections to rebuild.
+                Defaults to the three metadata collections.
+        """
+        builders = {
+            "report_names": self.process_report_names,
+            "element_names": self.process_element_names,
+            "upload_dates": self.process_upload_dates,
+        }
+        for collection_name in collection_names or builders:
+            self.manifests[collection_name] = rebuild_collection(
+                qdrant_client=self.qdrant_client,
+                collection_name=collection_name,
+                ingest=builders[collection_name],
+            )
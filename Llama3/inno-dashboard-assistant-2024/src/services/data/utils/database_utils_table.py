@@ -3,28 +3,32 @@
 # Authors: SDG DS unit
 """
 This module contains the `DatabaseCreator` class, which is responsible for:
-- Loading JSON files from a specified folder.
+- Loading JSON files from a specified folder, through the report corpus shared with the metadata builders.
 - Extracting key performance indicators (KPIs), charts, and tables from the JSON content.
 - Creating and configuring a collection in Qdrant.
 - Generating embeddings for the extracted data using OpenAI's model via Langchain.
 - Uploading the processed data to a Qdrant vector database.
 """
+import hashlib
 import json
 import logging
-import os
-import re
+from collections import Counter, defaultdict
 from typing import Any, Dict, List, Optional
 
 from qdrant_client import QdrantClient
 from qdrant_client.http import models
+from src.services.data.utils.batch_embedding import iter_embeddings
+from src.services.data.utils.collection_profiles import (
+    COLLECTION_PROFILES,
+    ensure_collection,
+)
+from src.services.data.utils.collection_versions import rebuild_collection
+from src.services.data.utils.embedding_store import get_document_embeddings
+from src.services.data.utils.ingestion_manifest import IngestionManifest
+from src.services.data.utils.point_ids import point_id
+from src.services.data.utils.point_uploader import PointUploader
+from src.services.data.utils.report_corpus import ReportPage, get_report_corpus
 from src.utils.logging_config import setup_logging
-from tqdm import tqdm
-from llama_index.embeddings.langchain import LangchainEmbedding
-from langchain_huggingface import HuggingFaceEmbeddings
-
-# Definir los embeddings de HuggingFace
-lc_embed_model = HuggingFaceEmbeddings(model_name="BAAI/bge-m3")
-embed_model = LangchainEmbedding(lc_embed_model)
 
 # Set up logging
 setup_logging()
@@ -40,7 +44,9 @@ class DatabaseCreator:
         collection_name (str): Name of the collection in Qdrant where the data will be stored.
         embedding_size (int): Size of the embedding used for Qdrant vectors.
         qdrant_client (QdrantClient): Qdrant client to interact with the database.
-        embedding_model (OpenAIEmbeddings): Langchain model to generate embeddings using OpenAI.
+        embedding_model (Embeddings): Shared Langchain model to generate embeddings.
+        manifest (IngestionManifest): Source files already ingested into the collection.
+        corpus (ReportCorpus): Parsed report files of the texts folder.
     """
 
     def __init__(self, texts_folder: str):
@@ -56,255 +62,262 @@ class DatabaseCreator:
         self.qdrant_client = QdrantClient(location="localhost", port=6333)
         logger.info(" Client created...")
 
-        # Initialize Langchain with OpenAI Embeddings
-        logger.info(" Loading the OpenAI model for embeddings...")
-        self.embedding_model = embed_model
+        # Use the shared embedding model, backed by the persistent embedding store
+        self.embedding_model = get_document_embeddings()
 
         # Verify and create collection
         self.create_collection()
 
-    def extract_json_from_file(
-            self, file_path: str
-    ) -> Optional[Dict[str, Any]]:
-        """
-        Extracts JSON from a given file. If the file contains delimited JSON content,
-        it is extracted and loaded.
-
-        Args:
-            file_path (str): Path to the file from which JSON will be extracted.
+        # Track the ingested files to only process new or modified ones
+        self.manifest = IngestionManifest(collection_name=self.collection_name)
 
-        Returns:
-            Optional[Dict[str, Any]]: Extracted JSON content, or None if extraction fails.
-        """
-        with open(file_path, "r", encoding="utf-8") as file:
-            content = file.read()
-
-            # Search for JSON-delimited block
-            match = re.search(r"json(.*?)", content, re.DOTALL)
-            if match:
-                # Extract the content inside the delimited block
-                json_content = match.group(1).strip()
-            else:
-                # If no delimiters, use entire content
-                json_content = content.strip().strip('"')
-
-            # Remove unnecessary characters like escape sequences
-            json_content = json_content.replace("\\n", " ").strip()
-            json_content = json_content.replace("\\", "").strip()
-
-            # Attempt to load the JSON
-            try:
-                return json.loads(s=json_content)
-            except json.JSONDecodeError as e:
-                logger.error(f"Error decoding JSON: {e}")
-                return None
+        # Parsed report files, shared with the metadata builders
+        self.corpus = get_report_corpus(self.texts_folder)
 
     def create_collection(self) -> None:
         """
-        Creates the collection in Qdrant if it doesn't exist. If the collection already exists,
-        no action is taken.
+        Creates the collection in Qdrant from its profile if it doesn't exist,
+        and makes sure its HNSW, quantization and payload index settings match it.
 
         Returns:
             None
         """
-        try:
-            self.qdrant_client.get_collection(self.collection_name)
-            logger.info(
-                f"The collection '{self.collection_name}' already exists. No need to create it."
-            )
-        except Exception:
-            logger.info(" Creating Qdrant data collection...")
-            self.qdrant_client.create_collection(
-                collection_name=self.collection_name,
-                vectors_config=models.VectorParams(
-                    size=self.embedding_size, distance=models.Distance.COSINE
-                ),
-                optimizers_config=models.OptimizersConfigDiff(
-                    indexing_threshold=10
-                ),
-            )
-            logger.info(
-                f"Collection '{self.collection_name}' created successfully."
-            )
+        ensure_collection(
+            qdrant_client=self.qdrant_client,
+            profile=COLLECTION_PROFILES[self.collection_name],
+        )
 
     # Configure logger to show warnings
     logging.basicConfig(level=logging.WARNING)
 
-    def load_json_data(self) -> List[Dict[str, Any]]:
+    def extract_elements(self, page: ReportPage) -> List[Dict[str, Any]]:
+        """
+        Extracts the KPIs, tables, and charts of a parsed report page.
+
+        Args:
+            page (ReportPage): Parsed report page.
+
+        Returns:
+            List[Dict[str, Any]]: List of dictionaries containing the elements of the page.
+        """
+        return [
+            {
+                "report_id": (
+                    page.report_id if page.report_id is not None else "Unknown"
+                ),
+                "insertion_date": page.date,
+                "page": page.page,
+                "type": element.type,
+                "title": element.title,
+                "content": element.content,
+                "value": element.value,
+                "columns": element.columns,
+                "rows": element.rows,
+            }
+            for element in page.elements
+        ]
+
+    def load_json_data(
+            self, json_files: Optional[List[str]] = None
+    ) -> List[Dict[str, Any]]:
         """
         Loads and processes JSON files from the specified folder, extracting KPIs, tables, and charts.
 
+        Args:
+            json_files (Optional[List[str]]): Names of the files to load. Defaults
+                to every JSON file in the folder.
+
         Returns:
             List[Dict[str, Any]]: List of dictionaries containing processed data from the JSON files.
         """
-        json_files = [
-            f for f in os.listdir(self.texts_folder) if f.endswith(".json")
+        pages = (
+            self.corpus.load_all()
+            if json_files is None
+            else self.corpus.load(json_files)
+        )
+        return [
+            element for page in pages.values() for element in self.extract_elements(page)
         ]
-        report_data = []
-
-        # Iterate over JSON files with tqdm to show progress
-        for file in tqdm(json_files, desc="Loading JSON files"):
-            file_path = os.path.join(self.texts_folder, file)
-            content = self.extract_json_from_file(file_path)
-
-            # Use .get() method to avoid missing key errors
-            report_id = content.get("report_id", "Unknown")
-            insertion_date = content.get("date", "Unknown")
-            page_number = content.get("page", "Unknown")  # Extract page number
-            detected_elements = content.get("detected_elements", {})
-
-            # Store KPIs, charts, and tables
-            for kpi in detected_elements.get("KPIs", []):
-                try:
-                    report_data.append(
-                        {
-                            "report_id": report_id,
-                            "insertion_date": insertion_date,
-                            "page": page_number,  # Add page number here
-                            "type": "KPI",
-                            "title": kpi.get(
-                                "kpi_title", None
-                            ),  # Use None if not present
-                            "content": kpi.get(
-                                "kpi_description", None
-                            ),  # Use None if not present
-                            "value": kpi.get(
-                                "kpi_value", None
-                            ),  # Use None if not present
-                            "columns": None,
-                            "rows": None,
-                        }
-                    )
-                except KeyError as e:
-                    logging.warning(
-                        f"Missing key {e} in KPI for file {file}. Using None for missing values."
-                    )
 
-            for chart in detected_elements.get("charts", []):
-                try:
-                    report_data.append(
-                        {
-                            "report_id": report_id,
-                            "insertion_date": insertion_date,
-                            "page": page_number,  # Add page number here
-                            "type": "Chart",
-                            "title": chart.get(
-                                "visualization_title", None
-                            ),  # Use None if not present
-                            "content": chart.get(
-                                "visualization_description", None
-                            ),  # Use None if not present
-                            "value": chart.get(
-                                "values", None
-                            ),  # Use None if not present
-                            "columns": chart.get("metrics_displayed", None),
-                            "rows": None,
-                        }
-                    )
-                except KeyError as e:
-                    logging.warning(
-                        f"Missing key {e} in chart for file {file}. Using None for missing values."
-                    )
+    def element_point_id(
+            self, element: Dict[str, Any], occurrence: int = 0
+    ) -> str:
+        """
+        Returns the deterministic point ID of an element.
 
-            for table in detected_elements.get("tables", []):
-                try:
-                    report_data.append(
-                        {
-                            "report_id": report_id,
-                            "insertion_date": insertion_date,
-                            "page": page_number,  # Add page number here
-                            "type": "Table",
-                            "title": table.get(
-                                "table_title", None
-                            ),  # Use None if not present
-                            "content": table.get(
-                                "table_description", None
-                            ),  # Use None if not present
-                            "value": None,
-                            "columns": table.get(
-                                "columns", None
-                            ),  # Use None if not present
-                            "rows": table.get(
-                                "rows", None
-                            ),  # Use None if not present
-                        }
-                    )
-                except KeyError as e:
-                    logging.warning(
-                        f"Missing key {e} in table for file {file}. Using None for missing values."
-                    )
+        Args:
+            element (Dict[str, Any]): Element extracted from a JSON file.
+            occurrence (int): Number of previous elements of the same report,
+                date, page, type and title (0 for the first one).
 
-        return report_data
+        Returns:
+            str: The point ID of the element.
+        """
+        return point_id(
+            self.collection_name,
+            element.get("report_id"),
+            element.get("insertion_date"),
+            element.get("page"),
+            element.get("type"),
+            element.get("title"),
+            occurrence,
+        )
 
     def process_and_upload_data(self) -> None:
         """
         Processes the JSON data, generates corresponding embeddings, and uploads them to Qdrant.
 
+        Only the files that are new or were modified since the last update are
+        processed. Within them, the elements whose content did not change are
+        skipped, and the points of removed elements and deleted files are removed.
+
+        Returns:
+            None
+        """
+        self.ingest(self.manifest)
+
+    def rebuild(self) -> None:
+        """
+        Rebuilds the collection from scratch in a new version and swaps it in
+        behind the collection alias once it is complete (blue/green update).
+
+        Returns:
+            None
+        """
+        self.manifest = rebuild_collection(
+            qdrant_client=self.qdrant_client,
+            collection_name=self.collection_name,
+            ingest=self.ingest,
+        )
+
+    def ingest(self, manifest: IngestionManifest) -> None:
+        """
+        Embeds and upserts the new and modified files into the collection
+        described by a manifest, and records them in it.
+
+        Args:
+            manifest (IngestionManifest): Manifest of the target collection
+                (the live collection, or a new version being built).
+
         Returns:
             None
         """
         logger.info(" Processing data and uploading to Qdrant...")
-        points = []
-
-        # Load the JSON data
-        report_data = self.load_json_data()
-
-        # Iterate over reports with tqdm to show progress
-        for idx, report in tqdm(
-                enumerate(report_data),
-                total=len(report_data),
-                desc="Processing and embedding data",
-        ):
-            report_id = report.get("report_id")
-            insertion_date = report.get("insertion_date")
-            page_number = report.get("page")  # Extract page number
-            content = report.get("content")
-            element_title = report.get("title")
-            element_type = report.get("type")
-
-            # Create text for embedding
-            embedding_input = (
-                f"{element_title} | {insertion_date} | {report_id} | {content}"
-            )
+        manifest.reconcile(qdrant_client=self.qdrant_client)
+        changed_files, removed_files = manifest.scan(self.texts_folder)
+        previous_point_ids = set(
+            manifest.point_ids(changed_files + removed_files)
+        )
+        previous_hashes = manifest.point_hashes(changed_files)
 
-            # Create embedding for content
-            chunk_embedding = self.embedding_model.get_text_embedding(
-                embedding_input
-            )
+        # Load the JSON data of the new and modified files
+        point_ids, point_hashes, file_report_ids = (
+            defaultdict(list), defaultdict(dict), {}
+        )
+        report_data, element_ids = [], []
+        pages = self.corpus.load(changed_files)
+        for file, page in pages.items():
+            occurrences = Counter()
+            for element in self.extract_elements(page):
+                key = (element.get("page"), element.get("type"), element.get("title"))
+                element_id = self.element_point_id(element, occurrences[key])
+                element_hash = hashlib.sha256(
+                    json.dumps(element, sort_keys=True, default=str).encode("utf-8")
+                ).hexdigest()
+                occurrences[key] += 1
+
+                point_ids[file].append(element_id)
+                point_hashes[file][element_id] = element_hash
+                file_report_ids[file] = element.get("report_id")
+
+                # Unchanged elements of a modified file keep their point
+                if previous_hashes.get(element_id) != element_hash:
+                    report_data.append(element)
+                    element_ids.append(element_id)
+
+        # Create text for embedding
+        embedding_inputs = [
+            f"{report.get('title')} | {report.get('insertion_date')} | "
+            f"{report.get('report_id')} | {report.get('content')}"
+            for report in report_data
+        ]
 
-            points.append(
-                models.PointStruct(
-                    id=idx,
-                    vector=chunk_embedding,
-                    payload={
-                        "metadata": {
-                            "Id": report_id,
-                            "type": element_type,
-                            "title": element_title,
-                            "insertion_year": (
-                                insertion_date.split("-")[0]
-                                if insertion_date != "Unknown"
-                                else None
-                            ),
-                            "insertion_month": (
-                                insertion_date.split("-")[1]
-                                if insertion_date != "Unknown"
-                                else None
-                            ),
-                            "insertion_day": (
-                                insertion_date.split("-")[2]
-                                if insertion_date != "Unknown"
-                                else None
-                            ),
-                            "page": page_number,  # Add page number here
+        # Embed the elements and stream their points to Qdrant; upserts are
+        # idempotent thanks to the deterministic IDs
+        with PointUploader(
+                qdrant_client=self.qdrant_client,
+                collection_name=manifest.collection_name,
+        ) as uploader:
+            for i, chunk_embedding in iter_embeddings(
+                    embedding_model=self.embedding_model,
+                    texts=embedding_inputs,
+                    desc="Embedding data",
+            ):
+                report = report_data[i]
+                element_id = element_ids[i]
+                report_id = report.get("report_id")
+                insertion_date = report.get("insertion_date")
+                page_number = report.get("page")  # Extract page number
+                element_title = report.get("title")
+                element_type = report.get("type")
+
+                uploader.add(
+                    models.PointStruct(
+                        id=element_id,
+                        vector=chunk_embedding,
+                        payload={
+                            "metadata": {
+                                "Id": report_id,
+                                "type": element_type,
+                                "title": element_title,
+                                "insertion_year": (
+                                    insertion_date.split("-")[0]
+                                    if insertion_date != "Unknown"
+                                    else None
+                                ),
+                                "insertion_month": (
+                                    insertion_date.split("-")[1]
+                                    if insertion_date != "Unknown"
+                                    else None
+                                ),
+                                "insertion_day": (
+                                    insertion_date.split("-")[2]
+                                    if insertion_date != "Unknown"
+                                    else None
+                                ),
+                                "page": page_number,  # Add page number here
+                            },
+                            "page_content": json.dumps(report),
                         },
-                        "page_content": json.dumps(report),
-                    },
+                    )
                 )
+
+        # Remove the points of removed elements and deleted files, except those
+        # an unchanged file still owns
+        current_point_ids = {
+            element_id for ids in point_ids.values() for element_id in ids
+        }
+        stale_point_ids = list(
+            previous_point_ids
+            - current_point_ids
+            - manifest.other_point_ids(changed_files + removed_files)
+        )
+        if stale_point_ids:
+            self.qdrant_client.delete(
+                collection_name=manifest.collection_name,
+                points_selector=models.PointIdsList(points=stale_point_ids),
             )
 
-        # Upload points to Qdrant
-        self.qdrant_client.upsert(
-            collection_name=self.collection_name, points=points
+        for file in changed_files:
+            manifest.record(
+                file_name=file,
+                point_ids=point_ids[file],
+                report_id=file_report_ids.get(file),
+                point_hashes=point_hashes[file],
+            )
+        manifest.forget(removed_files)
+        manifest.save()
+        logger.info(
+            f" Data successfully uploaded to Qdrant ({uploader.uploaded} points upserted, "
+            f"{len(stale_point_ids)} deleted)."
         )
-        logger.info(" Data successfully uploaded to Qdrant.")
@@ -15,23 +15,33 @@ Dependencies:
     - langchain_openai: Langchain's OpenAI model for generating embeddings.
     - tqdm: A progress bar library used to show progress during data processing.
     - os: Provides functions for interacting with the operating system (e.g., listing files).
-    - json: Handles loading and parsing JSON files.
+    - report_decoder: Decodes the JSON files, reporting malformed ones.
+    - text_chunker: Splits long contents into overlapping chunks, each stored as a point.
 """
-import json
 import logging
 import os
-from typing import List
+from collections import defaultdict
+from typing import Any, Dict, List, Optional
 
 from qdrant_client import QdrantClient
 from qdrant_client.http import models
+from src.services.data.utils.batch_embedding import iter_embeddings
+from src.services.data.utils.collection_profiles import (
+    COLLECTION_PROFILES,
+    ensure_collection,
+)
+from src.services.data.utils.collection_versions import rebuild_collection
+from src.services.data.utils.embedding_store import get_document_embeddings
+from src.services.data.utils.ingestion_jobs import report_progress, report_total
+from src.services.data.utils.ingestion_manifest import IngestionManifest
+from src.services.data.utils.point_ids import point_id
+from src.services.data.utils.point_uploader import PointUploader
+from src.services.data.utils.report_decoder import (
+    MalformedReportError,
+    decode_report_file,
+)
+from src.services.data.utils.text_chunker import TextChunker, chunk_document
 from src.utils.logging_config import setup_logging
-from tqdm import tqdm
-from llama_index.embeddings.langchain import LangchainEmbedding
-from langchain_huggingface import HuggingFaceEmbeddings
-
-# Definir los embeddings de HuggingFace
-lc_embed_model = HuggingFaceEmbeddings(model_name="BAAI/bge-m3")
-embed_model = LangchainEmbedding(lc_embed_model)
 
 # Set up logging
 setup_logging()
@@ -48,8 +58,10 @@ class DatabaseCreator_report_sum:
         collection_name (str): The name of the Qdrant collection to store the data.
         embedding_size (int): The size of the embedding vector.
         qdrant_client (QdrantClient): Qdrant client instance to interact with the Qdrant database.
-        embedding_model (OpenAIEmbeddings): Langchain OpenAI embeddings model for processing text data.
-        jsons (list): List of report summary data loaded from JSON files.
+        embedding_model (Embeddings): Shared embedding model for processing text data.
+        jsons (list): List of report summary data loaded by the last update.
+        manifest (IngestionManifest): Source files already ingested into the collection.
+        chunker (TextChunker): Splits the contents into chunks before embedding.
     """
 
     def __init__(self, texts_folder: str):
@@ -65,70 +77,85 @@ class DatabaseCreator_report_sum:
         self.qdrant_client = QdrantClient("localhost", port=6333)
         logger.info("[INFO] Client created for report_sum...")
 
-        # Load report summaries from JSON files
-        logger.info("[INFO] Loading report summaries from JSON files...")
-        self.jsons = self.load_json_data()
+        self.jsons = []
+
+        # Use the shared embedding model, backed by the persistent embedding store
+        self.embedding_model = get_document_embeddings()
 
-        # Initialize Langchain with OpenAI embeddings model
-        logger.info("[INFO] Loading the OpenAI model for embeddings...")
-        self.embedding_model = embed_model
+        # Long contents are embedded as several short, overlapping chunks
+        self.chunker = TextChunker()
 
         # Verify and create the collection if it doesn't exist
         self.create_collection()
 
+        # Track the ingested files to only process new or modified ones
+        self.manifest = IngestionManifest(collection_name=self.collection_name)
+
     def create_collection(self):
         """
-        Verifies if the Qdrant collection exists, and creates it if not.
+        Verifies if the Qdrant collection exists, and creates it from its profile if not.
 
-        This method attempts to fetch the collection from Qdrant and creates it if not found.
+        The HNSW, quantization and payload index settings of an existing collection
+        are brought in line with the profile.
         """
-        try:
-            self.qdrant_client.get_collection(self.collection_name)
-            logger.info(
-                f"[INFO] The collection '{self.collection_name}' already exists. No need to recreate it."
-            )
-        except Exception:
-            logger.info(
-                "[INFO] Creating Qdrant data collection for report summaries..."
-            )
-            self.qdrant_client.create_collection(
-                collection_name=self.collection_name,
-                vectors_config=models.VectorParams(
-                    size=self.embedding_size, distance=models.Distance.COSINE
-                ),
-                optimizers_config=models.OptimizersConfigDiff(
-                    indexing_threshold=10
-                ),
-            )
-            logger.info(
-                f"[INFO] Collection '{self.collection_name}' created successfully."
-            )
+        ensure_collection(
+            qdrant_client=self.qdrant_client,
+            profile=COLLECTION_PROFILES[self.collection_name],
+        )
 
-    def load_json_data(self) -> List:
+    def summary_point_id(self, metadata: Dict[str, Any]) -> str:
+        """
+        Returns the deterministic point ID of a report summary.
+
+        Args:
+            metadata (Dict[str, Any]): Metadata of the summary.
+
+        Returns:
+            str: The point ID of the summary.
+        """
+        return point_id(
+            self.collection_name,
+            metadata.get("Report_Id"),
+            metadata.get("insertion_year"),
+            metadata.get("insertion_month"),
+            metadata.get("insertion_day"),
+        )
+
+    def load_json_data(self, json_files: Optional[List[str]] = None) -> List:
         """
         Loads report summary data from JSON files in the specified folder.
 
         Reads the content and metadata from each JSON file, extracting relevant fields
         like "Report_Id" and "contenido".
 
+        Args:
+            json_files (Optional[List[str]]): Names of the files to load. Defaults
+                to every JSON file in the folder.
+
         Returns:
-            list: A list of dictionaries containing the content and metadata for each report.
+            list: A list of dictionaries containing the content, metadata and file name for each report.
+            Malformed files are logged and skipped.
         """
-        json_files = [
-            f for f in os.listdir(self.texts_folder) if f.endswith(".json")
-        ]
+        if json_files is None:
+            json_files = [
+                f for f in os.listdir(self.texts_folder) if f.endswith(".json")
+            ]
         report_data = []
+        report_total("parsed", len(json_files))
 
         for file in json_files:
+            report_progress("parsed", 1)
             file_path = os.path.join(self.texts_folder, file)
-            with open(file_path, "r", encoding="utf-8") as f:
-                content = json.load(f)
-
-            metadata = content["metadata"]
-            summary_content = content["contenido"]
+            try:
+                content = decode_report_file(file_path)
+                metadata = content["metadata"]
+                summary_content = content["contenido"]
+            except (MalformedReportError, KeyError) as e:
+                logger.error(f"[ERROR] Skipping malformed report summary file '{file}': {e}")
+                continue
 
             report_data.append(
-                {"content": summary_content, "metadata": metadata}
+                {"content": summary_content, "metadata": metadata, "file_name": file}
             )
 
         return report_data
@@ -140,33 +167,106 @@ class DatabaseCreator_report_sum:
         For each report summary, the content is embedded using the OpenAI embeddings model
         and uploaded to the Qdrant collection.
         """
+        self.ingest(self.manifest)
+
+    def rebuild(self):
+        """
+        Rebuilds the collection from scratch in a new version and swaps it in
+        behind the collection alias once it is complete (blue/green update).
+        """
+        self.manifest = rebuild_collection(
+            qdrant_client=self.qdrant_client,
+            collection_name=self.collection_name,
+            ingest=self.ingest,
+        )
+
+    def ingest(self, manifest: IngestionManifest):
+        """
+        Embeds and upserts the new and modified report summaries into the collection
+        described by a manifest, and records them in it.
+
+        Args:
+            manifest (IngestionManifest): Manifest of the target collection
+                (the live collection, or a new version being built).
+        """
         logger.info(
             "[INFO] Processing report summaries and uploading to Qdrant..."
         )
-        points = []
-
-        for idx, report in tqdm(enumerate(self.jsons), total=len(self.jsons)):
-            content = report.get("content")
-            metadata = report.get("metadata")
+        manifest.reconcile(qdrant_client=self.qdrant_client)
+        changed_files, removed_files = manifest.scan(self.texts_folder)
+        previous_point_ids = set(
+            manifest.point_ids(changed_files + removed_files)
+        )
 
-            # Embedding the summary content
-            content_embedding = self.embedding_model.get_text_embedding(content)
+        # Load the new and modified report summaries
+        self.jsons = self.load_json_data(json_files=changed_files)
 
-            # Create a point and add it to the list of points to upload
-            points.append(
-                models.PointStruct(
-                    id=idx,
-                    vector=content_embedding,
-                    payload={"page_content": content, "metadata": metadata},
-                )
+        # Split each summary into chunks; the summary point ID is the parent of its chunks
+        chunks = [
+            (report["file_name"], *chunk)
+            for report in self.jsons
+            for chunk in chunk_document(
+                chunker=self.chunker,
+                collection_name=self.collection_name,
+                parent_id=self.summary_point_id(report.get("metadata")),
+                content=report.get("content"),
+                metadata=report.get("metadata"),
             )
+        ]
+        file_point_ids = defaultdict(list)
+        for file_name, chunk_id, _, _ in chunks:
+            file_point_ids[file_name].append(chunk_id)
 
+        # Embed the chunks in batches and stream the points to Qdrant
         logger.info(
-            f"[INFO] Uploading {len(points)} records to Qdrant for report summaries..."
+            f"[INFO] Uploading {len(chunks)} chunks of {len(self.jsons)} records to Qdrant for report summaries..."
         )
-        self.qdrant_client.upload_points(
-            collection_name=self.collection_name, points=points
+        with PointUploader(
+                qdrant_client=self.qdrant_client,
+                collection_name=manifest.collection_name,
+        ) as uploader:
+            for i, content_embedding in iter_embeddings(
+                    embedding_model=self.embedding_model,
+                    texts=[chunk.text for _, _, chunk, _ in chunks],
+                    desc="Embedding report summaries",
+            ):
+                _, chunk_id, chunk, chunk_metadata = chunks[i]
+                uploader.add(
+                    models.PointStruct(
+                        id=chunk_id,
+                        vector=content_embedding,
+                        payload={
+                            "page_content": chunk.text,
+                            "metadata": chunk_metadata,
+                        },
+                    )
+                )
+
+        for report in self.jsons:
+            manifest.record(
+                file_name=report["file_name"],
+                point_ids=file_point_ids[report["file_name"]],
+                report_id=report.get("metadata").get("Report_Id"),
+            )
+
+        # Malformed files are recorded without points until they are modified again
+        for file in set(changed_files) - {report["file_name"] for report in self.jsons}:
+            manifest.record(file_name=file, point_ids=[])
+
+        # Remove the points of the modified and deleted files that were not
+        # rewritten, except those an unchanged file still owns
+        stale_point_ids = list(
+            previous_point_ids
+            - {chunk_id for _, chunk_id, _, _ in chunks}
+            - manifest.other_point_ids(changed_files + removed_files)
         )
+        if stale_point_ids:
+            self.qdrant_client.delete(
+                collection_name=manifest.collection_name,
+                points_selector=models.PointIdsList(points=stale_point_ids),
+            )
+        manifest.forget(removed_files)
+        manifest.save()
         logger.info("[INFO] Successfully uploaded report summaries!")
 
 
@@ -180,8 +280,10 @@ class DatabaseCreator_text_pages:
         collection_name (str): The name of the Qdrant collection to store the data.
         embedding_size (int): The size of the embedding vector.
         qdrant_client (QdrantClient): Qdrant client instance to interact with the Qdrant database.
-        embedding_model (OpenAIEmbeddings): Langchain OpenAI embeddings model for processing text data.
-        jsons (list): List of text page data loaded from JSON files.
+        embedding_model (Embeddings): Shared embedding model for processing text data.
+        jsons (list): List of text page data loaded by the last update.
+        manifest (IngestionManifest): Source files already ingested into the collection.
+        chunker (TextChunker): Splits the contents into chunks before embedding.
     """
 
     def __init__(self, texts_folder: str):
@@ -197,69 +299,87 @@ class DatabaseCreator_text_pages:
         self.qdrant_client = QdrantClient(location="localhost", port=6333)
         logger.info("[INFO] Client created for text_pages...")
 
-        # Load text pages from JSON files
-        logger.info("[INFO] Loading text pages from JSON files...")
-        self.jsons = self.load_json_data()
+        self.jsons = []
+
+        # Use the shared embedding model, backed by the persistent embedding store
+        self.embedding_model = get_document_embeddings()
 
-        # Initialize Langchain with OpenAI embeddings model
-        logger.info("[INFO] Loading the OpenAI model for embeddings...")
-        self.embedding_model = embed_model
+        # Long contents are embedded as several short, overlapping chunks
+        self.chunker = TextChunker()
 
         # Verify and create the collection if it doesn't exist
         self.create_collection()
 
+        # Track the ingested files to only process new or modified ones
+        self.manifest = IngestionManifest(collection_name=self.collection_name)
+
     def create_collection(self):
         """
-        Verifies if the Qdrant collection exists, and creates it if not.
+        Verifies if the Qdrant collection exists, and creates it from its profile if not.
 
-        This method attempts to fetch the collection from Qdrant and creates it if not found.
+        The HNSW, quantization and payload index settings of an existing collection
+        are brought in line with the profile.
         """
-        try:
-            self.qdrant_client.get_collection(self.collection_name)
-            logger.info(
-                f"[INFO] The collection '{self.collection_name}' already exists. No need to recreate it."
-            )
-        except Exception:
-            logger.info(
-                "[INFO] Creating Qdrant data collection for text pages..."
-            )
-            self.qdrant_client.create_collection(
-                collection_name=self.collection_name,
-                vectors_config=models.VectorParams(
-                    size=self.embedding_size, distance=models.Distance.COSINE
-                ),
-                optimizers_config=models.OptimizersConfigDiff(
-                    indexing_threshold=10
-                ),
-            )
-            logger.info(
-                f"[INFO] Collection '{self.collection_name}' created successfully."
-            )
+        ensure_collection(
+            qdrant_client=self.qdrant_client,
+            profile=COLLECTION_PROFILES[self.collection_name],
+        )
 
-    def load_json_data(self) -> List:
+    def page_point_id(self, metadata: Dict[str, Any]) -> str:
+        """
+        Returns the deterministic point ID of a text page.
+
+        Args:
+            metadata (Dict[str, Any]): Metadata of the page.
+
+        Returns:
+            str: The point ID of the page.
+        """
+        return point_id(
+            self.collection_name,
+            metadata.get("Report_Id"),
+            metadata.get("insertion_year"),
+            metadata.get("insertion_month"),
+            metadata.get("insertion_day"),
+            metadata.get("page"),
+        )
+
+    def load_json_data(self, json_files: Optional[List[str]] = None) -> List:
         """
         Loads text page data from JSON files in the specified folder.
 
         Reads the content and metadata from each JSON file, extracting relevant fields
         like "Report_Id" and "contenido".
 
+        Args:
+            json_files (Optional[List[str]]): Names of the files to load. Defaults
+                to every JSON file in the folder.
+
         Returns:
-            list: A list of dictionaries containing the content and metadata for each page.
+            list: A list of dictionaries containing the content, metadata and file name for each page.
+            Malformed files are logged and skipped.
         """
-        json_files = [
-            f for f in os.listdir(self.texts_folder) if f.endswith(".json")
-        ]
+        if json_files is None:
+            json_files = [
+                f for f in os.listdir(self.texts_folder) if f.endswith(".json")
+            ]
         report_data = []
+        report_total("parsed", len(json_files))
 
         for file in json_files:
+            report_progress("parsed", 1)
             file_path = os.path.join(self.texts_folder, file)
-            with open(file_path, "r", encoding="utf-8") as f:
-                content = json.load(f)
-
-            metadata = content["metadata"]
-            pages_content = content["contenido"]
+            try:
+                content = decode_report_file(file_path)
+                metadata = content["metadata"]
+                pages_content = content["contenido"]
+            except (MalformedReportError, KeyError) as e:
+                logger.error(f"[ERROR] Skipping malformed text page file '{file}': {e}")
+                continue
 
-            report_data.append({"content": pages_content, "metadata": metadata})
+            report_data.append(
+                {"content": pages_content, "metadata": metadata, "file_name": file}
+            )
 
         return report_data
 
@@ -270,29 +390,102 @@ class DatabaseCreator_text_pages:
         For each text page, the content is embedded using the OpenAI embeddings model
         and uploaded to the Qdrant collection.
         """
-        logger.info("[INFO] Processing text pages and uploading to Qdrant...")
-        points = []
+        self.ingest(self.manifest)
 
-        for idx, page in tqdm(enumerate(self.jsons), total=len(self.jsons)):
-            content = page.get("content")
-            metadata = page.get("metadata")
+    def rebuild(self):
+        """
+        Rebuilds the collection from scratch in a new version and swaps it in
+        behind the collection alias once it is complete (blue/green update).
+        """
+        self.manifest = rebuild_collection(
+            qdrant_client=self.qdrant_client,
+            collection_name=self.collection_name,
+            ingest=self.ingest,
+        )
 
-            # Embedding the page content
-            page_embedding = self.embedding_model.get_text_embedding(content)
+    def ingest(self, manifest: IngestionManifest):
+        """
+        Embeds and upserts the new and modified text pages into the collection
+        described by a manifest, and records them in it.
 
-            # Create a point and add it to the list of points to upload
-            points.append(
-                models.PointStruct(
-                    id=idx,
-                    vector=page_embedding,
-                    payload={"page_content": content, "metadata": metadata},
-                )
+        Args:
+            manifest (IngestionManifest): Manifest of the target collection
+                (the live collection, or a new version being built).
+        """
+        logger.info("[INFO] Processing text pages and uploading to Qdrant...")
+        manifest.reconcile(qdrant_client=self.qdrant_client)
+        changed_files, removed_files = manifest.scan(self.texts_folder)
+        previous_point_ids = set(
+            manifest.point_ids(changed_files + removed_files)
+        )
+
+        # Load the new and modified text pages
+        self.jsons = self.load_json_data(json_files=changed_files)
+
+        # Split each page into chunks; the page point ID is the parent of its chunks
+        chunks = [
+            (page["file_name"], *chunk)
+            for page in self.jsons
+            for chunk in chunk_document(
+                chunker=self.chunker,
+                collection_name=self.collection_name,
+                parent_id=self.page_point_id(page.get("metadata")),
+                content=page.get("content"),
+                metadata=page.get("metadata"),
             )
+        ]
+        file_point_ids = defaultdict(list)
+        for file_name, chunk_id, _, _ in chunks:
+            file_point_ids[file_name].append(chunk_id)
 
+        # Embed the chunks in batches and stream the points to Qdrant
         logger.info(
-            f"[INFO] Uploading {len(points)} records to Qdrant for text pages..."
+            f"[INFO] Uploading {len(chunks)} chunks of {len(self.jsons)} records to Qdrant for text pages..."
         )
-        self.qdrant_client.upload_points(
-            collection_name=self.collection_name, points=points
+        with PointUploader(
+                qdrant_client=self.qdrant_client,
+                collection_name=manifest.collection_name,
+        ) as uploader:
+            for i, page_embedding in iter_embeddings(
+                    embedding_model=self.embedding_model,
+                    texts=[chunk.text for _, _, chunk, _ in chunks],
+                    desc="Embedding text pages",
+            ):
+                _, chunk_id, chunk, chunk_metadata = chunks[i]
+                uploader.add(
+                    models.PointStruct(
+                        id=chunk_id,
+                        vector=page_embedding,
+                        payload={
+                            "page_content": chunk.text,
+                            "metadata": chunk_metadata,
+                        },
+                    )
+                )
+
+        for page in self.jsons:
+            manifest.record(
+                file_name=page["file_name"],
+                point_ids=file_point_ids[page["file_name"]],
+                report_id=page.get("metadata").get("Report_Id"),
+            )
+
+        # Malformed files are recorded without points until they are modified again
+        for file in set(changed_files) - {page["file_name"] for page in self.jsons}:
+            manifest.record(file_name=file, point_ids=[])
+
+        # Remove the points of the modified and deleted files that were not
+        # rewritten, except those an unchanged file still owns
+        stale_point_ids = list(
+            previous_point_ids
+            - {chunk_id for _, chunk_id, _, _ in chunks}
+            - manifest.other_point_ids(changed_files + removed_files)
         )
+        if stale_point_ids:
+            self.qdrant_client.delete(
+                collection_name=manifest.collection_name,
+                points_selector=models.PointIdsList(points=stale_point_ids),
+            )
+        manifest.forget(removed_files)
+        manifest.save()
         logger.info("[INFO] Successfully uploaded text pages!")
@@ -0,0 +1,284 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+# Authors: SDG DS unit
+"""
+Persistent, content-addressed store of document embeddings for ingestion.
+
+Re-running ingestion used to embed identical strings again: unchanged KPI
+descriptions, or the `json.dumps(report_id)` strings embedded both for the
+element names and the upload dates of every report. `EmbeddingStore` keeps
+every document embedding on local disk, keyed by the SHA-256 hash of the text:
+
+- the vectors are appended as float16 rows to a flat file that is read through
+  a NumPy memory map, so lookups do not load the whole store in memory;
+- a SQLite index maps each text hash to its row in that file.
+
+`StoredEmbeddings` wraps an embedding model and only sends the texts missing
+from the store to the model, so rebuilding the collections from scratch (e.g.
+after a Qdrant wipe) needs almost no model inference. The store is specific to
+the embedding model: each model has its own pair of files.
+
+Configuration (environment variables):
+    - INGESTION_EMBEDDING_STORE_DIR: Folder of the store
+      (default: src/services/data/embedding_store). Set it to an empty string
+      to disable the store.
+"""
+
+import hashlib
+import logging
+import os
+import re
+import sqlite3
+import threading
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+from dotenv import load_dotenv
+from langchain_core.embeddings import Embeddings
+
+from src.services.llm.embeddings import (
+    EMBEDDING_MODEL_NAME,
+    EMBEDDING_SIZE,
+    shared_embeddings,
+)
+from src.utils.logging_config import setup_logging
+
+load_dotenv()
+
+# Set up logging
+setup_logging()
+logger = logging.getLogger(name=__name__)
+
+DEFAULT_STORE_DIR = "src/services/data/embedding_store"
+
+
+def text_hash(text: str) -> str:
+    """
+    Returns the key of a text in the store.
+
+    Args:
+        text (str): The embedded text.
+
+    Returns:
+        str: Hexadecimal SHA-256 digest of the UTF-8 text.
+    """
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class EmbeddingStore:
+    """
+    Float16 memory-mapped vectors plus a SQLite hash index, for one model.
+
+    Attributes:
+        model_name (str): Name of the model whose embeddings are stored.
+        dimension (int): Size of the vectors.
+        vectors_path (str): Flat file with one float16 row per vector.
+        index_path (str): SQLite file mapping text hashes to rows.
+    """
+
+    def __init__(self, store_dir: str, model_name: str, dimension: int) -> None:
+        """
+        Opens (or creates) the store of a model.
+
+        Args:
+            store_dir (str): Folder of the store.
+            model_name (str): Name of the model whose embeddings are stored.
+            dimension (int): Size of the vectors.
+        """
+        self.model_name = model_name
+        self.dimension = dimension
+        file_stem = re.sub(r"[^A-Za-z0-9_.-]+", "_", model_name)
+        self.vectors_path = os.path.join(store_dir, f"{file_stem}.f16")
+        self.index_path = os.path.join(store_dir, f"{file_stem}.sqlite")
+        self._row_bytes = dimension * np.dtype(np.float16).itemsize
+        self._lock = threading.Lock()
+        self._memmap: Optional[np.memmap] = None
+
+        os.makedirs(store_dir, exist_ok=True)
+        self._db = sqlite3.connect(self.index_path, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            "hash TEXT PRIMARY KEY, row INTEGER NOT NULL)"
+        )
+        self._db.commit()
+
+        # Drop a partially written row left by an interrupted append
+        if os.path.exists(self.vectors_path):
+            size = os.path.getsize(self.vectors_path)
+            if size % self._row_bytes:
+                with open(self.vectors_path, "r+b") as file:
+                    file.truncate(size - size % self._row_bytes)
+        self._rows = self._count_rows()
+        logger.info(
+            f"Ingestion embedding store '{self.vectors_path}' opened ({self._rows} vectors)."
+        )
+
+    def _count_rows(self) -> int:
+        """
+        Returns the number of vectors in the vectors file.
+        """
+        if not os.path.exists(self.vectors_path):
+            return 0
+        return os.path.getsize(self.vectors_path) // self._row_bytes
+
+    def _vectors(self) -> Optional[np.memmap]:
+        """
+        Returns a memory map over every stored vector, remapping the file
+        after appends.
+        """
+        if self._rows == 0:
+            return None
+        if self._memmap is None or self._memmap.shape[0] != self._rows:
+            self._memmap = np.memmap(
+                self.vectors_path,
+                dtype=np.float16,
+                mode="r",
+                shape=(self._rows, self.dimension),
+            )
+        return self._memmap
+
+    def get_many(self, hashes: Sequence[str]) -> Dict[str, List[float]]:
+        """
+        Looks up vectors by text hash.
+
+        Args:
+            hashes (Sequence[str]): Text hashes to look up.
+
+        Returns:
+            Dict[str, List[float]]: The stored vectors, keyed by hash; hashes
+            not in the store are left out.
+        """
+        found: Dict[str, List[float]] = {}
+        with self._lock:
+            vectors = self._vectors()
+            if vectors is None:
+                return found
+            # Stay well below SQLite's limit on bound parameters
+            for start in range(0, len(hashes), 500):
+                chunk = list(hashes[start:start + 500])
+                placeholders = ",".join("?" * len(chunk))
+                rows = self._db.execute(
+                    f"SELECT hash, row FROM embeddings WHERE hash IN ({placeholders})",
+                    chunk,
+                ).fetchall()
+                for key, row in rows:
+                    if row < vectors.shape[0]:
+                        found[key] = vectors[row].astype(np.float32).tolist()
+        return found
+
+    def put_many(self, hashes: Sequence[str], vectors: Sequence[List[float]]) -> None:
+        """
+        Appends vectors to the store.
+
+        Args:
+            hashes (Sequence[str]): Text hash of each vector.
+            vectors (Sequence[List[float]]): Vectors to store.
+        """
+        if not hashes:
+            return
+        data = np.asarray(vectors, dtype=np.float16).reshape(len(hashes), self.dimension)
+        with self._lock:
+            first_row = self._rows
+            # The vectors are written before the index, so that an indexed row always exists
+            with open(self.vectors_path, "ab") as file:
+                file.write(data.tobytes())
+            self._rows += len(hashes)
+            self._db.executemany(
+                "INSERT OR REPLACE INTO embeddings (hash, row) VALUES (?, ?)",
+                [(key, first_row + i) for i, key in enumerate(hashes)],
+            )
+            self._db.commit()
+
+
+class StoredEmbeddings(Embeddings):
+    """
+    Embeddings wrapper that serves document vectors from an `EmbeddingStore`.
+
+    Attributes:
+        embeddings (Embeddings): The wrapped embedding model.
+        store (EmbeddingStore): Store of the model's document embeddings.
+        hits (int): Documents served from the store.
+        misses (int): Documents that required the model.
+    """
+
+    def __init__(self, embeddings: Embeddings, store: EmbeddingStore) -> None:
+        """
+        Initializes the wrapper.
+
+        Args:
+            embeddings (Embeddings): The embedding model to wrap.
+            store (EmbeddingStore): Store of the model's document embeddings.
+        """
+        self.embeddings = embeddings
+        self.store = store
+        self.hits = 0
+        self.misses = 0
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        """
+        Embeds documents, only running the model on texts missing from the store.
+
+        Args:
+            texts (List[str]): Texts to embed.
+
+        Returns:
+            List[List[float]]: One embedding per text.
+        """
+        hashes = [text_hash(text) for text in texts]
+        found = self.store.get_many(hashes)
+
+        # Embed each missing text once, even if it appears several times
+        missing: Dict[str, str] = {}
+        for key, text in zip(hashes, texts):
+            if key not in found:
+                missing.setdefault(key, text)
+        if missing:
+            vectors = self.embeddings.embed_documents(list(missing.values()))
+            self.store.put_many(list(missing), vectors)
+            found.update(zip(missing, vectors))
+
+        self.hits += len(texts) - len(missing)
+        self.misses += len(missing)
+        return [found[key] for key in hashes]
+
+    def embed_query(self, text: str) -> List[float]:
+        """
+        Embeds a query with the wrapped model (not stored).
+
+        Args:
+            text (str): Query text.
+
+        Returns:
+            List[float]: The query embedding.
+        """
+        return self.embeddings.embed_query(text)
+
+
+_document_embeddings: Optional[Embeddings] = None
+_document_embeddings_lock = threading.Lock()
+
+
+def get_document_embeddings() -> Embeddings:
+    """
+    Returns the embedding model used by the ingestion paths: the shared model,
+    wrapped with the persistent store unless it is disabled.
+
+    Returns:
+        Embeddings: The model shared by every `DatabaseCreator`.
+    """
+    global _document_embeddings
+    with _document_embeddings_lock:
+        if _document_embeddings is None:
+            store_dir = os.getenv("INGESTION_EMBEDDING_STORE_DIR", DEFAULT_STORE_DIR)
+            if store_dir:
+                _document_embeddings = StoredEmbeddings(
+                    embeddings=shared_embeddings,
+                    store=EmbeddingStore(
+                        store_dir=store_dir,
+                        model_name=EMBEDDING_MODEL_NAME,
+                        dimension=EMBEDDING_SIZE,
+                    ),
+                )
+            else:
+                _document_embeddings = shared_embeddings
+        return _document_embeddings
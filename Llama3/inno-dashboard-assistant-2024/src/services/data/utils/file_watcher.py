@@ -0,0 +1,239 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+# Authors: SDG DS unit
+"""
+Watcher of the ETL output folders that triggers incremental ingestion.
+
+New dashboard extractions land as JSON files in
+`etl_data/{json_reports,page_reports,sum_reports}`, and used to be ingested
+only when someone clicked "Update Data". `FolderWatcher` polls those folders
+(standard library only, no platform-specific file event API) and compares
+the modification time and size of their files with the previous poll.
+
+Changes are debounced and grouped into micro-batches: a batch is submitted
+once the folders have been quiet for `WATCH_DEBOUNCE` seconds, or at the
+latest `WATCH_MAX_DELAY` seconds after its first change, so that a burst of
+files written by the ETL becomes a single update. Each batch runs as an
+ingestion job (see `ingestion_jobs`) with only the `DatabaseCreator`s fed by
+the changed folders, in incremental mode; their manifests then pick up
+exactly the new, modified and deleted files. While a batch is running, new
+changes are accumulated for the next one.
+
+Configuration (environment variables):
+    - WATCH_INTERVAL: Seconds between two polls (default: 1).
+    - WATCH_DEBOUNCE: Quiet period before a batch is submitted (default: 2).
+    - WATCH_MAX_DELAY: Maximum wait of a change before its batch is submitted
+      (default: 30).
+"""
+
+import logging
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+from dotenv import load_dotenv
+
+from src.services.data.utils.ingestion_jobs import (
+    FINISHED_STATUSES,
+    IngestionJob,
+    IngestionJobRunner,
+)
+from src.utils.logging_config import setup_logging
+
+load_dotenv()
+
+# Set up logging
+setup_logging()
+logger = logging.getLogger(name=__name__)
+
+WATCH_INTERVAL = float(os.getenv("WATCH_INTERVAL", "1"))
+WATCH_DEBOUNCE = float(os.getenv("WATCH_DEBOUNCE", "2"))
+WATCH_MAX_DELAY = float(os.getenv("WATCH_MAX_DELAY", "30"))
+
+FileStats = Dict[str, Tuple[float, int]]
+
+
+def folder_stats(folder: str, suffix: str = ".json") -> FileStats:
+    """
+    Returns the modification time and size of the source files of a folder.
+
+    Args:
+        folder (str): Folder to list.
+        suffix (str): Extension of the source files.
+
+    Returns:
+        FileStats: (mtime, size) per file name; empty if the folder is missing.
+    """
+    stats = {}
+    try:
+        with os.scandir(folder) as entries:
+            for entry in entries:
+                if entry.is_file() and entry.name.endswith(suffix):
+                    stat = entry.stat()
+                    stats[entry.name] = (stat.st_mtime, stat.st_size)
+    except FileNotFoundError:
+        pass
+    return stats
+
+
+def changed_files(previous: FileStats, current: FileStats) -> Set[str]:
+    """
+    Returns the files added, modified or deleted between two listings.
+
+    Args:
+        previous (FileStats): Previous listing of a folder.
+        current (FileStats): Current listing of the folder.
+
+    Returns:
+        Set[str]: Names of the changed files.
+    """
+    return {
+        file_name
+        for file_name in previous.keys() | current.keys()
+        if previous.get(file_name) != current.get(file_name)
+    }
+
+
+class FolderWatcher:
+    """
+    Polls source folders and submits micro-batches of incremental updates.
+
+    Attributes:
+        routes (Dict[str, List[str]]): Names of the tasks to run per watched folder.
+        tasks (Dict[str, Callable[[], Any]]): Incremental update task per name.
+        runner (IngestionJobRunner): Runner of the update jobs.
+        interval (float): Seconds between two polls.
+        debounce (float): Quiet period before a batch is submitted.
+        max_delay (float): Maximum wait of a change before its batch is submitted.
+    """
+
+    def __init__(
+            self,
+            routes: Dict[str, List[str]],
+            tasks: Dict[str, Callable[[], Any]],
+            runner: IngestionJobRunner,
+            on_finish: Optional[Callable[[IngestionJob], None]] = None,
+            interval: float = WATCH_INTERVAL,
+            debounce: float = WATCH_DEBOUNCE,
+            max_delay: float = WATCH_MAX_DELAY,
+    ) -> None:
+        """
+        Initializes the watcher.
+
+        Args:
+            routes (Dict[str, List[str]]): Names of the tasks to run per watched folder.
+            tasks (Dict[str, Callable[[], Any]]): Incremental update task per name.
+            runner (IngestionJobRunner): Runner of the update jobs.
+            on_finish (Optional[Callable[[IngestionJob], None]]): Called when an
+                update job ends (e.g. to invalidate caches).
+            interval (float): Seconds between two polls.
+            debounce (float): Quiet period before a batch is submitted.
+            max_delay (float): Maximum wait of a change before its batch is submitted.
+        """
+        self.routes = routes
+        self.tasks = tasks
+        self.runner = runner
+        self.on_finish = on_finish
+        self.interval = interval
+        self.debounce = debounce
+        self.max_delay = max_delay
+
+        self._stats: Dict[str, FileStats] = {}
+        self._pending: Dict[str, Set[str]] = {}
+        self._first_change: Optional[float] = None
+        self._last_change: Optional[float] = None
+        self._job: Optional[IngestionJob] = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        """
+        Takes the initial listing of the folders and starts polling them.
+
+        A first batch covers every folder, so that the files written while the
+        watcher was not running are ingested (the manifests skip the others).
+        """
+        self._stats = {folder: folder_stats(folder) for folder in self.routes}
+        self._pending = {folder: set() for folder in self.routes}
+        self._first_change = self._last_change = time.monotonic()
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._run, name="folder-watcher", daemon=True
+        )
+        self._thread.start()
+        logger.info(
+            f"[INFO] Watching {len(self.routes)} folders for new reports "
+            f"(debounce {self.debounce}s, max delay {self.max_delay}s)."
+        )
+
+    def stop(self) -> None:
+        """
+        Stops polling the folders.
+        """
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def poll(self) -> None:
+        """
+        Lists the folders once, records their changes and submits the pending
+        batch if it is due.
+        """
+        now = time.monotonic()
+        for folder in self.routes:
+            current = folder_stats(folder)
+            changes = changed_files(self._stats.get(folder, {}), current)
+            self._stats[folder] = current
+            if changes:
+                self._pending.setdefault(folder, set()).update(changes)
+                self._last_change = now
+                if self._first_change is None:
+                    self._first_change = now
+
+        if not self._pending:
+            return
+        due = (
+            now - self._last_change >= self.debounce
+            or now - self._first_change >= self.max_delay
+        )
+        # A single batch runs at a time; changes made meanwhile wait for the next one
+        idle = self._job is None or self._job.status in FINISHED_STATUSES
+        if due and idle:
+            self._submit()
+
+    def _submit(self) -> None:
+        """
+        Submits the pending changes as an incremental update job.
+        """
+        task_names = []
+        for folder in self._pending:
+            for name in self.routes[folder]:
+                if name not in task_names:
+                    task_names.append(name)
+        file_count = sum(len(files) for files in self._pending.values())
+
+        self._job = self.runner.submit(
+            update_type="watch",
+            mode="incremental",
+            tasks={name: self.tasks[name] for name in task_names},
+            parallel=True,
+            on_finish=self.on_finish,
+        )
+        logger.info(
+            f"[INFO] {file_count} changed files; submitted job {self._job.job_id} "
+            f"for {', '.join(task_names)}."
+        )
+        self._pending = {}
+        self._first_change = None
+        self._last_change = None
+
+    def _run(self) -> None:
+        """
+        Polls the folders until the watcher is stopped.
+        """
+        while not self._stop.wait(self.interval):
+            try:
+                self.poll()
+            except Exception as e:
+                logger.error(f"Error watching the report folders: {e}", exc_info=True)
@@ -0,0 +1,432 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+# Authors: SDG DS unit
+"""
+Background jobs for the `/update_data` endpoint.
+
+An ingestion used to run inside the Flask request thread, so a long refresh
+held a server worker and often ended in an HTTP timeout on the Streamlit side.
+`IngestionJobRunner` runs each update as a job in a background thread and
+returns its ID right away; the job status is then polled by ID. The tasks of a
+job (one per `DatabaseCreator`) can run in parallel, as they write to
+different collections.
+
+While a job runs, the ingestion code reports its progress through the module
+functions `report_total`, `report_progress` and `check_cancelled`. They act on
+the `JobProgress` of the job running in the current thread (a context
+variable), and do nothing outside a job. The stages reported are:
+- "parsed": source files read and decoded;
+- "embedded": documents embedded;
+- "uploaded": points upserted to Qdrant.
+
+A cancelled job stops at the next batch boundary (`check_cancelled` raises
+`IngestionCancelled`). Its manifests are not saved, so the next incremental
+update processes the same files again; a cancelled blue/green rebuild drops
+its new collection version.
+
+Configuration (environment variables):
+    - INGESTION_JOB_HISTORY: Number of finished jobs kept for the status
+      endpoint (default: 20).
+"""
+
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, List, Optional
+
+from dotenv import load_dotenv
+
+from src.utils.logging_config import setup_logging
+
+load_dotenv()
+
+# Set up logging
+setup_logging()
+logger = logging.getLogger(name=__name__)
+
+INGESTION_JOB_HISTORY = int(os.getenv("INGESTION_JOB_HISTORY", "20"))
+
+STAGES = ("parsed", "embedded", "uploaded")
+FINISHED_STATUSES = ("succeeded", "failed", "cancelled")
+
+
+class IngestionCancelled(Exception):
+    """
+    Raised inside a job when it has been cancelled.
+    """
+
+
+class JobProgress:
+    """
+    Thread-safe progress counters and cancellation flag of a job.
+
+    Attributes:
+        stages (Dict[str, Dict[str, int]]): "done" and "total" count per stage.
+    """
+
+    def __init__(self) -> None:
+        """
+        Initializes the counters of every stage to zero.
+        """
+        self.stages = {stage: {"done": 0, "total": 0} for stage in STAGES}
+        self._cancelled = threading.Event()
+        self._lock = threading.Lock()
+
+    def add_total(self, stage: str, count: int) -> None:
+        """
+        Adds work to do to a stage.
+
+        Args:
+            stage (str): Name of the stage.
+            count (int): Number of items to add.
+        """
+        with self._lock:
+            self.stages[stage]["total"] += count
+
+    def advance(self, stage: str, count: int) -> None:
+        """
+        Adds done work to a stage.
+
+        Args:
+            stage (str): Name of the stage.
+            count (int): Number of items done.
+        """
+        with self._lock:
+            self.stages[stage]["done"] += count
+
+    def cancel(self) -> None:
+        """
+        Flags the job as cancelled.
+        """
+        self._cancelled.set()
+
+    @property
+    def cancelled(self) -> bool:
+        """
+        Whether the job has been cancelled.
+        """
+        return self._cancelled.is_set()
+
+    def snapshot(self) -> Dict[str, Dict[str, int]]:
+        """
+        Returns a copy of the counters.
+        """
+        with self._lock:
+            return {stage: dict(counts) for stage, counts in self.stages.items()}
+
+
+_current_progress: ContextVar[Optional[JobProgress]] = ContextVar(
+    "ingestion_job_progress", default=None
+)
+
+
+def current_progress() -> Optional[JobProgress]:
+    """
+    Returns the progress of the job running in the current thread.
+
+    Returns:
+        Optional[JobProgress]: The job progress, or None outside a job.
+    """
+    return _current_progress.get()
+
+
+def report_total(stage: str, count: int) -> None:
+    """
+    Adds work to do to a stage of the current job, if any.
+
+    Args:
+        stage (str): Name of the stage.
+        count (int): Number of items to add.
+    """
+    progress = _current_progress.get()
+    if progress is not None:
+        progress.add_total(stage, count)
+
+
+def report_progress(stage: str, count: int) -> None:
+    """
+    Adds done work to a stage of the current job, if any.
+
+    Args:
+        stage (str): Name of the stage.
+        count (int): Number of items done.
+    """
+    progress = _current_progress.get()
+    if progress is not None:
+        progress.advance(stage, count)
+
+
+def check_cancelled() -> None:
+    """
+    Stops the current job if it has been cancelled.
+
+    Raises:
+        IngestionCancelled: If the current job has been cancelled.
+    """
+    progress = _current_progress.get()
+    if progress is not None and progress.cancelled:
+        raise IngestionCancelled("The ingestion job was cancelled.")
+
+
+class IngestionJob:
+    """
+    An update of one or several collections, run in the background.
+
+    Attributes:
+        job_id (str): Unique ID of the job.
+        update_type (str): Update type requested ('all', 'tabular', ...).
+        mode (str): Update mode ('incremental' or 'blue_green').
+        status (str): 'queued', 'running', 'succeeded', 'failed' or 'cancelled'.
+        tasks (Dict[str, str]): Status of each task of the job.
+        progress (JobProgress): Progress counters of the job.
+        error (Optional[str]): Error of a failed job.
+        created_at (float): Submission time (epoch seconds).
+        started_at (Optional[float]): Start time.
+        finished_at (Optional[float]): End time.
+    """
+
+    def __init__(self, update_type: str, mode: str, task_names: List[str]) -> None:
+        """
+        Initializes a queued job.
+
+        Args:
+            update_type (str): Update type requested.
+            mode (str): Update mode.
+            task_names (List[str]): Names of the tasks of the job.
+        """
+        self.job_id = uuid.uuid4().hex
+        self.update_type = update_type
+        self.mode = mode
+        self.status = "queued"
+        self.tasks = {name: "queued" for name in task_names}
+        self.progress = JobProgress()
+        self.error: Optional[str] = None
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        """
+        Returns the job status as a JSON-serializable dictionary.
+
+        Returns:
+            Dict[str, Any]: The job status.
+        """
+        return {
+            "job_id": self.job_id,
+            "update_type": self.update_type,
+            "mode": self.mode,
+            "status": self.status,
+            "tasks": dict(self.tasks),
+            "progress": self.progress.snapshot(),
+            "error": self.error,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+
+
+class IngestionJobRunner:
+    """
+    Runs ingestion jobs one at a time in a background thread.
+
+    Jobs are queued, so two updates never write to the same collection (and
+    manifest) concurrently. Within a job, the tasks can run in parallel.
+    """
+
+    def __init__(self, history: int = INGESTION_JOB_HISTORY) -> None:
+        """
+        Initializes the runner.
+
+        Args:
+            history (int): Number of finished jobs kept for status requests.
+        """
+        self.history = history
+        self._jobs: "OrderedDict[str, IngestionJob]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="ingestion-job"
+        )
+
+    def submit(
+            self,
+            update_type: str,
+            mode: str,
+            tasks: Dict[str, Callable[[], Any]],
+            parallel: bool = False,
+            on_finish: Optional[Callable[[IngestionJob], None]] = None,
+    ) -> IngestionJob:
+        """
+        Queues a job.
+
+        Args:
+            update_type (str): Update type requested.
+            mode (str): Update mode.
+            tasks (Dict[str, Callable[[], Any]]): Task per name, e.g. the
+                update function of each `DatabaseCreator`.
+            parallel (bool): Whether the tasks run concurrently.
+            on_finish (Optional[Callable[[IngestionJob], None]]): Called when the
+                job ends, whatever its status (e.g. to invalidate caches).
+
+        Returns:
+            IngestionJob: The queued job.
+        """
+        job = IngestionJob(update_type=update_type, mode=mode, task_names=list(tasks))
+        with self._lock:
+            self._jobs[job.job_id] = job
+            self._prune()
+        self._executor.submit(self._run, job, tasks, parallel, on_finish)
+        logger.info(f"[INFO] Queued ingestion job {job.job_id} ({update_type}, {mode}).")
+        return job
+
+    def get(self, job_id: str) -> Optional[IngestionJob]:
+        """
+        Returns a job by ID.
+
+        Args:
+            job_id (str): ID of the job.
+
+        Returns:
+            Optional[IngestionJob]: The job, or None if it is unknown.
+        """
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def list(self) -> List[IngestionJob]:
+        """
+        Returns the known jobs, oldest first.
+
+        Returns:
+            List[IngestionJob]: The jobs.
+        """
+        with self._lock:
+            return list(self._jobs.values())
+
+    def cancel(self, job_id: str) -> Optional[IngestionJob]:
+        """
+        Cancels a queued or running job.
+
+        Args:
+            job_id (str): ID of the job.
+
+        Returns:
+            Optional[IngestionJob]: The job, or None if it is unknown.
+        """
+        job = self.get(job_id)
+        if job is not None and job.status not in FINISHED_STATUSES:
+            job.progress.cancel()
+            logger.info(f"[INFO] Cancellation requested for ingestion job {job_id}.")
+        return job
+
+    def _prune(self) -> None:
+        """
+        Forgets the oldest finished jobs beyond the history size.
+        """
+        finished = [
+            job_id
+            for job_id, job in self._jobs.items()
+            if job.status in FINISHED_STATUSES
+        ]
+        for job_id in finished[: max(0, len(finished) - self.history)]:
+            del self._jobs[job_id]
+
+    def _run_task(self, job: IngestionJob, name: str, task: Callable[[], Any]) -> None:
+        """
+        Runs a task of a job, with the job progress as the current progress.
+
+        Args:
+            job (IngestionJob): The job.
+            name (str): Name of the task.
+            task (Callable[[], Any]): The task.
+        """
+        token = _current_progress.set(job.progress)
+        try:
+            check_cancelled()
+            job.tasks[name] = "running"
+            task()
+            job.tasks[name] = "succeeded"
+        except IngestionCancelled:
+            job.tasks[name] = "cancelled"
+            raise
+        except Exception:
+            job.tasks[name] = "failed"
+            raise
+        finally:
+            _current_progress.reset(token)
+
+    def _run(
+            self,
+            job: IngestionJob,
+            tasks: Dict[str, Callable[[], Any]],
+            parallel: bool,
+            on_finish: Optional[Callable[[IngestionJob], None]],
+    ) -> None:
+        """
+        Runs a job and records its outcome.
+
+        Args:
+            job (IngestionJob): The job.
+            tasks (Dict[str, Callable[[], Any]]): Task per name.
+            parallel (bool): Whether the tasks run concurrently.
+            on_finish (Optional[Callable[[IngestionJob], None]]): Called when
+                the job ends.
+        """
+        job.status = "running"
+        job.started_at = time.time()
+        errors: List[Exception] = []
+        try:
+            if parallel and len(tasks) > 1:
+                with ThreadPoolExecutor(
+                        max_workers=len(tasks), thread_name_prefix="ingestion-task"
+                ) as executor:
+                    futures = [
+                        executor.submit(self._run_task, job, name, task)
+                        for name, task in tasks.items()
+                    ]
+                    for future in futures:
+                        error = future.exception()
+                        if error is not None:
+                            errors.append(error)
+            else:
+                for name, task in tasks.items():
+                    try:
+                        self._run_task(job, name, task)
+                    except Exception as e:
+                        errors.append(e)
+                        break
+
+            failures = [e for e in errors if not isinstance(e, IngestionCancelled)]
+            if failures:
+                job.status = "failed"
+                job.error = str(failures[0])
+                logger.error(
+                    f"Ingestion job {job.job_id} failed: {job.error}",
+                    exc_info=failures[0],
+                )
+            elif errors:
+                job.status = "cancelled"
+                logger.info(f"[INFO] Ingestion job {job.job_id} cancelled.")
+            else:
+                job.status = "succeeded"
+                logger.info(f"[INFO] Ingestion job {job.job_id} succeeded.")
+        finally:
+            job.finished_at = time.time()
+            for name, status in job.tasks.items():
+                if status == "queued":
+                    job.tasks[name] = "cancelled" if job.progress.cancelled else "skipped"
+            if on_finish is not None:
+                try:
+                    on_finish(job)
+                except Exception as e:
+                    logger.error(f"Error after ingestion job {job.job_id}: {e}")
+            with self._lock:
+                self._prune()
+
+
+# Runner shared by the Flask endpoints
+ingestion_job_runner = IngestionJobRunner()
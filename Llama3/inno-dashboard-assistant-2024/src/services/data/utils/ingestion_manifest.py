@@ -0,0 +1,297 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+# Authors: SDG DS unit
+"""
+Ingestion manifest used for incremental updates of the Qdrant collections.
+
+For every collection, the manifest records which source files have been
+ingested: their content hash, modification time and size, the IDs of the
+points created from them and the report they belong to. On the next update,
+`scan` compares the folder with the manifest and returns only the new or
+modified files and the files that disappeared, so the `DatabaseCreator`
+classes embed and upsert those files and delete the points of the others.
+
+A file whose modification time and size are unchanged is not read again. A
+touched file with the same content hash is not re-ingested either.
+
+The manifests are stored as JSON files in the folder given by the
+`INGESTION_STATE_DIR` environment variable (default:
+"src/services/data/ingestion_state"), one file per collection.
+
+Classes:
+- `IngestionManifest`: Manifest of the source files ingested into a collection.
+"""
+
+import hashlib
+import json
+import logging
+import os
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from dotenv import load_dotenv
+from qdrant_client import QdrantClient
+from qdrant_client.http import models
+
+from src.utils.logging_config import setup_logging
+
+load_dotenv()
+
+# Set up logging
+setup_logging()
+logger = logging.getLogger(name=__name__)
+
+INGESTION_STATE_DIR = os.getenv(
+    "INGESTION_STATE_DIR", "src/services/data/ingestion_state"
+)
+
+
+def file_hash(file_path: str) -> str:
+    """
+    Returns the SHA-256 hash of a file's content.
+
+    Args:
+        file_path (str): Path to the file.
+
+    Returns:
+        str: Hexadecimal digest of the file content.
+    """
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as file:
+        for block in iter(lambda: file.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class IngestionManifest:
+    """
+    Manifest of the source files ingested into a Qdrant collection.
+
+    Attributes:
+        collection_name (str): Name of the collection the manifest describes.
+        path (str): Path of the JSON file where the manifest is stored.
+        entries (Dict[str, Dict[str, Any]]): Manifest entry per source file name,
+            with the keys "hash", "mtime", "size", "point_ids", "report_id" and
+            optionally "point_hashes".
+    """
+
+    def __init__(
+            self, collection_name: str, state_dir: str = INGESTION_STATE_DIR
+    ) -> None:
+        """
+        Loads the manifest of a collection, or starts an empty one.
+
+        Args:
+            collection_name (str): Name of the collection.
+            state_dir (str): Folder where the manifests are stored.
+        """
+        self.collection_name = collection_name
+        self.path = os.path.join(state_dir, f"{collection_name}.json")
+        self.entries: Dict[str, Dict[str, Any]] = {}
+        self._pending: Dict[str, Dict[str, Any]] = {}
+
+        if os.path.exists(self.path):
+            with open(self.path, "r", encoding="utf-8") as file:
+                self.entries = json.load(file)
+
+    def scan(
+            self, folder: str, suffix: str = ".json"
+    ) -> Tuple[List[str], List[str]]:
+        """
+        Compares the files of a folder with the manifest.
+
+        Args:
+            folder (str): Folder with the source files.
+            suffix (str): Extension of the source files.
+
+        Returns:
+            Tuple[List[str], List[str]]: Names of the new or modified files, and
+            names of the files recorded in the manifest that no longer exist.
+        """
+        file_names = sorted(f for f in os.listdir(folder) if f.endswith(suffix))
+        changed = []
+        self._pending = {}
+
+        for file_name in file_names:
+            file_path = os.path.join(folder, file_name)
+            stat = os.stat(file_path)
+            entry = self.entries.get(file_name)
+            if (
+                entry is not None
+                and entry["mtime"] == stat.st_mtime
+                and entry["size"] == stat.st_size
+            ):
+                continue
+
+            content_hash = file_hash(file_path)
+            if entry is not None and entry["hash"] == content_hash:
+                # Touched but not modified: only refresh the file stats
+                entry["mtime"] = stat.st_mtime
+                entry["size"] = stat.st_size
+                continue
+
+            self._pending[file_name] = {
+                "hash": content_hash,
+                "mtime": stat.st_mtime,
+                "size": stat.st_size,
+            }
+            changed.append(file_name)
+
+        removed = sorted(set(self.entries) - set(file_names))
+        logger.info(
+            f"[INFO] '{self.collection_name}': {len(changed)} new or modified files, "
+            f"{len(removed)} removed files, "
+            f"{len(file_names) - len(changed)} unchanged files."
+        )
+        return changed, removed
+
+    def point_ids(self, file_names: Iterable[str]) -> List[Any]:
+        """
+        Returns the IDs of the points created from the given files.
+
+        Args:
+            file_names (Iterable[str]): Names of the source files.
+
+        Returns:
+            List[Any]: IDs of the points recorded for those files.
+        """
+        return [
+            point_id
+            for file_name in file_names
+            for point_id in self.entries.get(file_name, {}).get("point_ids", [])
+        ]
+
+    def other_point_ids(self, file_names: Iterable[str]) -> Set[Any]:
+        """
+        Returns the IDs of the points recorded for every file but the given ones.
+
+        Point IDs are derived from the content (report, date, page, ...), so two
+        files may share points: a point of a modified or deleted file is only
+        stale if no other file still owns it.
+
+        Args:
+            file_names (Iterable[str]): Names of the source files to leave out.
+
+        Returns:
+            Set[Any]: IDs of the points recorded for the other files.
+        """
+        excluded = set(file_names)
+        return {
+            point_id
+            for file_name, entry in self.entries.items()
+            if file_name not in excluded
+            for point_id in entry.get("point_ids", [])
+        }
+
+    def point_hashes(self, file_names: Iterable[str]) -> Dict[Any, str]:
+        """
+        Returns the content hash of each point created from the given files,
+        for the collections that record them.
+
+        Args:
+            file_names (Iterable[str]): Names of the source files.
+
+        Returns:
+            Dict[Any, str]: Content hash per point ID.
+        """
+        return {
+            point_id: point_hash
+            for file_name in file_names
+            for point_id, point_hash in self.entries.get(file_name, {})
+            .get("point_hashes", {})
+            .items()
+        }
+
+    def report_id(self, file_name: str) -> Optional[str]:
+        """
+        Returns the report a source file belongs to, if recorded.
+
+        Args:
+            file_name (str): Name of the source file.
+
+        Returns:
+            Optional[str]: The recorded report ID.
+        """
+        return self.entries.get(file_name, {}).get("report_id")
+
+    def record(
+            self,
+            file_name: str,
+            point_ids: List[Any],
+            report_id: Optional[str] = None,
+            point_hashes: Optional[Dict[Any, str]] = None,
+    ) -> None:
+        """
+        Records that a file returned by the last `scan` has been ingested.
+
+        Args:
+            file_name (str): Name of the source file.
+            point_ids (List[Any]): IDs of the points created from the file.
+            report_id (Optional[str]): Report the file belongs to.
+            point_hashes (Optional[Dict[Any, str]]): Content hash per point ID,
+                used to skip unchanged points when the file is modified.
+        """
+        entry = self._pending.pop(file_name)
+        entry["point_ids"] = point_ids
+        entry["report_id"] = report_id
+        if point_hashes:
+            entry["point_hashes"] = point_hashes
+        self.entries[file_name] = entry
+
+    def forget(self, file_names: Iterable[str]) -> None:
+        """
+        Removes files from the manifest.
+
+        Args:
+            file_names (Iterable[str]): Names of the source files.
+        """
+        for file_name in file_names:
+            self.entries.pop(file_name, None)
+
+    def reset(self) -> None:
+        """
+        Empties the manifest, so that every file is ingested again.
+        """
+        self.entries = {}
+        self._pending = {}
+        self.save()
+
+    def save(self) -> None:
+        """
+        Writes the manifest to disk, replacing the previous version atomically.
+        """
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as file:
+            json.dump(self.entries, file, ensure_ascii=False, indent=1)
+        os.replace(tmp_path, self.path)
+
+    def reconcile(self, qdrant_client: QdrantClient) -> None:
+        """
+        Aligns the manifest with the current content of the collection.
+
+        If the collection is empty (e.g. after a Qdrant wipe), the manifest is
+        reset so that every file is ingested again. If the collection holds
+        points that the manifest does not know about (e.g. data loaded before
+        the manifest existed), they are deleted, since they cannot be updated
+        incrementally.
+
+        Args:
+            qdrant_client (QdrantClient): The Qdrant client.
+        """
+        point_count = qdrant_client.count(
+            collection_name=self.collection_name, exact=True
+        ).count
+
+        if point_count == 0 and self.entries:
+            logger.info(
+                f"[INFO] '{self.collection_name}' is empty; resetting its manifest."
+            )
+            self.reset()
+        elif point_count > 0 and not self.entries:
+            logger.info(
+                f"[INFO] '{self.collection_name}' has untracked points; clearing it."
+            )
+            qdrant_client.delete(
+                collection_name=self.collection_name,
+                points_selector=models.FilterSelector(filter=models.Filter()),
+            )
@@ -0,0 +1,55 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+# Authors: SDG DS unit
+"""
+Deterministic point IDs for the Qdrant collections.
+
+The ID of a point is a UUIDv5 derived from the collection name and the fields
+that identify the stored element (report ID, date, page, element title...).
+The same element always gets the same ID, whatever the order in which the
+files are read, so upserts are idempotent and a re-run overwrites exactly the
+points it rebuilds. Unlike the former sum of character codes, different
+report IDs (e.g. anagrams) do not collide.
+
+Functions:
+- `point_id`: Returns the ID of a point from its identifying fields.
+- `report_point_id`: Returns the ID of the point holding a report's metadata.
+"""
+
+import json
+import uuid
+from typing import Any
+
+# Namespace of every point ID generated by the assistant
+POINT_ID_NAMESPACE = uuid.uuid5(uuid.NAMESPACE_DNS, "inno-dashboard-assistant")
+
+
+def point_id(collection_name: str, *fields: Any) -> str:
+    """
+    Returns the ID of a point from its identifying fields.
+
+    Args:
+        collection_name (str): Name of the collection the point belongs to.
+        *fields (Any): JSON-serializable fields identifying the point.
+
+    Returns:
+        str: The UUIDv5 of the point.
+    """
+    # Serializing the fields as a JSON list keeps ("a b", "c") and ("a", "b c") apart
+    name = json.dumps([collection_name, *fields], ensure_ascii=False, default=str)
+    return str(uuid.uuid5(POINT_ID_NAMESPACE, name))
+
+
+def report_point_id(collection_name: str, report_id: str) -> str:
+    """
+    Returns the ID of the point holding a report's metadata (e.g. in the
+    'element_names' and 'upload_dates' collections).
+
+    Args:
+        collection_name (str): Name of the collection the point belongs to.
+        report_id (str): The report ID.
+
+    Returns:
+        str: The UUIDv5 of the point.
+    """
+    return point_id(collection_name, report_id)
@@ -0,0 +1,215 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+# Authors: SDG DS unit
+"""
+Streaming upload of points to Qdrant.
+
+The `DatabaseCreator` classes used to build the full list of points (1024-float
+vectors plus payloads) in memory and send it in a single request. With a
+`PointUploader`, points are added one by one as their embeddings are computed:
+they are grouped in fixed-size batches and put on a bounded queue, from which
+upload threads send them to Qdrant. Embedding thus overlaps with network I/O,
+and the memory used by pending points is bounded by the queue size whatever
+the size of the corpus. When the queue is full, `add` blocks until an upload
+thread frees a slot.
+
+Failed upserts are retried with exponential backoff. If a batch still fails,
+the error is raised when the uploader is closed. Uploaded points are reported
+to the ingestion job running when the uploader was created, if any.
+
+Configuration (environment variables):
+    - UPLOAD_BATCH_SIZE: Points per upsert request (default: 64).
+    - UPLOAD_PARALLEL: Number of upload threads (default: 2).
+    - UPLOAD_MAX_RETRIES: Retries of a failed batch (default: 3).
+"""
+
+import logging
+import os
+import queue
+import threading
+import time
+from typing import List, Optional
+
+from dotenv import load_dotenv
+from qdrant_client import QdrantClient
+from qdrant_client.http import models
+
+from src.services.data.utils.ingestion_jobs import current_progress
+from src.utils.logging_config import setup_logging
+
+load_dotenv()
+
+# Set up logging
+setup_logging()
+logger = logging.getLogger(name=__name__)
+
+UPLOAD_BATCH_SIZE = int(os.getenv("UPLOAD_BATCH_SIZE", "64"))
+UPLOAD_PARALLEL = int(os.getenv("UPLOAD_PARALLEL", "2"))
+UPLOAD_MAX_RETRIES = int(os.getenv("UPLOAD_MAX_RETRIES", "3"))
+RETRY_BASE_DELAY = 0.5  # Seconds before the first retry; doubled on each retry
+
+
+class PointUploader:
+    """
+    Uploads points to a Qdrant collection in batches from background threads.
+
+    Use it as a context manager: the remaining points are flushed, and any
+    upload error is raised, when the block exits.
+
+    Attributes:
+        qdrant_client (QdrantClient): The Qdrant client.
+        collection_name (str): Name of the collection to upload to.
+        batch_size (int): Points per upsert request.
+        parallel (int): Number of upload threads.
+        max_retries (int): Retries of a failed batch.
+        uploaded (int): Number of points uploaded so far.
+    """
+
+    def __init__(
+            self,
+            qdrant_client: QdrantClient,
+            collection_name: str,
+            batch_size: Optional[int] = None,
+            parallel: Optional[int] = None,
+            max_retries: Optional[int] = None,
+    ) -> None:
+        """
+        Initializes the uploader and starts its upload threads.
+
+        Args:
+            qdrant_client (QdrantClient): The Qdrant client.
+            collection_name (str): Name of the collection to upload to.
+            batch_size (Optional[int]): Points per upsert request. Defaults to
+                `UPLOAD_BATCH_SIZE`.
+            parallel (Optional[int]): Number of upload threads. Defaults to
+                `UPLOAD_PARALLEL`.
+            max_retries (Optional[int]): Retries of a failed batch. Defaults to
+                `UPLOAD_MAX_RETRIES`.
+        """
+        self.qdrant_client = qdrant_client
+        self.collection_name = collection_name
+        self.batch_size = max(1, batch_size or UPLOAD_BATCH_SIZE)
+        self.parallel = max(1, parallel or UPLOAD_PARALLEL)
+        self.max_retries = UPLOAD_MAX_RETRIES if max_retries is None else max_retries
+        self.uploaded = 0
+        # The upload threads do not inherit the context of the calling thread
+        self._progress = current_progress()
+
+        self._batch: List[models.PointStruct] = []
+        # Two pending batches per thread keep the threads busy without buffering more
+        self._queue: queue.Queue = queue.Queue(maxsize=2 * self.parallel)
+        self._errors: List[Exception] = []
+        self._lock = threading.Lock()
+        self._threads = [
+            threading.Thread(target=self._worker, daemon=True)
+            for _ in range(self.parallel)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def __enter__(self) -> "PointUploader":
+        """
+        Returns the uploader itself.
+        """
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        """
+        Closes the uploader; an upload error does not mask an exception raised
+        inside the block.
+        """
+        try:
+            self.close()
+        except RuntimeError:
+            if exc_type is None:
+                raise
+
+    def add(self, point: models.PointStruct) -> None:
+        """
+        Adds a point to the current batch, queuing the batch once it is full.
+
+        Args:
+            point (models.PointStruct): The point to upload.
+
+        Raises:
+            RuntimeError: If a previous batch could not be uploaded.
+        """
+        if self._errors:
+            raise RuntimeError(
+                f"Upload to '{self.collection_name}' failed"
+            ) from self._errors[0]
+        self._batch.append(point)
+        if len(self._batch) >= self.batch_size:
+            self._queue.put(self._batch)
+            self._batch = []
+
+    def close(self) -> None:
+        """
+        Uploads the remaining points and waits for the upload threads.
+
+        Raises:
+            RuntimeError: If a batch could not be uploaded.
+        """
+        if self._batch:
+            self._queue.put(self._batch)
+            self._batch = []
+        for _ in self._threads:
+            self._queue.put(None)
+        for thread in self._threads:
+            thread.join()
+
+        if self._errors:
+            raise RuntimeError(
+                f"Upload to '{self.collection_name}' failed"
+            ) from self._errors[0]
+        logger.info(
+            f"[INFO] Uploaded {self.uploaded} points to '{self.collection_name}'."
+        )
+
+    def _worker(self) -> None:
+        """
+        Uploads the queued batches until the end-of-stream marker is received.
+        """
+        while True:
+            batch = self._queue.get()
+            if batch is None:
+                return
+            # After a failure the remaining batches are drained but not sent
+            if self._errors:
+                continue
+            try:
+                self._upsert(batch)
+            except Exception as e:
+                logger.error(
+                    f"Error uploading {len(batch)} points to '{self.collection_name}': {e}"
+                )
+                with self._lock:
+                    self._errors.append(e)
+
+    def _upsert(self, batch: List[models.PointStruct]) -> None:
+        """
+        Upserts a batch, retrying with exponential backoff on failure.
+
+        Args:
+            batch (List[models.PointStruct]): Points to upsert.
+        """
+        for attempt in range(self.max_retries + 1):
+            try:
+                self.qdrant_client.upsert(
+                    collection_name=self.collection_name, points=batch, wait=True
+                )
+                break
+            except Exception as e:
+                if attempt == self.max_retries:
+                    raise
+                delay = RETRY_BASE_DELAY * 2 ** attempt
+                logger.warning(
+                    f"Upsert to '{self.collection_name}' failed ({e}); "
+                    f"retrying in {delay:.1f}s..."
+                )
+                time.sleep(delay)
+
+        with self._lock:
+            self.uploaded += len(batch)
+        if self._progress is not None:
+            self._progress.advance("uploaded", len(batch))
@@ -0,0 +1,317 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+# Authors: SDG DS unit
+"""
+Shared, parsed view of the report files in `json_reports`.
+
+The table creator and the three metadata builders (report names, element names
+and upload dates) all read the same report files. `ReportCorpus` parses each
+file once into a typed model (`ReportPage` with its `ReportElement`s) and keeps
+the result in memory until the file changes (modification time or size), so
+every builder consumes the same parsed pages and a full refresh reads and
+decodes each file a single time. Files are decoded with `report_decoder`;
+malformed files are logged, listed in `ReportCorpus.errors` and skipped.
+
+Files that are not cached yet can be parsed in a process pool; the number of
+worker processes is set with the `CORPUS_PARSE_WORKERS` environment variable
+(default: 1, i.e. parsed in the calling thread).
+
+Functions:
+- `parse_report_file`: Parses a report file into a `ReportPage`.
+- `get_report_corpus`: Returns the shared corpus of a folder.
+"""
+
+import logging
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from dotenv import load_dotenv
+from tqdm import tqdm
+
+from src.services.data.utils.ingestion_jobs import report_progress, report_total
+from src.services.data.utils.report_decoder import (
+    MalformedReportError,
+    decode_report_file,
+)
+from src.utils.logging_config import setup_logging
+
+load_dotenv()
+
+# Set up logging
+setup_logging()
+logger = logging.getLogger(name=__name__)
+
+CORPUS_PARSE_WORKERS = int(os.getenv("CORPUS_PARSE_WORKERS", "1"))
+
+# Keys of each element type in the "detected_elements" of a report file:
+# (list key, element type, title, content, value, columns, rows)
+ELEMENT_KEYS = (
+    ("KPIs", "KPI", "kpi_title", "kpi_description", "kpi_value", None, None),
+    (
+        "charts",
+        "Chart",
+        "visualization_title",
+        "visualization_description",
+        "values",
+        "metrics_displayed",
+        None,
+    ),
+    ("tables", "Table", "table_title", "table_description", None, "columns", "rows"),
+)
+
+
+@dataclass
+class ReportElement:
+    """
+    KPI, chart or table detected in a report page.
+
+    Attributes:
+        type (str): "KPI", "Chart" or "Table".
+        title (Optional[str]): Title of the element.
+        content (Optional[str]): Description of the element.
+        value (Any): Value(s) shown by the element.
+        columns (Any): Columns or metrics displayed by the element.
+        rows (Any): Rows of a table.
+    """
+
+    type: str
+    title: Optional[str] = None
+    content: Optional[str] = None
+    value: Any = None
+    columns: Any = None
+    rows: Any = None
+
+
+@dataclass
+class ReportPage:
+    """
+    Parsed content of a report file (one page of a dashboard).
+
+    Attributes:
+        file_name (str): Name of the source file.
+        report_id (Optional[str]): Report ID, or None if the file has none.
+        date (str): Insertion date ("YYYY-MM-DD"), or "Unknown".
+        page (Any): Page number, or "Unknown".
+        elements (List[ReportElement]): Detected KPIs, charts and tables.
+    """
+
+    file_name: str
+    report_id: Optional[str] = None
+    date: str = "Unknown"
+    page: Any = "Unknown"
+    elements: List[ReportElement] = field(default_factory=list)
+
+    def elements_of_type(self, element_type: str) -> List[ReportElement]:
+        """
+        Returns the elements of the given type.
+
+        Args:
+            element_type (str): "KPI", "Chart" or "Table".
+
+        Returns:
+            List[ReportElement]: The elements of that type, in file order.
+        """
+        return [element for element in self.elements if element.type == element_type]
+
+
+def parse_report_file(file_path: str) -> ReportPage:
+    """
+    Parses a report file into a `ReportPage`.
+
+    Args:
+        file_path (str): Path to the report file.
+
+    Returns:
+        ReportPage: The parsed page.
+
+    Raises:
+        MalformedReportError: If the file cannot be decoded.
+    """
+    content = decode_report_file(file_path)
+    detected_elements = content.get("detected_elements", {})
+    elements = [
+        ReportElement(
+            type=element_type,
+            title=item.get(title_key),
+            content=item.get(content_key),
+            value=item.get(value_key) if value_key else None,
+            columns=item.get(columns_key) if columns_key else None,
+            rows=item.get(rows_key) if rows_key else None,
+        )
+        for (
+            list_key,
+            element_type,
+            title_key,
+            content_key,
+            value_key,
+            columns_key,
+            rows_key,
+        ) in ELEMENT_KEYS
+        for item in detected_elements.get(list_key, [])
+    ]
+    return ReportPage(
+        file_name=os.path.basename(file_path),
+        report_id=content.get("report_id"),
+        date=content.get("date", "Unknown"),
+        page=content.get("page", "Unknown"),
+        elements=elements,
+    )
+
+
+def _parse_safely(file_path: str) -> Tuple[Optional[ReportPage], Optional[str]]:
+    """
+    Parses a report file, returning the error instead of raising it, so that a
+    malformed file does not abort the other files of a process pool.
+
+    Args:
+        file_path (str): Path to the report file.
+
+    Returns:
+        Tuple[Optional[ReportPage], Optional[str]]: The parsed page, or None
+        and the reason why the file is malformed.
+    """
+    try:
+        return parse_report_file(file_path), None
+    except MalformedReportError as e:
+        return None, e.reason
+
+
+class ReportCorpus:
+    """
+    In-memory cache of the parsed report files of a folder.
+
+    Attributes:
+        folder (str): Folder with the report files.
+        workers (int): Number of processes used to parse uncached files.
+        errors (Dict[str, str]): Reason why each malformed file could not be parsed.
+    """
+
+    def __init__(self, folder: str, workers: int = CORPUS_PARSE_WORKERS) -> None:
+        """
+        Initializes an empty corpus.
+
+        Args:
+            folder (str): Folder with the report files.
+            workers (int): Number of processes used to parse uncached files.
+        """
+        self.folder = folder
+        self.workers = max(1, workers)
+        # File name -> ((mtime, size), parsed page)
+        self._pages: Dict[str, Tuple[Tuple[float, int], Optional[ReportPage]]] = {}
+        self.errors: Dict[str, str] = {}
+        self._lock = threading.Lock()
+
+    def _stat(self, file_name: str) -> Tuple[float, int]:
+        """
+        Returns the modification time and size of a file of the folder.
+        """
+        stat = os.stat(os.path.join(self.folder, file_name))
+        return stat.st_mtime, stat.st_size
+
+    def _parse(
+            self, file_names: List[str]
+    ) -> List[Tuple[Optional[ReportPage], Optional[str]]]:
+        """
+        Parses files of the folder, in a process pool if configured.
+
+        Args:
+            file_names (List[str]): Names of the files to parse.
+
+        Returns:
+            List[Tuple[Optional[ReportPage], Optional[str]]]: Parsed page or
+            error of each file, in the order of `file_names`.
+        """
+        paths = [os.path.join(self.folder, file_name) for file_name in file_names]
+        if self.workers > 1 and len(paths) > self.workers:
+            with ProcessPoolExecutor(max_workers=self.workers) as executor:
+                return list(
+                    tqdm(
+                        executor.map(_parse_safely, paths, chunksize=8),
+                        total=len(paths),
+                        desc="Parsing JSON files",
+                    )
+                )
+        return [
+            _parse_safely(path) for path in tqdm(paths, desc="Parsing JSON files")
+        ]
+
+    def load(self, file_names: Iterable[str]) -> Dict[str, ReportPage]:
+        """
+        Returns the parsed pages of the given files, parsing only the files that
+        are not cached or changed since they were parsed.
+
+        Malformed files are left out of the result and listed in `errors`.
+
+        Args:
+            file_names (Iterable[str]): Names of the files in the folder.
+
+        Returns:
+            Dict[str, ReportPage]: Parsed page per file name.
+        """
+        file_names = list(file_names)
+        report_total("parsed", len(file_names))
+        with self._lock:
+            stats = {file_name: self._stat(file_name) for file_name in file_names}
+            to_parse = [
+                file_name
+                for file_name in file_names
+                if self._pages.get(file_name, (None, None))[0] != stats[file_name]
+            ]
+            if to_parse:
+                for file_name, (page, error) in zip(to_parse, self._parse(to_parse)):
+                    if page is None:
+                        logger.error(
+                            f"Skipping malformed report file '{file_name}': {error}"
+                        )
+                        self.errors[file_name] = error
+                    else:
+                        self.errors.pop(file_name, None)
+                    self._pages[file_name] = (stats[file_name], page)
+            report_progress("parsed", len(file_names))
+
+            return {
+                file_name: self._pages[file_name][1]
+                for file_name in file_names
+                if self._pages[file_name][1] is not None
+            }
+
+    def load_all(self) -> Dict[str, ReportPage]:
+        """
+        Returns the parsed pages of every JSON file in the folder.
+
+        Returns:
+            Dict[str, ReportPage]: Parsed page per file name.
+        """
+        file_names = sorted(
+            f for f in os.listdir(self.folder) if f.endswith(".json")
+        )
+        with self._lock:
+            # Drop the files that no longer exist
+            for file_name in set(self._pages) - set(file_names):
+                del self._pages[file_name]
+                self.errors.pop(file_name, None)
+        return self.load(file_names)
+
+
+_corpora: Dict[str, ReportCorpus] = {}
+_corpora_lock = threading.Lock()
+
+
+def get_report_corpus(folder: str) -> ReportCorpus:
+    """
+    Returns the corpus shared by every builder reading the given folder.
+
+    Args:
+        folder (str): Folder with the report files.
+
+    Returns:
+        ReportCorpus: The shared corpus.
+    """
+    key = os.path.abspath(folder)
+    with _corpora_lock:
+        if key not in _corpora:
+            _corpora[key] = ReportCorpus(folder=folder)
+        return _corpora[key]
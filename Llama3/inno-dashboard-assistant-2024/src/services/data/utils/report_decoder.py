@@ -0,0 +1,133 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+# Authors: SDG DS unit
+"""
+Decoder for the report files produced by the extraction LLM.
+
+The files in `etl_data/json_reports` hold a JSON string whose value is the JSON
+report itself (double encoding), sometimes wrapped in a Markdown code fence
+(```json ... ```). The former decoder removed every backslash and "\\n" before
+parsing, which was slow on large files and corrupted values containing
+legitimate escapes (quotes, unicode sequences, backslashes). `decode_report`
+instead decodes the outer JSON string and then parses its value, as many times
+as the document is encoded, so every escape is interpreted exactly once.
+
+`orjson` is used when it is installed, and the standard `json` module otherwise.
+Files that cannot be decoded into a JSON object raise `MalformedReportError`,
+which names the file and the reason.
+
+Functions:
+- `decode_report`: Decodes the text of a report into a dictionary.
+- `decode_report_file`: Reads and decodes a report file.
+"""
+
+import json
+import re
+from typing import Any, Callable, Dict
+
+try:
+    import orjson
+
+    _loads: Callable[[str], Any] = orjson.loads
+    _DECODE_ERRORS = (orjson.JSONDecodeError,)
+except ImportError:
+    _loads = json.loads
+    _DECODE_ERRORS = (json.JSONDecodeError,)
+
+# Markdown code fence around a JSON document, e.g. ```json { ... } ```
+FENCE_PATTERN = re.compile(r"^```(?:json)?\s*(.*?)\s*```$", re.DOTALL | re.IGNORECASE)
+
+# Maximum number of nested JSON string encodings unwrapped
+MAX_ENCODING_DEPTH = 3
+
+
+class MalformedReportError(ValueError):
+    """
+    Raised when a report file cannot be decoded into a JSON object.
+
+    Attributes:
+        source (str): File (or description) of the malformed report.
+        reason (str): Why the report could not be decoded.
+    """
+
+    def __init__(self, source: str, reason: str) -> None:
+        """
+        Initializes the error.
+
+        Args:
+            source (str): File (or description) of the malformed report.
+            reason (str): Why the report could not be decoded.
+        """
+        super().__init__(f"Malformed report '{source}': {reason}")
+        self.source = source
+        self.reason = reason
+
+
+def _strip_fence(text: str) -> str:
+    """
+    Removes a Markdown code fence around a JSON document, if any.
+
+    Args:
+        text (str): The document.
+
+    Returns:
+        str: The document without the fence.
+    """
+    text = text.strip().lstrip("\ufeff")
+    match = FENCE_PATTERN.match(text)
+    return match.group(1) if match else text
+
+
+def decode_report(text: str, source: str = "<string>") -> Dict[str, Any]:
+    """
+    Decodes the text of a report into a dictionary, unwrapping every level of
+    JSON string encoding and Markdown code fences.
+
+    Args:
+        text (str): Content of the report file.
+        source (str): File (or description) of the report, used in errors.
+
+    Returns:
+        Dict[str, Any]: The decoded report.
+
+    Raises:
+        MalformedReportError: If the text does not decode into a JSON object.
+    """
+    value: Any = text
+    for _ in range(MAX_ENCODING_DEPTH + 1):
+        if not isinstance(value, str):
+            break
+        document = _strip_fence(value)
+        if not document:
+            raise MalformedReportError(source, "empty document")
+        try:
+            value = _loads(document)
+        except _DECODE_ERRORS as e:
+            raise MalformedReportError(source, f"invalid JSON ({e})") from e
+
+    if not isinstance(value, dict):
+        raise MalformedReportError(
+            source, f"expected a JSON object, got {type(value).__name__}"
+        )
+    return value
+
+
+def decode_report_file(file_path: str) -> Dict[str, Any]:
+    """
+    Reads and decodes a report file.
+
+    Args:
+        file_path (str): Path to the report file.
+
+    Returns:
+        Dict[str, Any]: The decoded report.
+
+    Raises:
+        MalformedReportError: If the file does not decode into a JSON object.
+    """
+    try:
+        with open(file_path, "r", encoding="utf-8") as file:
+            text = file.read()
+    except UnicodeDecodeError as e:
+        raise MalformedReportError(file_path, f"not UTF-8 text ({e})") from e
+    return decode_report(text, source=file_path)
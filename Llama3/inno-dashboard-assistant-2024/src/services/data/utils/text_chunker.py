@@ -0,0 +1,254 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+# Authors: SDG DS unit
+"""
+Chunking of long texts before embedding.
+
+The text pages and report summaries used to be embedded as a single vector per
+`contenido`, and the Flashrank rerankers then truncated those passages to their
+`max_length` (128 to 512 tokens): part of the reranking cost went to text that
+was cut off, and the content past the limit could not be matched. `TextChunker`
+splits a text into short, overlapping passages:
+
+- "sentence" mode packs whole sentences into each chunk, and repeats the last
+  sentences of a chunk at the start of the next one as overlap; a sentence
+  longer than a chunk is split by tokens;
+- "token" mode slides a fixed window of tokens over the text.
+
+Tokens are approximated by whitespace-separated words (see `src.utils.tokens`),
+which is enough to keep the chunks below the reranker limits without loading a
+tokenizer. Every chunk keeps its character offsets in the original text, so that
+neighbouring chunks can be stitched back together (see `chunk_stitching`), and
+each chunk point stores the ID of its parent document (the point ID used before
+chunking).
+
+Configuration (environment variables):
+    - CHUNK_MODE: "sentence" or "token" (default: sentence).
+    - CHUNK_MAX_TOKENS: Maximum tokens per chunk (default: 160). Set it to 0
+      to disable chunking (one chunk per document).
+    - CHUNK_OVERLAP_TOKENS: Tokens shared by two consecutive chunks (default: 32).
+
+Changing these settings only affects the files ingested afterwards; run a
+blue/green update to re-chunk every document.
+"""
+
+import os
+import re
+from dataclasses import dataclass
+from typing import Any, Dict, List, Tuple
+
+from dotenv import load_dotenv
+
+from src.services.data.utils.point_ids import point_id
+from src.utils.tokens import TOKEN_PATTERN
+
+load_dotenv()
+
+CHUNK_MODE = os.getenv("CHUNK_MODE", "sentence")
+CHUNK_MAX_TOKENS = int(os.getenv("CHUNK_MAX_TOKENS", "160"))
+CHUNK_OVERLAP_TOKENS = int(os.getenv("CHUNK_OVERLAP_TOKENS", "32"))
+
+# Sentence ends: ., ! or ? followed by whitespace, or a blank line
+SENTENCE_END_PATTERN = re.compile(r"(?<=[.!?])\s+|\n\s*\n")
+
+Span = Tuple[int, int]
+
+
+@dataclass
+class Chunk:
+    """
+    Passage of a text.
+
+    Attributes:
+        text (str): The passage, i.e. `source[start:end]`.
+        index (int): Position of the chunk in the text (0 for the first one).
+        start (int): Offset of the first character in the source text.
+        end (int): Offset after the last character in the source text.
+    """
+
+    text: str
+    index: int
+    start: int
+    end: int
+
+
+class TextChunker:
+    """
+    Splits texts into overlapping chunks of bounded token length.
+
+    Attributes:
+        max_tokens (int): Maximum tokens per chunk; 0 disables chunking.
+        overlap_tokens (int): Tokens shared by two consecutive chunks.
+        mode (str): "sentence" or "token".
+    """
+
+    def __init__(
+            self,
+            max_tokens: int = CHUNK_MAX_TOKENS,
+            overlap_tokens: int = CHUNK_OVERLAP_TOKENS,
+            mode: str = CHUNK_MODE,
+    ) -> None:
+        """
+        Initializes the chunker.
+
+        Args:
+            max_tokens (int): Maximum tokens per chunk; 0 disables chunking.
+            overlap_tokens (int): Tokens shared by two consecutive chunks.
+            mode (str): "sentence" or "token".
+
+        Raises:
+            ValueError: If the mode is unknown.
+        """
+        if mode not in ("sentence", "token"):
+            raise ValueError(f"Unknown chunking mode '{mode}'.")
+        self.max_tokens = max(0, max_tokens)
+        # The window must move forward by at least one token
+        self.overlap_tokens = max(0, min(overlap_tokens, self.max_tokens - 1))
+        self.mode = mode
+
+    def split(self, text: str) -> List[Chunk]:
+        """
+        Splits a text into chunks.
+
+        Args:
+            text (str): The text to split.
+
+        Returns:
+            List[Chunk]: The chunks, in text order; a single chunk if the text
+            is short enough or chunking is disabled.
+        """
+        tokens = [match.span() for match in TOKEN_PATTERN.finditer(text)]
+        if not self.max_tokens or len(tokens) <= self.max_tokens:
+            return [Chunk(text=text, index=0, start=0, end=len(text))]
+
+        if self.mode == "token":
+            windows = self._token_windows(tokens)
+        else:
+            windows = self._sentence_windows(text, tokens)
+
+        return [
+            Chunk(text=text[start:end], index=index, start=start, end=end)
+            for index, (start, end) in enumerate(windows)
+        ]
+
+    def _token_windows(self, tokens: List[Span]) -> List[Span]:
+        """
+        Slides a window of `max_tokens` tokens over the text.
+
+        Args:
+            tokens (List[Span]): Character span of each token.
+
+        Returns:
+            List[Span]: Character span of each chunk.
+        """
+        stride = self.max_tokens - self.overlap_tokens
+        windows = []
+        for first in range(0, len(tokens), stride):
+            last = min(first + self.max_tokens, len(tokens)) - 1
+            windows.append((tokens[first][0], tokens[last][1]))
+            if last == len(tokens) - 1:
+                break
+        return windows
+
+    def _sentence_windows(self, text: str, tokens: List[Span]) -> List[Span]:
+        """
+        Packs consecutive sentences into chunks of at most `max_tokens` tokens.
+
+        Args:
+            text (str): The text to split.
+            tokens (List[Span]): Character span of each token.
+
+        Returns:
+            List[Span]: Character span of each chunk.
+        """
+        # Token range [first, last) of each sentence; long sentences are cut in windows
+        sentences: List[Tuple[int, int]] = []
+        first = 0
+        boundaries = [match.start() for match in SENTENCE_END_PATTERN.finditer(text)]
+        for boundary in boundaries + [len(text)]:
+            last = first
+            while last < len(tokens) and tokens[last][0] < boundary:
+                last += 1
+            if last > first:
+                stride = self.max_tokens - self.overlap_tokens
+                for start in range(first, last, stride):
+                    sentences.append((start, min(start + self.max_tokens, last)))
+                    if start + self.max_tokens >= last:
+                        break
+            first = last
+
+        windows = []
+        current: List[Tuple[int, int]] = []
+        for sentence in sentences:
+            size = sentence[1] - (current[0][0] if current else sentence[0])
+            if current and size > self.max_tokens:
+                windows.append((tokens[current[0][0]][0], tokens[current[-1][1] - 1][1]))
+                # Carry the last sentences over, within the overlap budget
+                overlap: List[Tuple[int, int]] = []
+                for previous in reversed(current):
+                    if sentence[1] - previous[0] > self.max_tokens:
+                        break
+                    if current[-1][1] - previous[0] > self.overlap_tokens:
+                        break
+                    overlap.insert(0, previous)
+                current = overlap
+            current.append(sentence)
+        if current:
+            windows.append((tokens[current[0][0]][0], tokens[current[-1][1] - 1][1]))
+        return windows
+
+
+def chunk_document(
+        chunker: TextChunker,
+        collection_name: str,
+        parent_id: str,
+        content: Any,
+        metadata: Dict[str, Any],
+) -> List[Tuple[str, Chunk, Dict[str, Any]]]:
+    """
+    Splits a document into chunks and derives the point of each chunk.
+
+    Args:
+        chunker (TextChunker): The chunker.
+        collection_name (str): Name of the collection the point IDs belong to.
+        parent_id (str): Point ID of the whole document.
+        content (Any): Text of the document.
+        metadata (Dict[str, Any]): Metadata of the document.
+
+    Returns:
+        List[Tuple[str, Chunk, Dict[str, Any]]]: Point ID, chunk and payload
+        metadata of each chunk. The metadata of the document is extended with
+        "parent_id", "chunk_index", "chunk_count", "chunk_start" and "chunk_end".
+    """
+    text = content if isinstance(content, str) else str(content)
+    chunks = chunker.split(text)
+    return [
+        (
+            chunk_point_id(collection_name, parent_id, chunk.index),
+            chunk,
+            {
+                **metadata,
+                "parent_id": parent_id,
+                "chunk_index": chunk.index,
+                "chunk_count": len(chunks),
+                "chunk_start": chunk.start,
+                "chunk_end": chunk.end,
+            },
+        )
+        for chunk in chunks
+    ]
+
+
+def chunk_point_id(collection_name: str, parent_id: str, index: int) -> str:
+    """
+    Returns the deterministic point ID of a chunk.
+
+    Args:
+        collection_name (str): Name of the collection.
+        parent_id (str): Point ID of the whole document.
+        index (int): Position of the chunk in the document.
+
+    Returns:
+        str: The point ID of the chunk.
+    """
+    return point_id(collection_name, parent_id, "chunk", index)
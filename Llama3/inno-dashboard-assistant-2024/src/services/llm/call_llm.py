@@ -12,14 +12,11 @@ Function:
 
 Dependencies:
     - Groq API: The Groq API client used to interact with the models.
+    - clients: Shared chat models over keep-alive HTTP connections.
 """
 
-from langchain_groq import ChatGroq
-from dotenv import load_dotenv
-import os
+from src.services.llm.clients import get_chat_model
 
-load_dotenv()
-api_key = os.getenv("GROQ_API_KEY")
 
 def call_llm(
         prompt: str,
@@ -35,7 +32,8 @@ def call_llm(
         prompt (str): The prompt to send to the LLM model.
         model (str): The llama3 model to use (default is "llama-3.3-70b-specdec").
         temperature (float): The temperature parameter for generation (default is 0.4).
-        max_tokens (int): The maximum number of tokens to generate (default is 15000).
+        max_tokens (int): The maximum number of tokens to generate (default is 15000),
+            capped at the model's completion limit.
 
     Returns:
         str: The content generated by the model.
@@ -44,11 +42,11 @@ def call_llm(
         ("system", "You are a helpful assistant."),
         ("human", prompt)
     ]
-    # Inicializa el cliente ChatGroq con el modelo y la clave de API
-    chat_groq = ChatGroq(
-        model_name="llama-3.3-70b-specdec",
-        groq_api_key=api_key,
-        temperature=temperature
+    # Reuse the shared client of this configuration and its open connections
+    chat_groq = get_chat_model(
+        model=model,
+        temperature=temperature,
+        max_tokens=max_tokens,
     )
 
     # Usa invoke para hacer la solicitud al modelo
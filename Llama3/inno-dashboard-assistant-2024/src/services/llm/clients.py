@@ -0,0 +1,184 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+# Authors: SDG DS unit
+"""
+Shared pool of LLM chat clients.
+
+`call_llm`, the `Agent` and the self-query retrievers used to create a new
+`ChatGroq` for each call or retrieval. Each new client opens its own HTTP
+connection pool, so every LLM hop paid DNS resolution, TCP and TLS setup
+again. `LLMClientPool` keeps one keep-alive `httpx` client per provider (sync
+and async), and one chat model per (model, temperature, max_tokens, streaming)
+configuration built on top of it. The chat models hold no per-call state, so
+the same instance is shared by every request and thread.
+
+Configuration (environment variables):
+    - LLM_MODEL: Default chat model (default: llama-3.3-70b-specdec).
+    - LLM_MAX_OUTPUT_TOKENS: Upper bound applied to `max_tokens` (default: 8192),
+      the completion limit of the Groq models.
+    - LLM_TIMEOUT: Request timeout in seconds (default: 120).
+    - LLM_MAX_CONNECTIONS: Connections per provider (default: 20).
+    - LLM_KEEPALIVE_EXPIRY: Seconds an idle connection is kept open (default: 60).
+"""
+
+import logging
+import os
+import threading
+from typing import Dict, Optional, Tuple
+
+import httpx
+from dotenv import load_dotenv
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_groq import ChatGroq
+
+from src.utils.logging_config import setup_logging
+
+load_dotenv()
+
+# Set up logging
+setup_logging()
+logger = logging.getLogger(name=__name__)
+
+DEFAULT_LLM_MODEL = os.getenv("LLM_MODEL", "llama-3.3-70b-specdec")
+LLM_MAX_OUTPUT_TOKENS = int(os.getenv("LLM_MAX_OUTPUT_TOKENS", "8192"))
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "120"))
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "20"))
+LLM_KEEPALIVE_EXPIRY = float(os.getenv("LLM_KEEPALIVE_EXPIRY", "60"))
+
+ModelKey = Tuple[str, float, Optional[int], bool]
+
+
+class LLMClientPool:
+    """
+    Shares HTTP connection pools and chat models between every LLM caller.
+
+    Attributes:
+        api_key (Optional[str]): Groq API key.
+        timeout (float): Request timeout in seconds.
+        max_connections (int): Connections per provider.
+        keepalive_expiry (float): Seconds an idle connection is kept open.
+    """
+
+    def __init__(
+            self,
+            api_key: Optional[str] = None,
+            timeout: float = LLM_TIMEOUT,
+            max_connections: int = LLM_MAX_CONNECTIONS,
+            keepalive_expiry: float = LLM_KEEPALIVE_EXPIRY,
+    ) -> None:
+        """
+        Initializes an empty pool.
+
+        Args:
+            api_key (Optional[str]): Groq API key. Defaults to `GROQ_API_KEY`.
+            timeout (float): Request timeout in seconds.
+            max_connections (int): Connections per provider.
+            keepalive_expiry (float): Seconds an idle connection is kept open.
+        """
+        self.api_key = api_key or os.getenv("GROQ_API_KEY")
+        self.timeout = timeout
+        self.max_connections = max_connections
+        self.keepalive_expiry = keepalive_expiry
+        self._http_clients: Dict[str, Tuple[httpx.Client, httpx.AsyncClient]] = {}
+        self._models: Dict[ModelKey, BaseChatModel] = {}
+        self._lock = threading.Lock()
+
+    def http_clients(self, provider: str) -> Tuple[httpx.Client, httpx.AsyncClient]:
+        """
+        Returns the keep-alive HTTP clients of a provider.
+
+        Args:
+            provider (str): Name of the provider (e.g. "groq").
+
+        Returns:
+            Tuple[httpx.Client, httpx.AsyncClient]: The sync and async clients,
+            created on first use.
+        """
+        with self._lock:
+            clients = self._http_clients.get(provider)
+            if clients is None:
+                limits = httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_connections,
+                    keepalive_expiry=self.keepalive_expiry,
+                )
+                clients = (
+                    httpx.Client(limits=limits, timeout=self.timeout),
+                    httpx.AsyncClient(limits=limits, timeout=self.timeout),
+                )
+                self._http_clients[provider] = clients
+                logger.info(f"HTTP connection pool created for '{provider}'.")
+            return clients
+
+    def get(
+            self,
+            model: Optional[str] = None,
+            temperature: float = 0,
+            max_tokens: Optional[int] = None,
+            streaming: bool = False,
+    ) -> BaseChatModel:
+        """
+        Returns the shared chat model of a configuration.
+
+        Args:
+            model (Optional[str]): Model name. Defaults to `DEFAULT_LLM_MODEL`.
+            temperature (float): Sampling temperature.
+            max_tokens (Optional[int]): Maximum tokens to generate, capped at
+                `LLM_MAX_OUTPUT_TOKENS`; None for the provider default.
+            streaming (bool): Whether the model streams its tokens.
+
+        Returns:
+            BaseChatModel: The chat model, created on first use.
+        """
+        model = model or DEFAULT_LLM_MODEL
+        if max_tokens is not None:
+            max_tokens = min(max_tokens, LLM_MAX_OUTPUT_TOKENS)
+        key = (model, float(temperature), max_tokens, streaming)
+
+        chat_model = self._models.get(key)
+        if chat_model is None:
+            http_client, http_async_client = self.http_clients("groq")
+            with self._lock:
+                chat_model = self._models.get(key)
+                if chat_model is None:
+                    chat_model = ChatGroq(
+                        model_name=model,
+                        groq_api_key=self.api_key,
+                        temperature=temperature,
+                        max_tokens=max_tokens,
+                        streaming=streaming,
+                        http_client=http_client,
+                        http_async_client=http_async_client,
+                    )
+                    self._models[key] = chat_model
+        return chat_model
+
+
+# Shared pool used by every LLM caller
+llm_client_pool = LLMClientPool()
+
+
+def get_chat_model(
+        model: Optional[str] = None,
+        temperature: float = 0,
+        max_tokens: Optional[int] = None,
+        streaming: bool = False,
+) -> BaseChatModel:
+    """
+    Returns the shared chat model of a configuration.
+
+    Args:
+        model (Optional[str]): Model name. Defaults to `DEFAULT_LLM_MODEL`.
+        temperature (float): Sampling temperature.
+        max_tokens (Optional[int]): Maximum tokens to generate.
+        streaming (bool): Whether the model streams its tokens.
+
+    Returns:
+        BaseChatModel: The chat model.
+    """
+    return llm_client_pool.get(
+        model=model,
+        temperature=temperature,
+        max_tokens=max_tokens,
+        streaming=streaming,
+    )
@@ -0,0 +1,283 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+# Authors: SDG DS unit
+"""
+Query embedding cache.
+
+The assistant receives the same questions again and again (e.g. the suggestion
+cards of the chat page), and each of them runs the bge-m3 encoder on the CPU.
+`CachedEmbeddings` wraps an embedding model and keeps the query vectors in a
+bounded in-memory LRU, backed by an optional SQLite store so the cache survives
+restarts. Entries are keyed by the model name and the normalized query text.
+The SQLite file may be shared by several worker processes; if it cannot be
+read or written (e.g. it stays locked), the cache logs a warning and keeps
+serving from memory instead of failing the query.
+
+Configuration (environment variables):
+    - QUERY_EMBEDDING_CACHE_SIZE: Maximum entries kept in memory (default: 2048).
+    - QUERY_EMBEDDING_CACHE_PATH: SQLite file of the persistent store
+      (default: src/services/llm/embedding_cache/query_embeddings.sqlite).
+      Set it to an empty string to disable persistence.
+"""
+
+import logging
+import os
+import sqlite3
+import threading
+import unicodedata
+from array import array
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+from dotenv import load_dotenv
+from langchain_core.embeddings import Embeddings
+
+from src.utils.logging_config import setup_logging
+
+load_dotenv()
+
+# Set up logging
+setup_logging()
+logger = logging.getLogger(name=__name__)
+
+DEFAULT_CACHE_PATH = "src/services/llm/embedding_cache/query_embeddings.sqlite"
+
+
+def normalize_text(text: str) -> str:
+    """
+    Normalizes a text so that trivially different queries share a cache entry.
+
+    Args:
+        text (str): The text to normalize.
+
+    Returns:
+        str: NFC-normalized text with collapsed whitespace.
+    """
+    return " ".join(unicodedata.normalize("NFC", text).split())
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Embeddings wrapper that caches query vectors.
+
+    Attributes:
+        embeddings (Embeddings): The wrapped embedding model.
+        model_name (str): Name of the wrapped model, part of the cache key.
+        max_size (int): Maximum number of entries kept in memory.
+        hits (int): Lookups served from the cache.
+        misses (int): Lookups that required the model.
+    """
+
+    def __init__(
+            self,
+            embeddings: Embeddings,
+            model_name: str,
+            max_size: int = 2048,
+            cache_path: Optional[str] = None,
+    ) -> None:
+        """
+        Initializes the cache.
+
+        Args:
+            embeddings (Embeddings): The embedding model to wrap.
+            model_name (str): Name of the wrapped model.
+            max_size (int): Maximum number of entries kept in memory.
+            cache_path (Optional[str]): SQLite file of the persistent store;
+                None disables persistence.
+        """
+        self.embeddings = embeddings
+        self.model_name = model_name
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._memory: "OrderedDict[str, List[float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+
+        if cache_path:
+            os.makedirs(os.path.dirname(cache_path) or ".", exist_ok=True)
+            try:
+                # The other worker processes write to the same file
+                self._db = sqlite3.connect(
+                    cache_path, check_same_thread=False, timeout=30
+                )
+                self._db.execute("PRAGMA journal_mode=WAL")
+                self._db.execute(
+                    "CREATE TABLE IF NOT EXISTS query_embeddings ("
+                    "model TEXT NOT NULL, text TEXT NOT NULL, vector BLOB NOT NULL, "
+                    "PRIMARY KEY (model, text))"
+                )
+                self._db.commit()
+                logger.info(f"Query embedding cache persisted in '{cache_path}'.")
+            except sqlite3.Error as e:
+                logger.warning(
+                    f"Could not open the query embedding cache '{cache_path}'; "
+                    f"caching in memory only: {e}"
+                )
+                self._db = None
+
+    def _lookup(self, text: str) -> Optional[List[float]]:
+        """
+        Looks a normalized text up in memory and then in the persistent store.
+
+        Args:
+            text (str): Normalized query text.
+
+        Returns:
+            Optional[List[float]]: The cached vector, or None on a miss.
+        """
+        with self._lock:
+            vector = self._memory.get(text)
+            if vector is not None:
+                self._memory.move_to_end(text)
+                return vector
+
+            if self._db is None:
+                return None
+            try:
+                row = self._db.execute(
+                    "SELECT vector FROM query_embeddings WHERE model = ? AND text = ?",
+                    (self.model_name, text),
+                ).fetchone()
+            except sqlite3.Error as e:
+                logger.warning(f"Could not read the query embedding cache: {e}")
+                return None
+        if row is None:
+            return None
+
+        vector = array("f", row[0]).tolist()
+        self._remember(text, vector)
+        return vector
+
+    def _remember(self, text: str, vector: List[float]) -> None:
+        """
+        Stores a vector in the in-memory LRU, evicting the oldest entries.
+
+        Args:
+            text (str): Normalized query text.
+            vector (List[float]): Its embedding.
+        """
+        with self._lock:
+            self._memory[text] = vector
+            self._memory.move_to_end(text)
+            while len(self._memory) > self.max_size:
+                self._memory.popitem(last=False)
+
+    def _persist(self, text: str, vector: List[float]) -> None:
+        """
+        Writes a vector to the persistent store, if enabled.
+
+        Args:
+            text (str): Normalized query text.
+            vector (List[float]): Its embedding.
+        """
+        if self._db is None:
+            return
+        with self._lock:
+            try:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO query_embeddings (model, text, vector) "
+                    "VALUES (?, ?, ?)",
+                    (self.model_name, text, array("f", vector).tobytes()),
+                )
+                self._db.commit()
+            except sqlite3.Error as e:
+                # The vector stays cached in memory
+                logger.warning(f"Could not write the query embedding cache: {e}")
+                self._db.rollback()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        """
+        Embeds documents with the wrapped model (not cached).
+
+        Args:
+            texts (List[str]): Texts to embed.
+
+        Returns:
+            List[List[float]]: One embedding per text.
+        """
+        return self.embeddings.embed_documents(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        """
+        Embeds a query, serving repeated texts from the cache.
+
+        Args:
+            text (str): Query text.
+
+        Returns:
+            List[float]: The query embedding.
+        """
+        key = normalize_text(text)
+        vector = self._lookup(key)
+        with self._lock:
+            if vector is not None:
+                self.hits += 1
+            else:
+                self.misses += 1
+        if vector is not None:
+            return vector
+
+        vector = self.embeddings.embed_query(key)
+        self._remember(key, vector)
+        self._persist(key, vector)
+        logger.debug(f"Query embedding cache miss ({self.stats()}).")
+        return vector
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Returns the cache counters.
+
+        Returns:
+            Dict[str, int]: Hits, misses and number of entries in memory.
+        """
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "size": len(self._memory),
+                "max_size": self.max_size,
+            }
+
+
+_caches: Dict[str, CachedEmbeddings] = {}
+_caches_lock = threading.Lock()
+
+
+def get_query_embedding_cache(
+        embeddings: Embeddings, model_name: str
+) -> CachedEmbeddings:
+    """
+    Returns the process-wide query cache of a model, creating it on first use.
+
+    Every caller asking for the same model name shares the same cache.
+
+    Args:
+        embeddings (Embeddings): The embedding model to wrap.
+        model_name (str): Name of the model.
+
+    Returns:
+        CachedEmbeddings: The shared cache.
+    """
+    with _caches_lock:
+        cache = _caches.get(model_name)
+        if cache is None:
+            cache = CachedEmbeddings(
+                embeddings=embeddings,
+                model_name=model_name,
+                max_size=int(os.getenv("QUERY_EMBEDDING_CACHE_SIZE", "2048")),
+                cache_path=os.getenv("QUERY_EMBEDDING_CACHE_PATH", DEFAULT_CACHE_PATH),
+            )
+            _caches[model_name] = cache
+        return cache
+
+
+def get_cache_stats() -> Dict[str, Dict[str, int]]:
+    """
+    Returns the counters of every query embedding cache.
+
+    Returns:
+        Dict[str, Dict[str, int]]: Counters keyed by model name.
+    """
+    with _caches_lock:
+        return {name: cache.stats() for name, cache in _caches.items()}
@@ -0,0 +1,123 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+# Authors: SDG DS unit
+"""
+Shared embedding model provider.
+
+Every module that embeds text (the DatabaseCreator classes at ingestion time and
+the retrievers at query time) gets its model from this module, so the process
+loads a single copy of it. The model is created lazily on first use, which keeps
+importing the modules cheap and moves the load out of the backend start-up path.
+
+Configuration (environment variables):
+    - EMBEDDING_BACKEND: "huggingface" (default, local sentence-transformers
+      model) or "openai" (OpenAI embeddings API).
+    - EMBEDDING_MODEL: Name of the model (default: "BAAI/bge-m3"). With the
+      "openai" backend, an OpenAI embedding model name must be given.
+    - EMBEDDING_DEVICE: Device of the local model (default: "cpu").
+
+Functions:
+- `get_embedding_model`: Returns the shared embedding model, loading it on first use.
+"""
+
+import logging
+import os
+import threading
+from typing import List, Optional
+
+from dotenv import load_dotenv
+from langchain_core.embeddings import Embeddings
+
+from src.utils.logging_config import setup_logging
+
+load_dotenv()
+
+# Set up logging
+setup_logging()
+logger = logging.getLogger(name=__name__)
+
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "huggingface")
+EMBEDDING_MODEL_NAME = os.getenv("EMBEDDING_MODEL", "BAAI/bge-m3")
+EMBEDDING_DEVICE = os.getenv("EMBEDDING_DEVICE", "cpu")
+EMBEDDING_SIZE = 1024
+
+_embedding_model: Optional[Embeddings] = None
+_lock = threading.Lock()
+
+
+def _load_embedding_model() -> Embeddings:
+    """
+    Creates the embedding model of the configured backend.
+
+    Returns:
+        Embeddings: The embedding model.
+
+    Raises:
+        ValueError: If the configured backend is not supported.
+    """
+    logger.info(
+        f"Loading embedding model '{EMBEDDING_MODEL_NAME}' ({EMBEDDING_BACKEND})..."
+    )
+    if EMBEDDING_BACKEND == "huggingface":
+        from langchain_huggingface import HuggingFaceEmbeddings
+
+        return HuggingFaceEmbeddings(
+            model_name=EMBEDDING_MODEL_NAME,
+            model_kwargs={"device": EMBEDDING_DEVICE},
+        )
+    if EMBEDDING_BACKEND == "openai":
+        from langchain_openai import OpenAIEmbeddings
+
+        return OpenAIEmbeddings(model=EMBEDDING_MODEL_NAME, dimensions=EMBEDDING_SIZE)
+    raise ValueError(f"Unsupported embedding backend: '{EMBEDDING_BACKEND}'.")
+
+
+def get_embedding_model() -> Embeddings:
+    """
+    Returns the shared embedding model, loading it on first use.
+
+    Returns:
+        Embeddings: The embedding model shared by the whole process.
+    """
+    global _embedding_model
+    if _embedding_model is None:
+        with _lock:
+            if _embedding_model is None:
+                _embedding_model = _load_embedding_model()
+    return _embedding_model
+
+
+class SharedEmbeddings(Embeddings):
+    """
+    Lightweight handle on the shared embedding model.
+
+    It can be created at import time; the model itself is only loaded the first
+    time a text is embedded.
+    """
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        """
+        Embeds documents with the shared model.
+
+        Args:
+            texts (List[str]): Texts to embed.
+
+        Returns:
+            List[List[float]]: One embedding per text.
+        """
+        return get_embedding_model().embed_documents(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        """
+        Embeds a query with the shared model.
+
+        Args:
+            text (str): Query text.
+
+        Returns:
+            List[float]: The query embedding.
+        """
+        return get_embedding_model().embed_query(text)
+
+
+shared_embeddings = SharedEmbeddings()
@@ -7,8 +7,9 @@ This script defines prompts for an AI agent and a Retrieval-Augmented Generation
 get_character_prompt: Defines the AI agent's behavior, guiding interactions and tool invocation.
 get_context_prompt: Selects relevant database collections for responding to Power BI report queries.
 report_prompts: Prompts for getting a markdown format report, sumarized and extensive format.
+get_memory_summary_prompt: Compacts older conversation turns into the running summary of a session.
 """
-from typing import List
+from typing import List, Tuple
 
 
 def get_character_prompt() -> str:
@@ -378,3 +379,43 @@ def create_final_prompt(
 
     # Convert the list into a single string with line breaks between elements
     return "\n".join(prompt)
+
+
+def get_memory_summary_prompt(
+        summary: str, exchanges: List[Tuple[str, str]], max_words: int
+) -> str:
+    """
+    Builds the prompt that folds older conversation turns into the running summary.
+
+    The summary replaces those turns in the chat history of the agent, so it must keep
+    what later questions may refer to: the reports, pages, KPIs and values discussed,
+    the user's goals and the answers already given.
+
+    Args:
+        summary (str): Current summary of the conversation (empty for the first one).
+        exchanges (List[Tuple[str, str]]): (user input, assistant answer) of the turns to
+            add to the summary, oldest first.
+        max_words (int): Maximum length of the new summary, in words.
+
+    Returns:
+        str: The prompt, whose answer is the new summary.
+    """
+    prompt = [
+        "You maintain the running summary of a conversation between a user and an "
+        "assistant that answers questions about Power BI reports.",
+        "Update the summary with the new conversation turns below. Keep the facts later "
+        "questions may refer to: report names, pages, KPIs, figures, dates, the user's "
+        "goals and the conclusions already given. Drop greetings and repetitions.",
+        f"Write at most {max_words} words, in the language of the conversation, as plain "
+        "text. Answer only with the updated summary.",
+        "",
+        "Current summary:",
+        summary or "(empty)",
+        "",
+        "New conversation turns:",
+    ]
+    for user_input, output in exchanges:
+        prompt.append(f"Human: {user_input}")
+        prompt.append(f"AI: {output}")
+
+    return "\n".join(prompt)
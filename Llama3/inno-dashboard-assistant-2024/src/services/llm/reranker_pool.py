@@ -0,0 +1,197 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+# Authors: SDG DS unit
+"""
+Shared pool of Flashrank rerankers.
+
+Creating a `flashrank.Ranker` reads the ONNX model and its tokenizer from disk.
+This module loads each (model, max_length) pair once and shares the instance
+between every retriever and request. The underlying ONNX Runtime session is
+safe to run from several threads, and its intra-op thread count is capped so
+that concurrent `/query` requests do not oversubscribe the CPU cores.
+
+The thread count can be configured with the `RERANKER_NUM_THREADS` environment
+variable (default: a quarter of the available cores, at least one).
+"""
+
+import logging
+import os
+import threading
+from pathlib import Path
+from typing import Dict, Iterable, Optional, Tuple
+
+import onnxruntime as ort
+from dotenv import load_dotenv
+from flashrank import Ranker
+from flashrank.Config import listwise_rankers, model_file_map
+
+from src.utils.logging_config import setup_logging
+
+load_dotenv()
+
+# Set up logging
+setup_logging()
+logger = logging.getLogger(name=__name__)
+
+RERANK_CACHE_DIR = "src/services/llm/rerank_llms"
+
+# (model, max_length) pairs used by the agent tools and the report generator
+DEFAULT_RERANKERS = (
+    ("ms-marco-MiniLM-L-12-v2", 512),
+    ("ms-marco-MiniLM-L-12-v2", 256),
+    ("ms-marco-TinyBERT-L-2-v2", 256),
+    ("ms-marco-TinyBERT-L-2-v2", 128),
+)
+
+
+def default_num_threads() -> int:
+    """
+    Returns the intra-op thread count used by each ONNX session.
+
+    Returns:
+        int: Value of `RERANKER_NUM_THREADS`, or a quarter of the CPU cores.
+    """
+    configured = os.getenv("RERANKER_NUM_THREADS")
+    if configured:
+        return max(1, int(configured))
+    return max(1, (os.cpu_count() or 1) // 4)
+
+
+class TunedRanker(Ranker):
+    """
+    Flashrank reranker whose ONNX session is built with the given session options.
+
+    `Ranker.__init__` always creates a session with the default options, i.e.
+    one intra-op thread per core. This class builds the model directory,
+    session and tokenizer itself, so each model is loaded once and with the
+    capped thread count.
+
+    It relies on flashrank internals (the `_prepare_model_dir` and
+    `_get_tokenizer` helpers, the `model_file_map` and `listwise_rankers`
+    tables, and the attributes read by `Ranker.rerank`), as of
+    flashrank==0.2.9, which is pinned in requirements.txt. Check this class
+    when upgrading flashrank.
+    """
+
+    def __init__(
+            self,
+            model_name: str,
+            cache_dir: str,
+            max_length: int,
+            session_options: ort.SessionOptions,
+    ) -> None:
+        """
+        Downloads the model if needed and loads it.
+
+        Args:
+            model_name (str): Flashrank model name (a cross-encoder).
+            cache_dir (str): Folder where the reranker models are stored.
+            max_length (int): Maximum sequence length of the tokenizer.
+            session_options (ort.SessionOptions): Options of the ONNX session.
+
+        Raises:
+            ValueError: If the model is an LLM-based listwise reranker.
+        """
+        if model_name in listwise_rankers:
+            raise ValueError(f"Listwise reranker '{model_name}' is not supported.")
+        # Mirrors Ranker.__init__ for the cross-encoder models
+        self.logger = logging.getLogger(Ranker.__module__)
+        self.cache_dir = Path(cache_dir)
+        self.model_dir = self.cache_dir / model_name
+        self._prepare_model_dir(model_name)
+        self.llm_model = None
+        self.session = ort.InferenceSession(
+            str(self.model_dir / model_file_map[model_name]),
+            sess_options=session_options,
+            providers=["CPUExecutionProvider"],
+        )
+        self.tokenizer = self._get_tokenizer(max_length)
+
+
+class RerankerPool:
+    """
+    Loads Flashrank rerankers once and hands out the shared instances.
+
+    Attributes:
+        cache_dir (str): Folder where the reranker models are stored.
+        num_threads (int): Intra-op thread count of each ONNX session.
+    """
+
+    def __init__(
+            self, cache_dir: str = RERANK_CACHE_DIR, num_threads: Optional[int] = None
+    ) -> None:
+        """
+        Initializes an empty pool.
+
+        Args:
+            cache_dir (str): Folder where the reranker models are stored.
+            num_threads (Optional[int]): Intra-op thread count of each ONNX
+                session. Defaults to `default_num_threads()`.
+        """
+        self.cache_dir = cache_dir
+        self.num_threads = num_threads or default_num_threads()
+        self._rankers: Dict[Tuple[str, int], Ranker] = {}
+        self._lock = threading.Lock()
+
+    def _load(self, model: str, max_length: int) -> Ranker:
+        """
+        Loads a reranker and restricts the threads of its ONNX session.
+
+        Args:
+            model (str): Flashrank model name.
+            max_length (int): Maximum sequence length of the tokenizer.
+
+        Returns:
+            Ranker: The loaded reranker.
+        """
+        logger.info(f"Loading reranker '{model}' (max_length={max_length})...")
+        session_options = ort.SessionOptions()
+        session_options.intra_op_num_threads = self.num_threads
+        session_options.inter_op_num_threads = 1
+        return TunedRanker(
+            model_name=model,
+            cache_dir=self.cache_dir,
+            max_length=max_length,
+            session_options=session_options,
+        )
+
+    def get(self, model: str, max_length: int = 512) -> Ranker:
+        """
+        Returns the shared reranker for the given model and maximum length.
+
+        Args:
+            model (str): Flashrank model name.
+            max_length (int): Maximum sequence length of the tokenizer.
+
+        Returns:
+            Ranker: The shared reranker, loaded on first use.
+        """
+        key = (model, max_length)
+        ranker = self._rankers.get(key)
+        if ranker is None:
+            with self._lock:
+                ranker = self._rankers.get(key)
+                if ranker is None:
+                    ranker = self._load(model=model, max_length=max_length)
+                    self._rankers[key] = ranker
+        return ranker
+
+    def warm_up(
+            self, rerankers: Iterable[Tuple[str, int]] = DEFAULT_RERANKERS
+    ) -> None:
+        """
+        Loads the given rerankers ahead of the first request.
+
+        Args:
+            rerankers (Iterable[Tuple[str, int]]): (model, max_length) pairs to load.
+        """
+        for model, max_length in rerankers:
+            self.get(model=model, max_length=max_length)
+        logger.info(
+            f"Reranker pool ready ({len(self._rankers)} models, "
+            f"{self.num_threads} threads per session)."
+        )
+
+
+# Shared pool used by every retriever
+reranker_pool = RerankerPool()
@@ -17,7 +17,8 @@ from qdrant_client import QdrantClient
 
 from src.services.llm.call_llm import call_llm
 from src.services.llm.prompts import create_final_prompt
-from src.services.retrievers.selfq_retrievers import setup_retrievers
+from src.services.retrievers.request_context import retrieval_scope
+from src.services.retrievers.retriever_registry import retriever_registry
 
 
 def inform_generator(
@@ -59,15 +60,16 @@ def inform_generator(
         n_values = {"Report Summaries": 1}
         collections = [{"name": "Report Summaries", "n": 1}]
 
-    ensemble_retriever = setup_retrievers(
+    ensemble_retriever = retriever_registry.get(
         qdrant_client=qdrant_client, 
         collections=collections, 
         n_values=n_values, 
         model="ms-marco-TinyBERT-L-2-v2"
     )
 
-    # Invoke the retriever to get the documents
-    documents = ensemble_retriever.invoke(input=doc_query)
+    # Invoke the retriever to get the documents, restricted to the report
+    with retrieval_scope(report_id=report_id):
+        documents = ensemble_retriever.invoke(input=doc_query)
 
     # Create the final prompt (directly returns a string)
     final_prompt = create_final_prompt(
@@ -0,0 +1,205 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+# Authors: SDG DS unit
+"""
+Stitching of retrieved chunks back into passages.
+
+The text pages and report summaries are stored as short, overlapping chunks
+(see `text_chunker`), so that searching and reranking work on passages that
+fit the reranker. After reranking, `StitchingRetriever` merges the chunks of
+a same document that follow each other (consecutive indices or overlapping
+offsets) into one passage, removing the overlapping text, so the agent does
+not read the same sentences twice.
+
+Optionally, the neighbouring chunks of every retrieved chunk are fetched from
+Qdrant by their deterministic IDs (no vector search) and stitched too, to give
+the agent the surrounding context. Their number is set with the
+`STITCH_NEIGHBOURS` environment variable (default: 0, i.e. only the retrieved
+chunks are stitched).
+
+Documents without chunk metadata (e.g. ingested before chunking) are returned
+unchanged.
+"""
+
+import logging
+import os
+from typing import Any, Dict, List, Optional
+
+from dotenv import load_dotenv
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+
+from src.services.data.utils.text_chunker import chunk_point_id
+from src.utils.logging_config import setup_logging
+
+load_dotenv()
+
+# Set up logging
+setup_logging()
+logger = logging.getLogger(name=__name__)
+
+STITCH_NEIGHBOURS = int(os.getenv("STITCH_NEIGHBOURS", "0"))
+
+
+def _merge(documents: List[Document]) -> Document:
+    """
+    Merges consecutive chunks of a document into one passage.
+
+    Args:
+        documents (List[Document]): Consecutive chunks, in text order.
+
+    Returns:
+        Document: The stitched passage.
+    """
+    first = documents[0]
+    text = first.page_content
+    end = first.metadata["chunk_end"]
+    for document in documents[1:]:
+        start = document.metadata["chunk_start"]
+        if start < end:
+            # Skip the text shared with the previous chunk
+            text += document.page_content[end - start:]
+        else:
+            text += " " + document.page_content
+        end = max(end, document.metadata["chunk_end"])
+
+    metadata = dict(first.metadata)
+    metadata["chunk_end"] = end
+    metadata["stitched_chunks"] = [d.metadata["chunk_index"] for d in documents]
+    scores = [
+        d.metadata["relevance_score"]
+        for d in documents
+        if d.metadata.get("relevance_score") is not None
+    ]
+    if scores:
+        metadata["relevance_score"] = max(scores)
+    return Document(page_content=text, metadata=metadata)
+
+
+def stitch_chunks(documents: List[Document]) -> List[Document]:
+    """
+    Merges the adjacent chunks of each document among the retrieved ones.
+
+    The passages are returned in the order of their best-ranked chunk.
+
+    Args:
+        documents (List[Document]): Retrieved documents, best first.
+
+    Returns:
+        List[Document]: The documents, with adjacent chunks stitched.
+    """
+    groups: Dict[str, Dict[int, Document]] = {}
+    order: List[Any] = []
+    for document in documents:
+        parent_id = document.metadata.get("parent_id")
+        if parent_id is None or "chunk_index" not in document.metadata:
+            order.append(document)
+            continue
+        if parent_id not in groups:
+            groups[parent_id] = {}
+            order.append(parent_id)
+        groups[parent_id].setdefault(document.metadata["chunk_index"], document)
+
+    stitched = []
+    for item in order:
+        if isinstance(item, Document):
+            stitched.append(item)
+            continue
+        chunks = [groups[item][index] for index in sorted(groups[item])]
+        run = [chunks[0]]
+        for chunk in chunks[1:]:
+            previous = run[-1].metadata
+            if (
+                chunk.metadata["chunk_index"] == previous["chunk_index"] + 1
+                or chunk.metadata["chunk_start"] <= previous["chunk_end"]
+            ):
+                run.append(chunk)
+            else:
+                stitched.append(_merge(run))
+                run = [chunk]
+        stitched.append(_merge(run))
+    return stitched
+
+
+class StitchingRetriever(BaseRetriever):
+    """
+    Retriever that stitches the chunks returned by another retriever.
+
+    Attributes:
+        retriever (BaseRetriever): Retriever of the chunks (e.g. with reranking).
+        qdrant_client (Any): Qdrant client used to fetch neighbouring chunks.
+        collection_name (Optional[str]): Collection (or alias) of the chunks.
+        neighbours (int): Neighbouring chunks fetched on each side of a chunk.
+    """
+
+    retriever: BaseRetriever
+    qdrant_client: Any = None
+    collection_name: Optional[str] = None
+    neighbours: int = STITCH_NEIGHBOURS
+
+    def _fetch_neighbours(self, documents: List[Document]) -> List[Document]:
+        """
+        Fetches the chunks around the retrieved ones by point ID.
+
+        Args:
+            documents (List[Document]): Retrieved documents.
+
+        Returns:
+            List[Document]: Neighbouring chunks that were not retrieved.
+        """
+        present = set()
+        wanted = []
+        for document in documents:
+            metadata = document.metadata
+            if metadata.get("parent_id") is None or "chunk_index" not in metadata:
+                continue
+            present.add((metadata["parent_id"], metadata["chunk_index"]))
+        for parent_id, index in sorted(present):
+            chunk_count = next(
+                d.metadata.get("chunk_count", 1)
+                for d in documents
+                if d.metadata.get("parent_id") == parent_id
+            )
+            for neighbour in range(index - self.neighbours, index + self.neighbours + 1):
+                key = (parent_id, neighbour)
+                if 0 <= neighbour < chunk_count and key not in present:
+                    present.add(key)
+                    wanted.append(chunk_point_id(self.collection_name, parent_id, neighbour))
+        if not wanted:
+            return []
+
+        try:
+            points = self.qdrant_client.retrieve(
+                collection_name=self.collection_name, ids=wanted, with_payload=True
+            )
+        except Exception as e:
+            logger.warning(f"Could not fetch neighbouring chunks from '{self.collection_name}': {e}")
+            return []
+        return [
+            Document(
+                page_content=point.payload.get("page_content", ""),
+                metadata=point.payload.get("metadata", {}),
+            )
+            for point in points
+        ]
+
+    def _get_relevant_documents(
+            self, query: str, *, run_manager: CallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        """
+        Retrieves the chunks of a query and stitches them into passages.
+
+        Args:
+            query (str): The query to search for.
+            run_manager (CallbackManagerForRetrieverRun): The callback handler.
+
+        Returns:
+            List[Document]: The stitched passages.
+        """
+        documents = self.retriever.invoke(
+            query, config={"callbacks": run_manager.get_child()}
+        )
+        if self.neighbours > 0 and self.qdrant_client is not None and self.collection_name:
+            documents = documents + self._fetch_neighbours(documents)
+        return stitch_chunks(documents)
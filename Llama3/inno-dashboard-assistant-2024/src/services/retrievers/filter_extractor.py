@@ -0,0 +1,350 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+# Authors: SDG DS unit
+"""
+Rule-based metadata filters for the SelfQuerying retrievers.
+
+`SelfQueryRetriever` asks an LLM to turn every query into a Qdrant filter on the
+report ID and the insertion date, which costs one extra LLM round trip per
+collection. Most queries, however, either name a report from the known list or
+a date in a standard format, or name neither. `extract_filter` handles those
+cases deterministically and only reports them as undecided when the query holds
+temporal expressions it cannot parse (e.g. "last month").
+
+`RuleBasedSelfQueryRetriever` searches the vector store directly with the
+extracted filter and falls back to the wrapped `SelfQueryRetriever` only for
+undecided queries. Both paths also apply the hard report filter of the active
+retrieval scope (the report selected by the user).
+"""
+
+import re
+import unicodedata
+from typing import Any, Dict, List, Optional, Tuple
+
+from langchain.chains.query_constructor.ir import StructuredQuery
+from langchain.retrievers.self_query.base import SelfQueryRetriever
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+from langchain_core.vectorstores import VectorStore
+from qdrant_client.http import models
+
+from src.services.retrievers.request_context import (
+    METADATA_KEY,
+    apply_scope_filter,
+    current_scope,
+)
+
+MONTHS = {
+    "enero": 1, "january": 1, "jan": 1, "ene": 1,
+    "febrero": 2, "february": 2, "feb": 2,
+    "marzo": 3, "march": 3, "mar": 3,
+    "abril": 4, "april": 4, "apr": 4, "abr": 4,
+    "mayo": 5, "may": 5,
+    "junio": 6, "june": 6, "jun": 6,
+    "julio": 7, "july": 7, "jul": 7,
+    "agosto": 8, "august": 8, "aug": 8, "ago": 8,
+    "septiembre": 9, "setiembre": 9, "september": 9, "sep": 9, "sept": 9,
+    "octubre": 10, "october": 10, "oct": 10,
+    "noviembre": 11, "november": 11, "nov": 11,
+    "diciembre": 12, "december": 12, "dec": 12, "dic": 12,
+}
+_MONTH_PATTERN = "|".join(sorted(MONTHS, key=len, reverse=True))
+# Abbreviations are also common words ("may", "mar", ...): they are parsed in
+# dates but do not hint at a temporal expression on their own
+MONTH_ABBREVIATIONS = {
+    "jan", "ene", "feb", "mar", "apr", "abr", "may", "jun", "jul", "aug", "ago",
+    "sep", "sept", "oct", "nov", "dec", "dic",
+}
+_MONTH_NAMES = "|".join(name for name in MONTHS if name not in MONTH_ABBREVIATIONS)
+
+ISO_DATE = re.compile(r"\b(\d{4})[-/.](\d{1,2})[-/.](\d{1,2})\b")
+EU_DATE = re.compile(r"\b(\d{1,2})[-/.](\d{1,2})[-/.](\d{4})\b")
+DAY_MONTH_YEAR = re.compile(
+    rf"\b(\d{{1,2}})\s+(?:de\s+)?({_MONTH_PATTERN})\.?\s+(?:de\s+|del\s+)?(\d{{4}})\b"
+)
+MONTH_DAY_YEAR = re.compile(
+    rf"\b({_MONTH_PATTERN})\.?\s+(\d{{1,2}})(?:st|nd|rd|th)?,?\s+(\d{{4}})\b"
+)
+MONTH_YEAR = re.compile(
+    rf"\b({_MONTH_PATTERN})\.?\s+(?:de\s+|del\s+|of\s+)?(\d{{4}})\b"
+)
+# Words after a number that make it a quantity, not a year ("en 2000 unidades")
+QUANTITY_UNITS = (
+    r"%|€|\$|unidades|uds?|units?|euros?|eur|dolares|dollars?|usd|mil|miles|"
+    r"millones|millon|millions?|thousands?|k|m|personas|people|empleados|"
+    r"employees|clientes|customers|pedidos|orders|productos|products|items|"
+    r"horas|hours|dias|days|kg|km|puntos|points|veces|times"
+)
+# A lone year is only a date after "en", "del", "ano", "year" or "in" and when
+# no unit follows it ("en 2023", "del 2024"); "de 2030" may be a quantity
+# ("mas de 2000") and is left to the LLM
+YEAR = re.compile(
+    rf"\b(?:en|del|ano|year|in)\s+(20\d{{2}}|19\d{{2}})\b"
+    rf"(?!\s*(?:[%€$]|(?:{QUANTITY_UNITS})\b))"
+)
+# Any other year-like number may be a quantity or a target ("2000 unidades")
+YEAR_LIKE = re.compile(r"\b(?:20|19)\d{2}\b")
+
+# Temporal expressions that need the LLM (relative dates, lone months, ...)
+TEMPORAL_HINTS = re.compile(
+    rf"\b(hoy|ayer|today|yesterday|ultim[oa]s?|last|latest|previous|anterior(?:es)?|"
+    rf"pasad[oa]|reciente(?:s)?|recent|semana|week|trimestre|quarter|semestre|"
+    rf"mes|month|ano|year|fecha|date|since|desde|hasta|until|before|after|"
+    rf"antes|despues|{_MONTH_NAMES})\b"
+)
+
+
+def normalize(text: str) -> str:
+    """
+    Lower-cases a text and removes accents and separators.
+
+    Args:
+        text (str): The text to normalize.
+
+    Returns:
+        str: Normalized text.
+    """
+    text = unicodedata.normalize("NFKD", text)
+    text = "".join(char for char in text if not unicodedata.combining(char))
+    text = re.sub(r"[_\s]+", " ", text.lower())
+    return text.strip()
+
+
+def match_reports(query: str, report_ids: List[str]) -> List[str]:
+    """
+    Returns the report IDs mentioned in a query.
+
+    Args:
+        query (str): The normalized query.
+        report_ids (List[str]): Known report IDs.
+
+    Returns:
+        List[str]: Report IDs found in the query, longest first.
+    """
+    found = []
+    remaining = query
+    for report_id in sorted(report_ids, key=len, reverse=True):
+        pattern = re.compile(rf"(?<!\w){re.escape(normalize(report_id))}(?!\w)")
+        if pattern.search(remaining):
+            found.append(report_id)
+            # Avoid matching 'Eagle' again inside 'Eagle RRHH'
+            remaining = pattern.sub(" ", remaining)
+    return found
+
+
+def parse_date(query: str) -> Tuple[Optional[Dict[str, str]], str]:
+    """
+    Extracts the first date in a standard format from a query.
+
+    Args:
+        query (str): The normalized query.
+
+    Returns:
+        Tuple[Optional[Dict[str, str]], str]: The date parts (year, and month
+        and day when present, as 2-digit strings) and the query without the
+        matched date.
+    """
+    candidates = (
+        (ISO_DATE, lambda m: (m.group(1), int(m.group(2)), int(m.group(3)))),
+        (EU_DATE, lambda m: (m.group(3), int(m.group(2)), int(m.group(1)))),
+        (DAY_MONTH_YEAR, lambda m: (m.group(3), MONTHS[m.group(2)], int(m.group(1)))),
+        (MONTH_DAY_YEAR, lambda m: (m.group(3), MONTHS[m.group(1)], int(m.group(2)))),
+        (MONTH_YEAR, lambda m: (m.group(2), MONTHS[m.group(1)], None)),
+        (YEAR, lambda m: (m.group(1), None, None)),
+    )
+    for pattern, to_parts in candidates:
+        match = pattern.search(query)
+        if not match:
+            continue
+        year, month, day = to_parts(match)
+        if (month is not None and not 1 <= month <= 12) or (
+                day is not None and not 1 <= day <= 31
+        ):
+            continue
+        parts = {"insertion_year": year}
+        if month is not None:
+            parts["insertion_month"] = f"{month:02d}"
+        if day is not None:
+            parts["insertion_day"] = f"{day:02d}"
+        return parts, query[: match.start()] + " " + query[match.end():]
+    return None, query
+
+
+def extract_filter(
+        query: str,
+        report_ids: List[str],
+        report_field: str,
+        date_fields: bool = True,
+) -> Tuple[bool, Optional[models.Filter]]:
+    """
+    Builds the metadata filter of a query without calling an LLM.
+
+    Args:
+        query (str): The user query.
+        report_ids (List[str]): Known report IDs.
+        report_field (str): Metadata field holding the report ID.
+        date_fields (bool): Whether the collection has insertion date fields.
+
+    Returns:
+        Tuple[bool, Optional[models.Filter]]: Whether the filter could be
+        decided and, if so, the filter (None when nothing must be filtered).
+    """
+    normalized = normalize(query)
+    conditions = []
+
+    reports = match_reports(normalized, report_ids)
+    if reports:
+        match = (
+            models.MatchValue(value=reports[0])
+            if len(reports) == 1
+            else models.MatchAny(any=reports)
+        )
+        conditions.append(
+            models.FieldCondition(key=f"{METADATA_KEY}.{report_field}", match=match)
+        )
+
+    if date_fields:
+        date_parts, rest = parse_date(normalized)
+        if date_parts:
+            conditions.extend(
+                models.FieldCondition(
+                    key=f"{METADATA_KEY}.{field}", match=models.MatchValue(value=value)
+                )
+                for field, value in date_parts.items()
+            )
+        elif TEMPORAL_HINTS.search(rest) or YEAR_LIKE.search(rest):
+            # Relative or partial dates and bare numbers are left to the LLM
+            return False, None
+
+    if not conditions:
+        return True, None
+    return True, models.Filter(must=conditions)
+
+
+class ScopedSelfQueryRetriever(SelfQueryRetriever):
+    """
+    `SelfQueryRetriever` that adds the report filter of the active scope to
+    the filter built by the LLM.
+
+    Attributes:
+        report_field (Optional[str]): Metadata field holding the report ID.
+    """
+
+    report_field: Optional[str] = None
+
+    def _prepare_query(
+            self, query: str, structured_query: StructuredQuery
+    ) -> Tuple[str, Dict[str, Any]]:
+        """
+        Translates the structured query and adds the scope filter.
+
+        Args:
+            query (str): The original query.
+            structured_query (StructuredQuery): The query built by the LLM.
+
+        Returns:
+            Tuple[str, Dict[str, Any]]: The query and the search arguments.
+        """
+        new_query, search_kwargs = super()._prepare_query(query, structured_query)
+        return new_query, apply_scope_filter(search_kwargs, self.report_field)
+
+
+class RuleBasedSelfQueryRetriever(BaseRetriever):
+    """
+    Self-query retriever that tries rule-based filters before the LLM.
+
+    Attributes:
+        vectorstore (VectorStore): Vector store searched on the fast path.
+        fallback (SelfQueryRetriever): LLM-based retriever for undecided queries.
+        report_ids (List[str]): Known report IDs.
+        report_field (str): Metadata field holding the report ID.
+        date_fields (bool): Whether the collection has insertion date fields.
+        search_kwargs (Dict[str, Any]): Keyword arguments of the search.
+    """
+
+    vectorstore: VectorStore
+    fallback: SelfQueryRetriever
+    report_ids: List[str]
+    report_field: str
+    date_fields: bool = True
+    search_kwargs: Dict[str, Any] = {}
+
+    @classmethod
+    def from_self_query_retriever(
+            cls,
+            retriever: SelfQueryRetriever,
+            report_ids: List[str],
+            report_field: str,
+            date_fields: bool = True,
+    ) -> "RuleBasedSelfQueryRetriever":
+        """
+        Wraps an LLM-based self-query retriever with the rule-based fast path.
+
+        Args:
+            retriever (SelfQueryRetriever): The LLM-based retriever.
+            report_ids (List[str]): Known report IDs.
+            report_field (str): Metadata field holding the report ID.
+            date_fields (bool): Whether the collection has insertion date fields.
+
+        Returns:
+            RuleBasedSelfQueryRetriever: The wrapped retriever.
+        """
+        return cls(
+            vectorstore=retriever.vectorstore,
+            fallback=retriever,
+            report_ids=report_ids,
+            report_field=report_field,
+            date_fields=date_fields,
+            search_kwargs=retriever.search_kwargs,
+        )
+
+    def _get_relevant_documents(
+            self, query: str, *, run_manager: CallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        """
+        Retrieves the documents of a query, filtering by rules when possible.
+
+        Args:
+            query (str): The user query.
+            run_manager (CallbackManagerForRetrieverRun): The callback handler.
+
+        Returns:
+            List[Document]: The retrieved documents.
+        """
+        # The report selected by the user replaces any report named in the query
+        scope = current_scope()
+        report_ids = (
+            [] if scope is not None and scope.report_id is not None else self.report_ids
+        )
+        decided, query_filter = extract_filter(
+            query=query,
+            report_ids=report_ids,
+            report_field=self.report_field,
+            date_fields=self.date_fields,
+        )
+        if not decided:
+            return self.fallback.invoke(
+                query, config={"callbacks": run_manager.get_child()}
+            )
+
+        search_kwargs = dict(self.search_kwargs)
+        if query_filter is not None:
+            search_kwargs["filter"] = query_filter
+        search_kwargs = apply_scope_filter(search_kwargs, self.report_field)
+        return self.vectorstore.similarity_search(query, **search_kwargs)
+
+
+def parse_report_ids(names: str) -> List[str]:
+    """
+    Splits the output of `get_reports` into a list of report IDs.
+
+    Args:
+        names (str): Comma-separated report IDs, or an error message.
+
+    Returns:
+        List[str]: The report IDs (empty if `names` is an error message).
+    """
+    if not names or names.startswith("Error"):
+        return []
+    return [name.strip() for name in names.split(",") if name.strip()]
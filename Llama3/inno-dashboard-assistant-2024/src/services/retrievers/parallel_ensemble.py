@@ -0,0 +1,90 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+# Authors: SDG DS unit
+"""
+Ensemble retriever that runs its sub-retrievers concurrently.
+
+The standard `EnsembleRetriever` invokes each sub-retriever one after another.
+Here every sub-retriever is a full pipeline (self-query LLM call, Qdrant search
+and Flashrank rerank), so a query over several collections pays the sum of
+their latencies. `ParallelEnsembleRetriever` submits the pipelines to a shared
+thread pool and fuses the results with the usual weighted reciprocal rank, so
+the latency is set by the slowest collection instead.
+
+The pool size can be configured with the `RETRIEVER_MAX_WORKERS` environment
+variable (default: 8).
+"""
+
+import contextvars
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, cast
+
+from dotenv import load_dotenv
+from langchain.retrievers.ensemble import EnsembleRetriever
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.runnables import RunnableConfig
+from langchain_core.runnables.config import patch_config
+
+load_dotenv()
+
+# Shared by every parallel ensemble; the work is I/O bound or releases the GIL
+retriever_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv("RETRIEVER_MAX_WORKERS", "8")),
+    thread_name_prefix="retriever",
+)
+
+
+class ParallelEnsembleRetriever(EnsembleRetriever):
+    """
+    `EnsembleRetriever` that invokes its retrievers concurrently.
+
+    The per-request context (e.g. the active retrieval scope) is copied into
+    every worker thread, so the sub-retrievers see the same state as the caller.
+    """
+
+    def rank_fusion(
+            self,
+            query: str,
+            run_manager: CallbackManagerForRetrieverRun,
+            *,
+            config: Optional[RunnableConfig] = None,
+    ) -> List[Document]:
+        """
+        Retrieves the documents of every retriever in parallel and fuses them.
+
+        Args:
+            query (str): The query to search for.
+            run_manager (CallbackManagerForRetrieverRun): The callback handler.
+            config (Optional[RunnableConfig]): Configuration of the run.
+
+        Returns:
+            List[Document]: The fused list of documents.
+        """
+        if len(self.retrievers) < 2:
+            return super().rank_fusion(query, run_manager, config=config)
+
+        futures = [
+            retriever_executor.submit(
+                contextvars.copy_context().run,
+                retriever.invoke,
+                query,
+                patch_config(
+                    config, callbacks=run_manager.get_child(tag=f"retriever_{i + 1}")
+                ),
+            )
+            for i, retriever in enumerate(self.retrievers)
+        ]
+        retriever_docs = [future.result() for future in futures]
+
+        # Enforce that retrieved docs are Documents for each list
+        retriever_docs = [
+            [
+                Document(page_content=cast(str, doc)) if isinstance(doc, str) else doc
+                for doc in docs
+            ]
+            for docs in retriever_docs
+        ]
+
+        return self.weighted_reciprocal_rank(retriever_docs)
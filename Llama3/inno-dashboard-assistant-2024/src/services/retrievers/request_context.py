@@ -0,0 +1,222 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+# Authors: SDG DS unit
+"""
+Per-request retrieval context.
+
+A single tool call can query several collections, and each of them embeds the
+query again with the same model. `retrieval_scope` opens a context for one
+request in which every query text is embedded only once: the first retriever
+that needs the vector computes it, and the others (also those running in the
+worker threads of a `ParallelEnsembleRetriever`) reuse it.
+
+`ScopedQueryEmbeddings` wraps the embedding model given to the vector stores
+and routes `embed_query` through the active scope. Outside a scope it behaves
+exactly like the wrapped model.
+
+A scope can also carry the report selected by the user. Every retriever then
+adds a hard Qdrant payload filter on that report ID (see `apply_scope_filter`),
+so searches only scan the points of that report.
+"""
+
+import threading
+from concurrent.futures import Future
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.vectorstores import VectorStoreRetriever
+from qdrant_client.http import models
+
+METADATA_KEY = "metadata"
+
+
+class RetrievalScope:
+    """
+    State shared by every retriever taking part in a single request.
+
+    Attributes:
+        report_id (Optional[str]): Report every search is restricted to.
+    """
+
+    def __init__(self, report_id: Optional[str] = None) -> None:
+        """
+        Initializes an empty scope.
+
+        Args:
+            report_id (Optional[str]): Report every search is restricted to.
+        """
+        self.report_id = report_id
+        self._query_embeddings: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+
+    def embed_query(
+            self, text: str, embed: Callable[[str], List[float]]
+    ) -> List[float]:
+        """
+        Returns the embedding of `text`, computing it only once per scope.
+
+        Args:
+            text (str): The query text.
+            embed (Callable[[str], List[float]]): Function that embeds the text.
+
+        Returns:
+            List[float]: The query embedding.
+        """
+        with self._lock:
+            future = self._query_embeddings.get(text)
+            is_owner = future is None
+            if is_owner:
+                future = Future()
+                self._query_embeddings[text] = future
+
+        if is_owner:
+            try:
+                future.set_result(embed(text))
+            except BaseException as e:
+                future.set_exception(e)
+                raise
+        return future.result()
+
+
+_current_scope: ContextVar[Optional[RetrievalScope]] = ContextVar(
+    "retrieval_scope", default=None
+)
+
+
+@contextmanager
+def retrieval_scope(report_id: Optional[str] = None) -> Iterator[RetrievalScope]:
+    """
+    Opens a retrieval scope for the duration of a request.
+
+    Args:
+        report_id (Optional[str]): Report every search is restricted to.
+
+    Yields:
+        RetrievalScope: The active scope.
+    """
+    scope = RetrievalScope(report_id=report_id)
+    token = _current_scope.set(scope)
+    try:
+        yield scope
+    finally:
+        _current_scope.reset(token)
+
+
+def current_scope() -> Optional[RetrievalScope]:
+    """
+    Returns the active retrieval scope, if any.
+
+    Returns:
+        Optional[RetrievalScope]: The active scope or None.
+    """
+    return _current_scope.get()
+
+
+class ScopedQueryEmbeddings(Embeddings):
+    """
+    Embeddings wrapper that shares query vectors within a retrieval scope.
+
+    Attributes:
+        embeddings (Embeddings): The wrapped embedding model.
+    """
+
+    def __init__(self, embeddings: Embeddings) -> None:
+        """
+        Initializes the wrapper.
+
+        Args:
+            embeddings (Embeddings): The embedding model to wrap.
+        """
+        self.embeddings = embeddings
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        """
+        Embeds documents with the wrapped model.
+
+        Args:
+            texts (List[str]): Texts to embed.
+
+        Returns:
+            List[List[float]]: One embedding per text.
+        """
+        return self.embeddings.embed_documents(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        """
+        Embeds a query, reusing the vector already computed in the active scope.
+
+        Args:
+            text (str): Query text.
+
+        Returns:
+            List[float]: The query embedding.
+        """
+        scope = current_scope()
+        if scope is None:
+            return self.embeddings.embed_query(text)
+        return scope.embed_query(text, self.embeddings.embed_query)
+
+
+def apply_scope_filter(
+        search_kwargs: Dict[str, Any], report_field: Optional[str]
+) -> Dict[str, Any]:
+    """
+    Adds the report filter of the active scope to the search arguments.
+
+    The report condition is combined (AND) with any filter already present.
+
+    Args:
+        search_kwargs (Dict[str, Any]): Keyword arguments of the search.
+        report_field (Optional[str]): Metadata field holding the report ID in
+            the searched collection; None if it cannot be filtered.
+
+    Returns:
+        Dict[str, Any]: The search arguments including the report filter.
+    """
+    scope = current_scope()
+    if scope is None or scope.report_id is None or report_field is None:
+        return search_kwargs
+
+    conditions = [
+        models.FieldCondition(
+            key=f"{METADATA_KEY}.{report_field}",
+            match=models.MatchValue(value=scope.report_id),
+        )
+    ]
+    existing_filter = search_kwargs.get("filter")
+    if existing_filter is not None:
+        conditions.append(existing_filter)
+    return {**search_kwargs, "filter": models.Filter(must=conditions)}
+
+
+class ScopedVectorStoreRetriever(VectorStoreRetriever):
+    """
+    Similarity retriever that honours the report filter of the active scope.
+
+    Attributes:
+        report_field (Optional[str]): Metadata field holding the report ID.
+    """
+
+    report_field: Optional[str] = None
+
+    def _get_relevant_documents(
+            self, query: str, *, run_manager: CallbackManagerForRetrieverRun, **kwargs: Any
+    ) -> List[Document]:
+        """
+        Retrieves the most similar documents within the selected report.
+
+        Args:
+            query (str): The query to search for.
+            run_manager (CallbackManagerForRetrieverRun): The callback handler.
+
+        Returns:
+            List[Document]: The retrieved documents.
+        """
+        search_kwargs = apply_scope_filter(
+            {**self.search_kwargs, **kwargs}, self.report_field
+        )
+        return self.vectorstore.similarity_search(query, **search_kwargs)
@@ -0,0 +1,229 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+# Authors: SDG DS unit
+"""
+Process-wide registry of ready-to-use retrievers.
+
+Building an `EnsembleRetriever` is expensive: it creates the Flashrank ranker,
+the self-query LLM, one `QdrantVectorStore` per collection and the compression
+retrievers, and it fetches the report names from Qdrant. The retrievers hold
+no per-query state, so this module builds each ensemble once per configuration
+and hands out the same instance to every request.
+
+The cache key is made of the retrieval flavour (self-query or plain vector
+search), the requested collections, their `n` values, the reranker model,
+its `max_length`, the fan-out mode, the report names and the data version.
+
+The self-query retrievers capture the report names in their rule-based filters
+and LLM prompts, so the names are read from Qdrant (one small scroll) on every
+`get` and a hash of them is part of the key: every worker process picks up the
+names of an update, not only the one that ran it. When the names cannot be
+read, the retriever is built for that call only and not cached. The data
+version is bumped by `invalidate` whenever `/update_data` changes the stored
+data, so the process that ran the update also drops its other retrievers.
+
+The collections and `n` values of some configurations come from the LLM (see
+the context tool), so the number of keys is not bounded: the registry keeps
+the `RETRIEVER_REGISTRY_SIZE` most recently used retrievers (default: 32) and
+evicts the others.
+"""
+
+import hashlib
+import logging
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+from dotenv import load_dotenv
+from langchain.retrievers.ensemble import EnsembleRetriever
+
+from src.services.retrievers.selfq_retrievers import (
+    get_reports,
+    setup_retrievers as setup_selfq_retrievers,
+)
+from src.services.retrievers.vector_store_retrievers import (
+    setup_retrievers as setup_vector_store_retrievers,
+)
+from src.utils.logging_config import setup_logging
+
+load_dotenv()
+
+# Set up logging
+setup_logging()
+logger = logging.getLogger(name=__name__)
+
+RETRIEVER_REGISTRY_SIZE = int(os.getenv("RETRIEVER_REGISTRY_SIZE", "32"))
+
+RetrieverKey = Tuple[Any, ...]
+
+
+class RetrieverRegistry:
+    """
+    Thread-safe LRU cache of `EnsembleRetriever` instances.
+
+    Attributes:
+        version (int): Data version; part of every cache key.
+        max_size (int): Maximum number of retrievers kept.
+    """
+
+    def __init__(self, max_size: int = RETRIEVER_REGISTRY_SIZE) -> None:
+        """
+        Initializes an empty registry.
+
+        Args:
+            max_size (int): Maximum number of retrievers kept.
+        """
+        self.version = 0
+        self.max_size = max_size
+        self._retrievers: "OrderedDict[RetrieverKey, EnsembleRetriever]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._build_locks: Dict[RetrieverKey, threading.Lock] = {}
+
+    def _make_key(
+            self,
+            self_query: bool,
+            collections: List[Dict[str, Any]],
+            n_values: Dict[str, int],
+            model: str,
+            max_length: int,
+            parallel: bool,
+            names: Optional[str],
+    ) -> RetrieverKey:
+        """
+        Builds the hashable cache key of a retriever configuration.
+
+        Args:
+            self_query (bool): Whether the SelfQuerying retrievers are used.
+            collections (List[Dict[str, Any]]): Collections to retrieve from.
+            n_values (Dict[str, int]): Top 'n' values per collection.
+            model (str): Flashrank reranker model name.
+            max_length (int): Reranker maximum sequence length.
+            parallel (bool): Whether the retrievers run concurrently.
+            names (Optional[str]): Report names captured by the retrievers
+                (None for the vector store retrievers).
+
+        Returns:
+            RetrieverKey: The cache key.
+        """
+        collection_names = tuple(collection["name"] for collection in collections)
+        names_hash = (
+            hashlib.sha256(names.encode("utf-8")).hexdigest()
+            if names is not None
+            else None
+        )
+        n_items = tuple(
+            (name, n_values.get(name, 0)) for name in collection_names
+        )
+        return (
+            "selfq" if self_query else "vector_store",
+            collection_names,
+            n_items,
+            model,
+            max_length,
+            parallel,
+            names_hash,
+            self.version,
+        )
+
+    def get(
+            self,
+            qdrant_client: Any,
+            collections: List[Dict[str, Any]],
+            n_values: Dict[str, int],
+            model: str,
+            max_length: int = 256,
+            self_query: bool = True,
+            parallel: bool = False,
+    ) -> EnsembleRetriever:
+        """
+        Returns the retriever for the given configuration, building it on first use.
+
+        Args:
+            qdrant_client (Any): The Qdrant client instance.
+            collections (List[Dict[str, Any]]): Collections to retrieve from.
+            n_values (Dict[str, int]): Top 'n' values per collection.
+            model (str): Flashrank reranker model name.
+            max_length (int): Reranker maximum sequence length.
+            self_query (bool): Use the SelfQuerying retrievers (True) or the
+                plain vector store retrievers (False).
+            parallel (bool): Run the retrievers of each collection concurrently.
+
+        Returns:
+            EnsembleRetriever: A shared, ready-to-use retriever.
+        """
+        names = get_reports(qdrant_client) if self_query else None
+        if names is not None and names.startswith("Error"):
+            # Do not pin a failed read of the report names into a cached retriever
+            logger.warning("Report names unavailable; building an uncached retriever.")
+            return setup_selfq_retrievers(
+                qdrant_client=qdrant_client,
+                collections=collections,
+                n_values=n_values,
+                model=model,
+                max_length=max_length,
+                parallel=parallel,
+                names=names,
+            )
+
+        with self._lock:
+            key = self._make_key(
+                self_query, collections, n_values, model, max_length, parallel, names
+            )
+            retriever = self._retrievers.get(key)
+            if retriever is not None:
+                self._retrievers.move_to_end(key)
+                return retriever
+            build_lock = self._build_locks.setdefault(key, threading.Lock())
+
+        # Only one thread builds a given configuration; the others wait for it
+        with build_lock:
+            retriever = self._retrievers.get(key)
+            if retriever is not None:
+                return retriever
+
+            logger.info(f"Building retriever for {key}...")
+            if self_query:
+                retriever = setup_selfq_retrievers(
+                    qdrant_client=qdrant_client,
+                    collections=collections,
+                    n_values=n_values,
+                    model=model,
+                    max_length=max_length,
+                    parallel=parallel,
+                    names=names,
+                )
+            else:
+                retriever = setup_vector_store_retrievers(
+                    qdrant_client=qdrant_client,
+                    collections=collections,
+                    n_values=n_values,
+                    model=model,
+                    max_length=max_length,
+                    parallel=parallel,
+                )
+
+            with self._lock:
+                # Do not cache a retriever built against outdated data
+                if key[-1] == self.version:
+                    self._retrievers[key] = retriever
+                    while len(self._retrievers) > self.max_size:
+                        self._retrievers.popitem(last=False)
+                self._build_locks.pop(key, None)
+            return retriever
+
+    def invalidate(self) -> None:
+        """
+        Drops every cached retriever and bumps the data version.
+
+        Must be called after the stored data changes (e.g. from `/update_data`).
+        """
+        with self._lock:
+            self.version += 1
+            self._retrievers.clear()
+            self._build_locks.clear()
+        logger.info(f"Retriever registry invalidated (version {self.version}).")
+
+
+# Shared registry used by the agent tools and the report generator
+retriever_registry = RetrieverRegistry()
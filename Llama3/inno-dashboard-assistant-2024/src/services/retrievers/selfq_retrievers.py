@@ -9,35 +9,49 @@ in Qdrant collections. The retrievers are combined using an EnsembleRetriever
 to allow multiple retrievers to contribute to the final result with 
 assigned weights.
 
-Implements SelfQuerying and Flashrank Rerank.
+Implements SelfQuerying and Flashrank Rerank. Metadata filters are first
+extracted by rules, and the SelfQuerying LLM is only called when the rules
+cannot decide.
 """
 
 import logging
+from typing import Optional
 
-from flashrank import Ranker
-from langchain_groq import ChatGroq
 from langchain.chains.query_constructor.base import AttributeInfo
 from langchain.retrievers import ContextualCompressionRetriever
 from langchain.retrievers.document_compressors import FlashrankRerank
 from langchain.retrievers.ensemble import EnsembleRetriever
-from langchain.retrievers.self_query.base import SelfQueryRetriever
 from langchain_community.query_constructors.qdrant import QdrantTranslator
 from langchain_openai import ChatOpenAI, OpenAIEmbeddings
 from langchain_qdrant.qdrant import QdrantVectorStore
+from src.services.data.utils.collection_profiles import get_search_params
+from src.services.llm.clients import get_chat_model
+from src.services.llm.embedding_cache import get_query_embedding_cache
+from src.services.llm.embeddings import EMBEDDING_MODEL_NAME, shared_embeddings
+from src.services.llm.reranker_pool import reranker_pool
+from src.services.retrievers.chunk_stitching import StitchingRetriever
+from src.services.retrievers.filter_extractor import (
+    RuleBasedSelfQueryRetriever,
+    ScopedSelfQueryRetriever,
+    parse_report_ids,
+)
+from src.services.retrievers.parallel_ensemble import ParallelEnsembleRetriever
+from src.services.retrievers.request_context import ScopedQueryEmbeddings
 from src.utils.logging_config import setup_logging
-from langchain_huggingface import HuggingFaceEmbeddings
-from llama_index.embeddings.langchain import LangchainEmbedding
 from langchain_qdrant.qdrant import QdrantVectorStore
 from dotenv import load_dotenv
 import os
 
 load_dotenv()
-api_key = os.getenv("GROQ_API_KEY")
 
 
-# Definir los embeddings de HuggingFace
-lc_embed_model = HuggingFaceEmbeddings(model_name="BAAI/bge-m3")
-embedding_model = lc_embed_model
+# Query vectors are cached across requests, computed once per request and
+# shared by every collection
+embedding_model = ScopedQueryEmbeddings(
+    get_query_embedding_cache(
+        embeddings=shared_embeddings, model_name=EMBEDDING_MODEL_NAME
+    )
+)
 
 # Set up logging
 setup_logging()
@@ -45,7 +59,13 @@ logger = logging.getLogger(__name__)
 
 
 def setup_retrievers(
-    qdrant_client: object, collections, n_values: dict, model: str, max_length: int = 256
+    qdrant_client: object,
+    collections,
+    n_values: dict,
+    model: str,
+    max_length: int = 256,
+    parallel: bool = False,
+    names: Optional[str] = None,
 ) -> EnsembleRetriever:
     """
     Configures retrievers for different collections in Qdrant and sets up
@@ -59,6 +79,10 @@ def setup_retrievers(
                         corresponding top 'n' values for ranking.
         model (str): name of ultra ligth llm .onnx model used to rerank
                     selfquery documents
+        max_length (int): maximum sequence length of the reranker.
+        parallel (bool): run the retrievers of each collection concurrently.
+        names (Optional[str]): report names, as returned by `get_reports`;
+                        read from Qdrant if not given.
 
     Returns:
         EnsembleRetriever: A retriever that combines the results of
@@ -67,14 +91,13 @@ def setup_retrievers(
 
     retrievers = []
     weights = []
-    llm_re = ChatGroq(
-    model_name="llama-3.3-70b-specdec",
-    groq_api_key=api_key,
-    temperature=0)
-    cache_dir = "src/services/llm/rerank_llms"
+    # Shared client: no new connection pool per retriever setup
+    llm_re = get_chat_model(temperature=0)
     model_name = model
-    flashrank_client = Ranker(model_name=model_name, cache_dir=cache_dir,max_length=max_length)
-    names = get_reports(qdrant_client)
+    flashrank_client = reranker_pool.get(model=model_name, max_length=max_length)
+    if names is None:
+        names = get_reports(qdrant_client)
+    report_ids = parse_report_ids(names)
 
     for collection in collections:
         collection_name = collection["name"]
@@ -89,7 +112,7 @@ def setup_retrievers(
                 embedding=embedding_model,
             )
 
-            retriever_metadata = SelfQueryRetriever.from_llm(
+            retriever_metadata = ScopedSelfQueryRetriever.from_llm(
                 llm=llm_re,
                 vectorstore=vector_store_metadata,
                 document_contents="General report description",
@@ -108,8 +131,19 @@ def setup_retrievers(
                 structured_query_translator=QdrantTranslator(
                     metadata_key="metadata"
                 ),
-                search_kwargs={"k": 2},
+                search_kwargs={
+                    "k": 2,
+                    "search_params": get_search_params("element_names"),
+                },
                 verbose=False,
+                report_field="report_id",
+            )
+            # Deterministic filters first; the LLM only for undecided queries
+            retriever_metadata = RuleBasedSelfQueryRetriever.from_self_query_retriever(
+                retriever=retriever_metadata,
+                report_ids=report_ids,
+                report_field="report_id",
+                date_fields=False,
             )
 
             compressor_metadata = FlashrankRerank(
@@ -130,7 +164,7 @@ def setup_retrievers(
                 embedding=embedding_model,
             )
 
-            retriever_summaries = SelfQueryRetriever.from_llm(
+            retriever_summaries = ScopedSelfQueryRetriever.from_llm(
                 llm=llm_re,
                 vectorstore=vector_store_summaries,
                 document_contents="Summary of the report",
@@ -164,8 +198,17 @@ def setup_retrievers(
                 structured_query_translator=QdrantTranslator(
                     metadata_key="metadata"
                 ),
-                search_kwargs={"k": 2},
+                search_kwargs={
+                    "k": 2,
+                    "search_params": get_search_params("report_sum"),
+                },
                 verbose=False,
+                report_field="Report_Id",
+            )
+            retriever_summaries = RuleBasedSelfQueryRetriever.from_self_query_retriever(
+                retriever=retriever_summaries,
+                report_ids=report_ids,
+                report_field="Report_Id",
             )
 
             compressor_summaries = FlashrankRerank(
@@ -176,7 +219,14 @@ def setup_retrievers(
                 base_retriever=retriever_summaries,
             )
 
-            retrievers.append(compression_retriever_summaries)
+            # The summaries are stored in chunks, stitched back after reranking
+            retrievers.append(
+                StitchingRetriever(
+                    retriever=compression_retriever_summaries,
+                    qdrant_client=qdrant_client,
+                    collection_name="report_sum",
+                )
+            )
             weights.append(0.3)
 
         if "Elements" == collection_name:
@@ -186,7 +236,7 @@ def setup_retrievers(
                 embedding=embedding_model,
             )
 
-            retriever_tabular = SelfQueryRetriever.from_llm(
+            retriever_tabular = ScopedSelfQueryRetriever.from_llm(
                 llm=llm_re,
                 vectorstore=vector_store_tabular,
                 document_contents="Report content",
@@ -220,8 +270,17 @@ def setup_retrievers(
                 structured_query_translator=QdrantTranslator(
                     metadata_key="metadata"
                 ),
-                search_kwargs={"k": 20},
+                search_kwargs={
+                    "k": 20,
+                    "search_params": get_search_params("table_elements"),
+                },
                 verbose=False,
+                report_field="Id",
+            )
+            retriever_tabular = RuleBasedSelfQueryRetriever.from_self_query_retriever(
+                retriever=retriever_tabular,
+                report_ids=report_ids,
+                report_field="Id",
             )
 
             compressor_tabular = FlashrankRerank(
@@ -242,7 +301,7 @@ def setup_retrievers(
                 embedding=embedding_model,
             )
 
-            retriever_text = SelfQueryRetriever.from_llm(
+            retriever_text = ScopedSelfQueryRetriever.from_llm(
                 llm=llm_re,
                 vectorstore=vector_store_text,
                 document_contents="Report content",
@@ -276,8 +335,17 @@ def setup_retrievers(
                 structured_query_translator=QdrantTranslator(
                     metadata_key="metadata"
                 ),
-                search_kwargs={"k": 8},
+                search_kwargs={
+                    "k": 8,
+                    "search_params": get_search_params("text_pages"),
+                },
                 verbose=False,
+                report_field="Report_Id",
+            )
+            retriever_text = RuleBasedSelfQueryRetriever.from_self_query_retriever(
+                retriever=retriever_text,
+                report_ids=report_ids,
+                report_field="Report_Id",
             )
 
             compressor_text = FlashrankRerank(
@@ -287,7 +355,14 @@ def setup_retrievers(
                 base_compressor=compressor_text, base_retriever=retriever_text
             )
 
-            retrievers.append(compression_retriever_text)
+            # The pages are stored in chunks, stitched back after reranking
+            retrievers.append(
+                StitchingRetriever(
+                    retriever=compression_retriever_text,
+                    qdrant_client=qdrant_client,
+                    collection_name="text_pages",
+                )
+            )
             weights.append(0.2)
 
         if "upload_dates" == collection_name:
@@ -297,7 +372,7 @@ def setup_retrievers(
                 embedding=embedding_model,
             )
 
-            retriever_dates = SelfQueryRetriever.from_llm(
+            retriever_dates = ScopedSelfQueryRetriever.from_llm(
                 llm=llm_re,
                 vectorstore=vector_store_dates,
                 document_contents="Upload dates information of the report",
@@ -316,8 +391,18 @@ def setup_retrievers(
                 structured_query_translator=QdrantTranslator(
                     metadata_key="metadata"
                 ),
-                search_kwargs={"k": 2},
+                search_kwargs={
+                    "k": 2,
+                    "search_params": get_search_params("upload_dates"),
+                },
                 verbose=False,
+                report_field="report_id",
+            )
+            retriever_dates = RuleBasedSelfQueryRetriever.from_self_query_retriever(
+                retriever=retriever_dates,
+                report_ids=report_ids,
+                report_field="report_id",
+                date_fields=False,
             )
 
             compressor_dates = FlashrankRerank(
@@ -330,7 +415,8 @@ def setup_retrievers(
             retrievers.append(compression_retriever_dates)
             weights.append(0.2)
 
-    ensemble_retriever = EnsembleRetriever(
+    ensemble_class = ParallelEnsembleRetriever if parallel else EnsembleRetriever
+    ensemble_retriever = ensemble_class(
         retrievers=retrievers,
         weights=weights,  # Adjusted weights based on active collections
     )
@@ -12,7 +12,8 @@ retrievers, applies compression, and then combines them into an
 `EnsembleRetriever` for effective querying. 
 
 Unlike selfq_retrievers.py, this module is intended to implement
-retieval without SelfQuerying.
+retieval without SelfQuerying. The only metadata filter applied is the
+report selected by the user, taken from the active retrieval scope.
 
 The retrievers utilize Flashrank for reranking documents and Qdrant 
 as the vector store for retrieving relevant documents.
@@ -21,24 +22,37 @@ as the vector store for retrieving relevant documents.
 import os
 from typing import Dict, List
 
-from flashrank import Ranker
 from langchain.retrievers import ContextualCompressionRetriever
 from langchain.retrievers.document_compressors import FlashrankRerank
 from langchain.retrievers.ensemble import EnsembleRetriever
-from langchain_huggingface import HuggingFaceEmbeddings
-from llama_index.embeddings.langchain import LangchainEmbedding
 from langchain_qdrant.qdrant import QdrantVectorStore
 
-# Definir los embeddings de HuggingFace
-lc_embed_model = HuggingFaceEmbeddings(model_name="BAAI/bge-m3")
-embedding_model = lc_embed_model
+from src.services.data.utils.collection_profiles import get_search_params
+from src.services.llm.embedding_cache import get_query_embedding_cache
+from src.services.llm.embeddings import EMBEDDING_MODEL_NAME, shared_embeddings
+from src.services.llm.reranker_pool import reranker_pool
+from src.services.retrievers.chunk_stitching import StitchingRetriever
+from src.services.retrievers.parallel_ensemble import ParallelEnsembleRetriever
+from src.services.retrievers.request_context import (
+    ScopedQueryEmbeddings,
+    ScopedVectorStoreRetriever,
+)
+
+# Query vectors are cached across requests, computed once per request and
+# shared by every collection
+embedding_model = ScopedQueryEmbeddings(
+    get_query_embedding_cache(
+        embeddings=shared_embeddings, model_name=EMBEDDING_MODEL_NAME
+    )
+)
 
 def setup_retrievers(
         qdrant_client: object,
         collections: List[Dict[str, str]],
         n_values: Dict[str, int],
         model: str,
-        max_length: int = 128
+        max_length: int = 128,
+        parallel: bool = False,
 ) -> EnsembleRetriever:
     """
     Sets up retrievers for different collections in Qdrant and
@@ -60,6 +74,9 @@ def setup_retrievers(
                         containing collection names.
         n_values (Dict[str, int]): A dictionary containing the number of top
                         results to return for each collection.
+        model (str): Name of the Flashrank model used to rerank documents.
+        max_length (int): Maximum sequence length of the reranker.
+        parallel (bool): Run the retrievers of each collection concurrently.
 
     Returns:
         EnsembleRetriever: The retriever ensemble with weighted retrievers
@@ -70,9 +87,7 @@ def setup_retrievers(
     weights = []
     # Define model name and initialize necessary clients
     model_name = model
-    cache_dir = "src/services/llm/rerank_llms"
-    model_name = model
-    flashrank_client = Ranker(model_name=model_name,cache_dir=cache_dir)
+    flashrank_client = reranker_pool.get(model=model_name, max_length=max_length)
 
     for collection in collections:
         collection_name = collection["name"]
@@ -85,8 +100,13 @@ def setup_retrievers(
                 collection_name="report_sum",
                 embedding=embedding_model,
             )
-            retriever_summaries = vector_store_summaries.as_retriever(
-                search_kwargs={"k": 10}
+            retriever_summaries = ScopedVectorStoreRetriever(
+                vectorstore=vector_store_summaries,
+                search_kwargs={
+                    "k": 10,
+                    "search_params": get_search_params("report_sum"),
+                },
+                report_field="Report_Id",
             )
             compressor_summaries = FlashrankRerank(
                 client=flashrank_client, top_n=n, model=model_name
@@ -95,7 +115,14 @@ def setup_retrievers(
                 base_compressor=compressor_summaries,
                 base_retriever=retriever_summaries,
             )
-            retrievers.append(compression_retriever_summaries)
+            # The summaries are stored in chunks, stitched back after reranking
+            retrievers.append(
+                StitchingRetriever(
+                    retriever=compression_retriever_summaries,
+                    qdrant_client=qdrant_client,
+                    collection_name="report_sum",
+                )
+            )
             weights.append(0.3)
 
         elif collection_name == "Elements":
@@ -105,8 +132,13 @@ def setup_retrievers(
                 collection_name="table_elements",
                 embedding=embedding_model,
             )
-            retriever_tabular = vector_store_tabular.as_retriever(
-                search_kwargs={"k": 10}
+            retriever_tabular = ScopedVectorStoreRetriever(
+                vectorstore=vector_store_tabular,
+                search_kwargs={
+                    "k": 10,
+                    "search_params": get_search_params("table_elements"),
+                },
+                report_field="Id",
             )
             compressor_tabular = FlashrankRerank(
                 client=flashrank_client, top_n=n, model=model_name
@@ -125,8 +157,13 @@ def setup_retrievers(
                 collection_name="text_pages",
                 embedding=embedding_model,
             )
-            retriever_text = vector_store_text.as_retriever(
-                search_kwargs={"k": 10}
+            retriever_text = ScopedVectorStoreRetriever(
+                vectorstore=vector_store_text,
+                search_kwargs={
+                    "k": 10,
+                    "search_params": get_search_params("text_pages"),
+                },
+                report_field="Report_Id",
             )
             compressor_text = FlashrankRerank(
                 client=flashrank_client, top_n=n, model=model_name
@@ -134,7 +171,14 @@ def setup_retrievers(
             compression_retriever_text = ContextualCompressionRetriever(
                 base_compressor=compressor_text, base_retriever=retriever_text
             )
-            retrievers.append(compression_retriever_text)
+            # The pages are stored in chunks, stitched back after reranking
+            retrievers.append(
+                StitchingRetriever(
+                    retriever=compression_retriever_text,
+                    qdrant_client=qdrant_client,
+                    collection_name="text_pages",
+                )
+            )
             weights.append(0.2)
 
         elif collection_name == "element_names":
@@ -144,8 +188,13 @@ def setup_retrievers(
                 collection_name="element_names",
                 embedding=embedding_model,
             )
-            retriever_metadata = vector_store_metadata.as_retriever(
-                search_kwargs={"k": 10}
+            retriever_metadata = ScopedVectorStoreRetriever(
+                vectorstore=vector_store_metadata,
+                search_kwargs={
+                    "k": 10,
+                    "search_params": get_search_params("element_names"),
+                },
+                report_field="report_id",
             )
             compressor_metadata = FlashrankRerank(
                 client=flashrank_client, top_n=n, model=model_name
@@ -164,8 +213,13 @@ def setup_retrievers(
                 collection_name="upload_dates",
                 embedding=embedding_model,
             )
-            retriever_dates = vector_store_dates.as_retriever(
-                search_kwargs={"k": 10}
+            retriever_dates = ScopedVectorStoreRetriever(
+                vectorstore=vector_store_dates,
+                search_kwargs={
+                    "k": 10,
+                    "search_params": get_search_params("upload_dates"),
+                },
+                report_field="report_id",
             )
             compressor_dates = FlashrankRerank(
                 client=flashrank_client, top_n=n, model=model_name
@@ -177,7 +231,8 @@ def setup_retrievers(
             weights.append(0.2)
 
     # Create and return the EnsembleRetriever with the selected retrievers and their weights
-    ensemble_retriever = EnsembleRetriever(
+    ensemble_class = ParallelEnsembleRetriever if parallel else EnsembleRetriever
+    ensemble_retriever = ensemble_class(
         retrievers=retrievers,
         weights=weights,  # Adjusted weights for active collections
     )
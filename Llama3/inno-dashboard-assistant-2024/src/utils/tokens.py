@@ -0,0 +1,46 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Authors: SDG DS unit
+"""
+Approximate token counting.
+
+The text chunker and the conversation memory bound their texts in tokens
+without loading a tokenizer: tokens are approximated by whitespace-separated
+words, which is close enough for budgets and reranker limits.
+"""
+import re
+
+# Approximate tokens: runs of non-whitespace characters
+TOKEN_PATTERN = re.compile(r"\S+")
+
+
+def count_tokens(text: str) -> int:
+    """
+    Returns the approximate number of tokens of a text.
+
+    Args:
+        text (str): The text.
+
+    Returns:
+        int: Number of whitespace-separated words.
+    """
+    return len(TOKEN_PATTERN.findall(text))
+
+
+def truncate_tokens(text: str, max_tokens: int) -> str:
+    """
+    Cuts a text so that it holds at most `max_tokens` tokens.
+
+    Args:
+        text (str): The text.
+        max_tokens (int): Maximum number of tokens kept.
+
+    Returns:
+        str: The text; if it was cut, its first `max_tokens - 1` tokens and "...".
+    """
+    if max_tokens <= 0:
+        return ""
+    tokens = [match.start() for match in TOKEN_PATTERN.finditer(text)]
+    if len(tokens) <= max_tokens:
+        return text
+    return (text[:tokens[max_tokens - 1]].rstrip() + " ...").lstrip()